@@ -2,12 +2,17 @@ import json
 import re
 import sys
 import os
-from typing import Dict, Any
+import copy
+from typing import Dict, Any, Optional
 
 # Add the project root to sys.path to allow importing from utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.gemini_client import generate_response
+from utils.gemini_client import generate_response, generate_response_async
+from utils.aio import run_blocking
+from utils.lru_cache import LRUCache
+from utils.uploads import file_digest
+from utils.prompts import PromptBuilder
 
 
 class SceneStructuringAgent:
@@ -21,51 +26,12 @@ class SceneStructuringAgent:
     DEFAULT_BUDGET = 20000
     ALLOWED_THEMES = ["traditional_indian", "contemporary_indian", "rustic_indian", "rajasthani_mughal"]
 
-    def __init__(self):
-        pass
+    # Inputs that shape the scene analysis, together with the image hash.
+    # They are also the only fields sent in the prompt.
+    CACHE_FIELDS = ["description_text", "theme", "preferred_theme", "budget", "space_type"]
 
-    def run(self, user_input: Dict[str, Any], image_path: str = None) -> Dict[str, Any]:
-        """
-        Main execution method.
-
-        :param user_input: Raw form data
-        :param image_path: Optional path to an uploaded image
-        :return: Structured scene JSON
-        """
-
-        prompt = self._build_prompt(user_input, has_image=bool(image_path))
-
-        try:
-            response_text = generate_response(prompt, image_path=image_path)
-        except Exception as e:
-            print(f"Agent 1 API Error: {e}")
-            response_text = ""
-
-        structured_output = self._safe_json_parse(response_text)
-
-        if structured_output is None:
-            print("Warning: Falling back to deterministic response.")
-            structured_output = self._fallback_response(user_input)
-
-        validated_output = self._validate_output(structured_output)
-
-        return validated_output
-
-    # -----------------------------
-    # Prompt Builder
-    # -----------------------------
-
-    def _build_prompt(self, user_input: Dict[str, Any], has_image: bool = False) -> str:
-        image_instruction = ""
-        if has_image:
-            image_instruction = """
-- Analyze the provided IMAGE carefully.
-- Identify the room's current layout and existing furniture.
-- Suggest if the image is a 'current_state' or a 'reference_preference'.
-- Extract dominant colors and materials from the image.
-"""
-
-        return f"""
+    # Static prompt blocks, without and with a photo; the user input follows them
+    INSTRUCTIONS_TEMPLATE = """
 You are a Professional Interior Scene Structuring Agent.
 
 Your job is to convert raw user input (text and optional image) into STRICT structured JSON.
@@ -103,16 +69,120 @@ Required Output Format:
     "style_type": "current_state | reference_preference | none"
   }}
 }}
-
-User Input:
-{json.dumps(user_input, indent=2)}
 """
+    INSTRUCTIONS = INSTRUCTIONS_TEMPLATE.format(image_instruction="")
+    IMAGE_INSTRUCTIONS = INSTRUCTIONS_TEMPLATE.format(image_instruction="""
+- Analyze the provided IMAGE carefully.
+- Identify the room's current layout and existing furniture.
+- Suggest if the image is a 'current_state' or a 'reference_preference'.
+- Extract dominant colors and materials from the image.
+""")
+
+    def __init__(self, cache_size: int = 256, prompt_tokens: int = 1000):
+        """
+        :param cache_size: max validated scenes kept per (image hash, text inputs)
+        :param prompt_tokens: prompt token budget, a longer description_text is shortened
+        """
+        self.cache = LRUCache(cache_size)
+        self.prompt = PromptBuilder(
+            "SceneStructuringAgent", self.INSTRUCTIONS, "User Input", prompt_tokens,
+            fields=self.CACHE_FIELDS,
+            truncate="description_text"
+        )
+
+    def run(
+        self,
+        user_input: Dict[str, Any],
+        image_path: str = None,
+        image_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Main execution method.
+
+        :param user_input: Raw form data
+        :param image_path: Optional path to an uploaded image
+        :param image_hash: SHA-256 of the image, hashed here when not given
+        :return: Structured scene JSON
+        """
+
+        if image_path and not image_hash and os.path.exists(image_path):
+            image_hash = file_digest(image_path)
+        cache_key = self._cache_key(user_input, image_hash)
+
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            print("[AGENT1] Reusing scene analysis for this image and input.")
+            return copy.deepcopy(cached)
+
+        prompt = self._build_prompt(user_input, has_image=bool(image_path))
+
+        try:
+            response_text = generate_response(
+                prompt, image_path=image_path, image_hash=image_hash, validate=self._is_usable
+            )
+        except Exception as e:
+            print(f"Agent 1 API Error: {e}")
+            response_text = ""
+
+        return self._finish(cache_key, response_text, user_input)
+
+    async def run_async(
+        self,
+        user_input: Dict[str, Any],
+        image_path: str = None,
+        image_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """run() without blocking the event loop."""
+
+        if image_path and not image_hash and os.path.exists(image_path):
+            image_hash = await run_blocking(file_digest, image_path)
+        cache_key = self._cache_key(user_input, image_hash)
+
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            print("[AGENT1] Reusing scene analysis for this image and input.")
+            return copy.deepcopy(cached)
+
+        prompt = self._build_prompt(user_input, has_image=bool(image_path))
+
+        try:
+            response_text = await generate_response_async(
+                prompt, image_path=image_path, image_hash=image_hash, validate=self._is_usable
+            )
+        except Exception as e:
+            print(f"Agent 1 API Error: {e}")
+            response_text = ""
+
+        return self._finish(cache_key, response_text, user_input)
+
+    def _cache_key(self, user_input: Dict[str, Any], image_hash: Optional[str]):
+        return (image_hash,) + tuple(str(user_input.get(field)) for field in self.CACHE_FIELDS)
+
+    def _finish(self, cache_key, response_text: str, user_input: Dict[str, Any]) -> Dict[str, Any]:
+        structured_output = self._safe_json_parse(response_text)
+
+        if structured_output is None:
+            print("Warning: Falling back to deterministic response.")
+            return self._validate_output(self._fallback_response(user_input))
+
+        validated_output = self._validate_output(structured_output)
+        # Only real analyses are cached, a failed call is retried next time
+        self.cache.put(cache_key, copy.deepcopy(validated_output))
+
+        return validated_output
+
+    # -----------------------------
+    # Prompt Builder
+    # -----------------------------
+
+    def _build_prompt(self, user_input: Dict[str, Any], has_image: bool = False) -> str:
+        return self.prompt.build(user_input, self.IMAGE_INSTRUCTIONS if has_image else self.INSTRUCTIONS)
 
     # -----------------------------
     # Safe JSON Parsing
     # -----------------------------
 
-    def _safe_json_parse(self, response_text: str):
+    def _safe_json_parse(self, response_text: str, quiet: bool = False):
 
         try:
             cleaned = response_text.strip()
@@ -125,10 +195,15 @@ User Input:
             return json.loads(cleaned)
 
         except Exception as e:
-            print("JSON parsing failed:", e)
-            print("Raw response:", response_text)
+            if not quiet:
+                print("JSON parsing failed:", e)
+                print("Raw response:", response_text)
             return None
 
+    def _is_usable(self, response_text: str) -> bool:
+        """Whether a response parses to an analysis, so the LLM cache may keep it."""
+        return isinstance(self._safe_json_parse(response_text, quiet=True), dict)
+
     # -----------------------------
     # Output Validation Layer
     # -----------------------------
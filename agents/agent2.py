@@ -2,12 +2,16 @@ import json
 import re
 import sys
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Callable
 
 # Add the project root to sys.path to allow importing from utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.gemini_client import generate_response
+from utils.gemini_client import (
+    generate_response, generate_response_async, generate_response_stream, generate_response_stream_async
+)
+from utils.json_stream import JSONArrayStream
+from utils.prompts import PromptBuilder
 
 
 class DesignPlannerAgent:
@@ -46,40 +50,8 @@ class DesignPlannerAgent:
         "wall_treatment"
     ]
 
-    def __init__(self):
-        pass
-
-    # -----------------------------
-    # Main Execution
-    # -----------------------------
-
-    def run(self, scene_data: Dict[str, Any]) -> Dict[str, Any]:
-
-        prompt = self._build_prompt(scene_data)
-
-        try:
-            response_text = generate_response(prompt)
-        except Exception as e:
-            print(f"Agent 2 API Error: {e}")
-            response_text = ""
-
-        parsed_output = self._safe_json_parse(response_text)
-
-        if parsed_output is None:
-            print("Warning: Falling back to safe planner output.")
-            return self._fallback_response(scene_data)
-
-        validated_output = self._validate_output(parsed_output, scene_data)
-
-        return validated_output
-
-    # -----------------------------
-    # Prompt Builder
-    # -----------------------------
-
-    def _build_prompt(self, scene_data: Dict[str, Any]) -> str:
-
-        return f"""
+    # Static prompt block; the scene data follows it
+    INSTRUCTIONS = """
 You are a Professional Interior Design Planner Agent.
 
 You receive structured scene data and must generate a culturally accurate, space-aware design plan.
@@ -110,37 +82,142 @@ Do not include explanations.
 
 Required Output Format:
 
-{{
+{
   "design_summary": "",
   "space_type": "",
   "theme": "",
   "required_items": [
-    {{
+    {
       "item_type": "",
       "category": "",
       "priority": 0,
       "placement": "",
       "reason": ""
-    }}
+    }
   ],
-  "visualization": {{
+  "visualization": {
     "style_keywords": [],
     "color_palette": [],
     "material_focus": [],
     "lighting_style": "",
     "visual_prompt": ""
-  }}
-}}
-
-Scene Data:
-{json.dumps(scene_data, indent=2)}
+  }
+}
 """
 
+    # Agent 1's output schema; iterations may send back more than that
+    SCENE_FIELDS = ["space_type", "detected_elements", "theme", "budget", "image_analysis"]
+
+    def __init__(self, prompt_tokens: int = 1200):
+        """
+        :param prompt_tokens: prompt token budget, image analysis details are dropped beyond it
+        """
+        self.prompt = PromptBuilder(
+            "DesignPlannerAgent", self.INSTRUCTIONS, "Scene Data", prompt_tokens,
+            fields=self.SCENE_FIELDS,
+            dedupe={"image_analysis.detected_elements": "detected_elements"},
+            trim=["image_analysis.style_type", "image_analysis.dominant_colors", "image_analysis.detected_elements"],
+            truncate="image_analysis.description"
+        )
+
+    # -----------------------------
+    # Main Execution
+    # -----------------------------
+
+    def run(self, scene_data: Dict[str, Any]) -> Dict[str, Any]:
+
+        prompt = self._build_prompt(scene_data)
+
+        try:
+            response_text = generate_response(prompt, validate=self._usable_check(scene_data))
+        except Exception as e:
+            print(f"Agent 2 API Error: {e}")
+            response_text = ""
+
+        return self._finish(response_text, scene_data)
+
+    async def run_async(self, scene_data: Dict[str, Any]) -> Dict[str, Any]:
+        """run() without blocking the event loop."""
+
+        prompt = self._build_prompt(scene_data)
+
+        try:
+            response_text = await generate_response_async(prompt, validate=self._usable_check(scene_data))
+        except Exception as e:
+            print(f"Agent 2 API Error: {e}")
+            response_text = ""
+
+        return self._finish(response_text, scene_data)
+
+    def run_stream(
+        self,
+        scene_data: Dict[str, Any],
+        on_item: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        run() on a streamed response. Each required_items entry that passes
+        validation goes to on_item as soon as it is complete. The result is
+        parsed from the full text exactly as in run().
+        """
+
+        prompt = self._build_prompt(scene_data)
+        stream = JSONArrayStream("required_items")
+
+        try:
+            for piece in generate_response_stream(prompt, validate=self._usable_check(scene_data)):
+                self._emit(stream, piece, scene_data, on_item)
+        except Exception as e:
+            print(f"Agent 2 API Error: {e}")
+
+        return self._finish(stream.text, scene_data)
+
+    async def run_stream_async(
+        self,
+        scene_data: Dict[str, Any],
+        on_item: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """run_stream() without blocking the event loop."""
+
+        prompt = self._build_prompt(scene_data)
+        stream = JSONArrayStream("required_items")
+
+        try:
+            async for piece in generate_response_stream_async(prompt, validate=self._usable_check(scene_data)):
+                self._emit(stream, piece, scene_data, on_item)
+        except Exception as e:
+            print(f"Agent 2 API Error: {e}")
+
+        return self._finish(stream.text, scene_data)
+
+    def _emit(self, stream: JSONArrayStream, piece: str, scene_data, on_item):
+        for item in stream.feed(piece):
+            validated = self._validate_item(item, scene_data.get("detected_elements", []))
+            if validated and on_item:
+                on_item(dict(validated))
+
+    def _finish(self, response_text: str, scene_data: Dict[str, Any]) -> Dict[str, Any]:
+        parsed_output = self._safe_json_parse(response_text)
+
+        if parsed_output is None:
+            print("Warning: Falling back to safe planner output.")
+            return self._fallback_response(scene_data)
+
+        validated_output = self._validate_output(parsed_output, scene_data)
+
+        return validated_output
+
+    # -----------------------------
+    # Prompt Builder
+    # -----------------------------
+
+    def _build_prompt(self, scene_data: Dict[str, Any]) -> str:
+        return self.prompt.build(scene_data)
+
     # -----------------------------
     # Safe JSON Parsing
     # -----------------------------
 
-    def _safe_json_parse(self, response_text: str):
+    def _safe_json_parse(self, response_text: str, quiet: bool = False):
 
         try:
             cleaned = response_text.strip()
@@ -153,10 +230,23 @@ Scene Data:
             return json.loads(cleaned)
 
         except Exception as e:
-            print("JSON parsing failed:", e)
-            print("Raw response:", response_text)
+            if not quiet:
+                print("JSON parsing failed:", e)
+                print("Raw response:", response_text)
             return None
 
+    def _usable_check(self, scene_data: Dict[str, Any]) -> Callable[[str], bool]:
+        """
+        Check for the LLM cache: a response is kept only if it parses and
+        leaves at least one item after validation, otherwise _finish falls
+        back and the same request should reach the model again.
+        """
+        def is_usable(response_text: str) -> bool:
+            parsed = self._safe_json_parse(response_text, quiet=True)
+            return isinstance(parsed, dict) and bool(self._validate_output(parsed, scene_data)["required_items"])
+
+        return is_usable
+
     # -----------------------------
     # Validation Layer
     # -----------------------------
@@ -193,56 +283,43 @@ Scene Data:
         
         return False
 
-    def _validate_output(self, data: Dict[str, Any], scene_data: Dict[str, Any]) -> Dict[str, Any]:
-
-        if not isinstance(data, dict):
-            return self._fallback_response(scene_data)
-
-        space_type = data.get("space_type", scene_data.get("space_type", "living_room"))
-        theme = data.get("theme", scene_data.get("theme", "traditional_indian"))
+    def _validate_item(self, item: Any, detected_elements: List[str]) -> Optional[Dict[str, Any]]:
+        """One required_items entry, or None when it is dropped."""
 
-        required_items = data.get("required_items", [])
-        if not isinstance(required_items, list):
-            required_items = []
-
-        validated_items = []
-
-        detected_elements = scene_data.get("detected_elements", [])
-
-        for item in required_items:
+        if not isinstance(item, dict):
+            return None
 
-            if not isinstance(item, dict):
-                continue
+        item_type = item.get("item_type", "")
+        category = item.get("category", "")
+        priority = item.get("priority", 0)
 
-            item_type = item.get("item_type", "")
-            category = item.get("category", "")
-            priority = item.get("priority", 0)
+        # Enforce allowed vocabulary
+        if item_type not in self.ALLOWED_ITEM_TYPES:
+            return None
 
-            # Enforce allowed vocabulary
-            if item_type not in self.ALLOWED_ITEM_TYPES:
-                continue
+        if category not in self.ALLOWED_CATEGORIES:
+            return None
 
-            if category not in self.ALLOWED_CATEGORIES:
-                continue
+        # NEW: Smarter Redundancy Check
+        if self._is_redundant(item_type, detected_elements):
+            return None
 
-            # NEW: Smarter Redundancy Check
-            if self._is_redundant(item_type, detected_elements):
-                continue
+        try:
+            priority = int(priority)
+            if priority <= 0:
+                priority = 99 # Push to end if zero or negative
+        except:
+            priority = 99
 
-            try:
-                priority = int(priority)
-                if priority <= 0:
-                    priority = 99 # Push to end if zero or negative
-            except:
-                priority = 99
+        return {
+            "item_type": item_type,
+            "category": category,
+            "priority": priority,
+            "placement": item.get("placement", ""),
+            "reason": item.get("reason", "")
+        }
 
-            validated_items.append({
-                "item_type": item_type,
-                "category": category,
-                "priority": priority,
-                "placement": item.get("placement", ""),
-                "reason": item.get("reason", "")
-            })
+    def _order_items(self, validated_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 
         # Sort by user/llm provided priority first
         validated_items = sorted(validated_items, key=lambda x: x["priority"])
@@ -252,7 +329,27 @@ Scene Data:
             item["priority"] = i
 
         # Limit to 6 items max
-        validated_items = validated_items[:6]
+        return validated_items[:6]
+
+    def _validate_output(self, data: Dict[str, Any], scene_data: Dict[str, Any]) -> Dict[str, Any]:
+
+        if not isinstance(data, dict):
+            return self._fallback_response(scene_data)
+
+        space_type = data.get("space_type", scene_data.get("space_type", "living_room"))
+        theme = data.get("theme", scene_data.get("theme", "traditional_indian"))
+
+        required_items = data.get("required_items", [])
+        if not isinstance(required_items, list):
+            required_items = []
+
+        detected_elements = scene_data.get("detected_elements", [])
+        validated_items = []
+        for item in required_items:
+            validated = self._validate_item(item, detected_elements)
+            if validated:
+                validated_items.append(validated)
+        validated_items = self._order_items(validated_items)
 
         visualization = data.get("visualization", {})
         if not isinstance(visualization, dict):
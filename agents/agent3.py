@@ -3,6 +3,8 @@ import sys
 import json
 import requests
 import uuid
+import time
+import asyncio
 from typing import Dict, Any, List
 from bytez import Bytez
 from dotenv import load_dotenv
@@ -10,6 +12,12 @@ from dotenv import load_dotenv
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 load_dotenv()
 
+from utils.aio import run_blocking
+from utils.resilience import ResilientCaller, CircuitBreaker
+from utils.usage import record_call
+
+IMAGE_MODEL = "google/imagen-4.0-ultra-generate-001"
+
 
 class VisualizationAgent:
 
@@ -19,7 +27,26 @@ class VisualizationAgent:
             raise ValueError("BYTEZ_API_KEY not found in environment variables")
 
         self.sdk = Bytez(api_key)
-        self.model = self.sdk.model("google/imagen-4.0-ultra-generate-001")
+        base_url = os.getenv("BYTEZ_BASE_URL")
+        if base_url:
+            # Local stand-in such as benchmarks/fake_upstream.py; the SDK has no public option for it
+            self.sdk._client.host = f"{base_url.rstrip('/')}/models/v2/"
+        self.model = self.sdk.model(IMAGE_MODEL)
+
+        # Bytez returns HTTP and connection errors as results.error instead of raising.
+        # Hedging is off by default since every Imagen call is billed.
+        # The SDK sets no HTTP timeout, so stuck attempts only hold this guard's own workers.
+        self.guard = ResilientCaller(
+            "imagen",
+            timeout=float(os.getenv("IMAGEN_TIMEOUT", 120)),
+            max_workers=int(os.getenv("IMAGEN_THREADS", 32)),
+            hedge=os.getenv("IMAGEN_HEDGE", "0") == "1",
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("BREAKER_FAILURES", 5)),
+                reset_seconds=float(os.getenv("BREAKER_RESET_SECONDS", 30))
+            ),
+            is_failure=lambda results: bool(results.error)
+        )
 
     # --------------------------------------------------
     # Budget Tier Logic
@@ -123,11 +150,15 @@ Realistic materials and textures.
             filepath = os.path.join(img_dir, filename)
             
             # Download and save
+            start = time.perf_counter()
             response = requests.get(image_url, stream=True, timeout=15)
             if response.status_code == 200:
+                size = 0
                 with open(filepath, 'wb') as f:
                     for chunk in response.iter_content(1024):
                         f.write(chunk)
+                        size += len(chunk)
+                record_call("VisualizationAgent", "image_download", time.perf_counter() - start, image_bytes=size)
                 
                 # Return the local URL path (relative to the API)
                 return f"http://127.0.0.1:8000/images/{filename}"
@@ -143,8 +174,14 @@ Realistic materials and textures.
 
         print(f"\n--- Generating Image | Budget Tier: {intensity.upper()} ---")
         
+        start = time.perf_counter()
         try:
-            results = self.model.run(prompt)
+            # The Bytez SDK takes no deadline; an abandoned attempt finishes in the background
+            results = self.guard.call(lambda timeout: self.model.run(prompt))
+            record_call(
+                "VisualizationAgent", "image", time.perf_counter() - start, model=IMAGE_MODEL,
+                images=0 if results.error else 1, error=str(results.error) if results.error else None
+            )
             
             if results.error:
                 print(f"[AGENT3] Bytez Error: {results.error}")
@@ -162,6 +199,7 @@ Realistic materials and textures.
             }
         except Exception as e:
             print(f"Agent 3 Image Generation Error: {e}")
+            record_call("VisualizationAgent", "image", time.perf_counter() - start, model=IMAGE_MODEL, error=str(e))
             return {
                 "error": str(e),
                 "image": None,
@@ -175,6 +213,16 @@ Realistic materials and textures.
     def generate_guide(self, agent1_output: Dict[str, Any], agent2_output: Dict[str, Any]) -> str:
         from utils.gemini_client import generate_response
 
+        guide = generate_response(self._guide_prompt(agent1_output, agent2_output), validate=self._is_usable_guide)
+        return self._guide_or_fallback(guide, agent1_output, agent2_output)
+
+    async def generate_guide_async(self, agent1_output: Dict[str, Any], agent2_output: Dict[str, Any]) -> str:
+        from utils.gemini_client import generate_response_async
+
+        guide = await generate_response_async(self._guide_prompt(agent1_output, agent2_output), validate=self._is_usable_guide)
+        return self._guide_or_fallback(guide, agent1_output, agent2_output)
+
+    def _guide_prompt(self, agent1_output: Dict[str, Any], agent2_output: Dict[str, Any]) -> str:
         theme = agent2_output.get("theme", "traditional_indian").replace("_", " ")
         budget = agent1_output.get("budget", 30000)
         items = agent2_output.get("required_items", [])
@@ -182,7 +230,7 @@ Realistic materials and textures.
         
         print(f"[AGENT3] Generating execution guide for {theme} {space}...")
 
-        prompt = f"""
+        return f"""
 You are a Professional Interior Architect.
 
 Create 3 distinct design concepts for a {theme} themed {space}.
@@ -201,9 +249,16 @@ Avoid excessive fluff.
 No markdown.
 """
 
-        guide = generate_response(prompt)
-        
-        if not guide or len(guide) < 20:
+    @staticmethod
+    def _is_usable_guide(guide: str) -> bool:
+        return bool(guide) and len(guide) >= 20
+
+    def _guide_or_fallback(self, guide: str, agent1_output: Dict[str, Any], agent2_output: Dict[str, Any]) -> str:
+        theme = agent2_output.get("theme", "traditional_indian").replace("_", " ")
+        items = agent2_output.get("required_items", [])
+        space = agent1_output.get("space_type", "room")
+
+        if not self._is_usable_guide(guide):
             print("[AGENT3] Gemini guide generation failed. Using fallback.")
             guide = f"""
 1. Concept: Thematic {theme.title()} Transformation
@@ -226,6 +281,30 @@ Prepare your {space} by clearing unnecessary clutter. Focus on integrating warm
         visual_res = self.generate_image(agent1_output, agent2_output)
         text_guide = self.generate_guide(agent1_output, agent2_output)
 
+        return {
+            "visuals": visual_res,
+            "image_links": self._save_images(visual_res),
+            "guide": text_guide
+        }
+
+    async def run_async(self, agent1_output: Dict[str, Any], agent2_output: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        run() for the event loop. The image and the guide don't depend on
+        each other, so they are generated concurrently. Bytez has no async
+        client, so its call (and the download) runs on the blocking pool.
+        """
+        visual_res, text_guide = await asyncio.gather(
+            run_blocking(self.generate_image, agent1_output, agent2_output),
+            self.generate_guide_async(agent1_output, agent2_output)
+        )
+
+        return {
+            "visuals": visual_res,
+            "image_links": await run_blocking(self._save_images, visual_res),
+            "guide": text_guide
+        }
+
+    def _save_images(self, visual_res: Dict[str, Any]) -> List[str]:
         links: List[str] = []
         if visual_res["image"]:
             raw_data = visual_res["image"]
@@ -239,12 +318,7 @@ Prepare your {space} by clearing unnecessary clutter. Focus on integrating warm
                     local_url = self._save_image_locally(item)
                     print(f"[AGENT3] Local URL generated: {local_url}")
                     links.append(local_url)
-
-        return {
-            "visuals": visual_res,
-            "image_links": links,
-            "guide": text_guide
-        }
+        return links
 
 
 # --------------------------------------------------
@@ -1,87 +1,298 @@
-from typing import List, Dict, Any
+import os
+import sys
+import copy
+import math
+import bisect
+import itertools
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+# Add the project root to sys.path to allow importing from utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.lru_cache import LRUCache
+from utils.catalog_store import compact_catalog
+from agents.agent4_similarity import ItemSimilarityIndex
+
+# Wildcard used in index keys for the relaxed fallbacks
+ANY = "*"
 
 
 class Agent4ProcurementEngine:
 
-    def __init__(self, dataset: Dict[str, Any]):
-        self.items = dataset["items"]
-        self.price_ranges = dataset["metadata"]["price_ranges_inr"]
+    # Comparison plans: name, share of the user budget, tier preference
+    PLAN_NAMES = ["Luxury", "Moderate", "Minimal"]
+    BUDGET_RATIOS = [1, 0.7, 0.5]
+    TIER_PREFERENCES = [
+        ["premium", "medium", "low"],
+        ["medium", "low"],
+        ["low"]
+    ]
+
+    SOLVERS = ["greedy", "optimal"]
+
+    # Upper bound on swap alternatives returned per plan slot
+    MAX_ALTERNATIVES = 10
+
+    # Upper bound on look-alikes returned per item by similar_items
+    MAX_SIMILAR = 50
+
+    def __init__(self, dataset: Dict[str, Any], cache_size: int = 1024, budget_step: int = 1):
+        """
+        :param cache_size: max comparison-plan results kept in the LRU cache
+        :param budget_step: budgets are rounded down to a multiple of this
+                            before planning, so nearby budgets share a cache entry
+        """
+        self.plan_cache = LRUCache(cache_size)
+        self.budget_step = max(1, int(budget_step))
+        self.catalog_version = 0
+        self.load_catalog(dataset)
+
+    def load_catalog(self, dataset: Dict[str, Any]):
+        """(Re)builds all derived catalog state and invalidates cached plans."""
+        self.metadata = dataset["metadata"]
+        self.price_ranges = self.metadata["price_ranges_inr"]
+        # Slotted records with shared enums/links instead of one dict per item
+        self.items = compact_catalog(dataset["items"])
+        self.tiers = [tier for tier in self.price_ranges if tier != "diy"]
+        # low=1, medium=2, premium=3 (DIY scores 0)
+        self.quality_scores = {
+            level: rank for rank, level in
+            enumerate(self.metadata.get("quality_levels", self.tiers), start=1)
+        }
+        self._positions = {item["id"]: pos for pos, item in enumerate(self.items)}
+        self._index = self._build_index()
+        # Built on the first similar_items call. Names/attributes only, so
+        # price-update copies share the holder (and whoever builds it first)
+        self._similarity: List[ItemSimilarityIndex] = []
+        self._similarity_lock = threading.Lock()
+        self.catalog_version += 1
+        self.plan_cache.clear()
 
     # --------------------------------------------------
-    # FILTERING WITH LAYERED FALLBACK
+    # CATALOG INDEX
     # --------------------------------------------------
 
-    def filter_items(self, theme, space_type, item_type):
+    def _new_entry(self):
+        entry = {"all": [], "frontier": {}}
+        for tier in self.tiers:
+            entry[tier] = []
+        return entry
+
+    def _build_index(self):
+        """
+        Buckets every item once under (item_type, theme, space_type, is_diy).
+        ANY in the theme/space_type slot is the wildcard used by the fallbacks.
+        Each entry holds the price-sorted candidates plus per-tier sublists,
+        and per tier the items not dominated on (price, quality_level).
+        DIY entries stay in catalog order, like get_diy_items always returned.
+        """
+        index = {}
+
+        for item in self.items:
+            tier = self._price_tier(item["price"])
+
+            for key in self._index_keys(item):
+                entry = index.get(key)
+                if entry is None:
+                    entry = index[key] = self._new_entry()
+                entry["all"].append(item)
+                if tier:
+                    entry[tier].append(item)
+
+        # Stable sort keeps catalog order between equal prices
+        for (_, _, _, is_diy), entry in index.items():
+            if is_diy:
+                continue
+            for bucket in ["all"] + self.tiers:
+                entry[bucket].sort(key=lambda x: x["price"])
+            for tier in self.tiers:
+                entry["frontier"][tier] = self._quality_frontier(entry[tier])
+
+        return index
+
+    @staticmethod
+    def _index_keys(item):
+        item_type = item["item_type"]
+        is_diy = bool(item["is_diy"])
+
+        keys = [(item_type, ANY, ANY, is_diy)]
+        for theme in dict.fromkeys(item["themes"]):
+            keys.append((item_type, theme, ANY, is_diy))
+            for space_type in dict.fromkeys(item.get("space_types", [])):
+                keys.append((item_type, theme, space_type, is_diy))
+        return keys
+
+    def _rebuild_entry(self, entry, replaced, is_diy=False):
+        """Fresh copy of an index entry with `replaced` (id -> item) swapped in."""
+        items = [replaced.get(item["id"], item) for item in entry["all"]]
+        # Same order a full rebuild gives: price, then catalog position
+        if not is_diy:
+            items.sort(key=lambda x: (x["price"], self._positions[x["id"]]))
+
+        rebuilt = self._new_entry()
+        rebuilt["all"] = items
+        for item in items:
+            tier = self._price_tier(item["price"])
+            if tier:
+                rebuilt[tier].append(item)
+        if not is_diy:
+            for tier in self.tiers:
+                rebuilt["frontier"][tier] = self._quality_frontier(rebuilt[tier])
+        return rebuilt
+
+    def with_price_updates(self, updates):
+        """
+        Copy-on-write price change from an iterable of (item id, price).
+
+        Returns (engine, changed_positions, unknown_ids). The new engine
+        shares every index entry the changed items don't touch, and this
+        engine is left as-is for requests still holding it.
+        """
+        items = list(self.items)
+        replaced = {}
+        unknown = []
+
+        for item_id, price in updates:
+            pos = self._positions.get(item_id)
+            if pos is None:
+                unknown.append(item_id)
+                continue
+            if items[pos]["price"] != price:
+                items[pos] = replaced[item_id] = items[pos].with_price(price)
 
-        # Strict: theme + space
-        results = [
-            item for item in self.items
-            if item["item_type"] == item_type
-            and theme in item["themes"]
-            and space_type in item.get("space_types", [])
-            and not item["is_diy"]
-        ]
-        if results:
-            return results
-
-        # Relaxed: theme only
-        results = [
-            item for item in self.items
-            if item["item_type"] == item_type
-            and theme in item["themes"]
-            and not item["is_diy"]
-        ]
-        if results:
-            return results
+        engine = copy.copy(self)
+        engine.items = items
+        engine._index = dict(self._index)
 
-        # Last fallback: item_type only
-        return [
-            item for item in self.items
-            if item["item_type"] == item_type
-            and not item["is_diy"]
-        ]
+        affected = {key for item in replaced.values() for key in self._index_keys(item)}
+        for key in affected:
+            engine._index[key] = self._rebuild_entry(self._index[key], replaced, is_diy=key[3])
+
+        engine.catalog_version = self.catalog_version + 1
+        # Not shared: this engine keeps serving (and caching for) in-flight requests
+        engine.plan_cache = LRUCache(self.plan_cache.max_size)
+
+        changed = sorted(self._positions[item_id] for item_id in replaced)
+        return engine, changed, unknown
+
+    def _quality_frontier(self, items):
+        """Cheapest item of each strictly better quality_level, price-sorted input."""
+        frontier = []
+        best = 0
+        for item in items:
+            score = self.quality_scores.get(item["quality_level"], 0)
+            if score > best:
+                frontier.append(item)
+                best = score
+        return frontier
+
+    def _candidates(self, theme, space_type, item_type):
+        """Indexed equivalent of filter_items, returns the shared entry."""
+        for key in (
+            (item_type, theme, space_type, False),  # Strict: theme + space
+            (item_type, theme, ANY, False),         # Relaxed: theme only
+            (item_type, ANY, ANY, False)            # Last fallback: item_type only
+        ):
+            entry = self._index.get(key)
+            if entry:
+                return entry
+        return self._new_entry()
+
+    # --------------------------------------------------
+    # FILTERING WITH LAYERED FALLBACK
+    # --------------------------------------------------
+
+    def filter_items(self, theme, space_type, item_type):
+        # Candidates come back sorted by price
+        return list(self._candidates(theme, space_type, item_type)["all"])
 
     def get_diy_items(self, theme, item_type):
-        return [
-            item for item in self.items
-            if item["item_type"] == item_type
-            and theme in item["themes"]
-            and item["is_diy"]
-        ]
+        entry = self._index.get((item_type, theme, ANY, True))
+        return list(entry["all"]) if entry else []
+
+    @property
+    def similarity(self) -> ItemSimilarityIndex:
+        if not self._similarity:
+            with self._similarity_lock:
+                if not self._similarity:
+                    self._similarity.append(ItemSimilarityIndex(self.items))
+        return self._similarity[0]
+
+    def similar_items(self, item_ids: List[str], k: int = 5, theme: Optional[str] = None) -> Dict[str, List[Dict]]:
+        """
+        Look-alikes for each item id: shop items of the same item_type
+        sharing `theme` (or one of the item's own themes), ranked by
+        TF-IDF similarity of names and attributes. Unknown ids are left out.
+        """
+        k = max(1, min(int(k), self.MAX_SIMILAR))
+        known = [item_id for item_id in dict.fromkeys(item_ids) if item_id in self._positions]
+        matches = self.similarity.query(self.items, [self._positions[item_id] for item_id in known], k, theme)
+
+        return {
+            item_id: [
+                {"id": self.items[pos]["id"], **self.alternative_entry(self.items[pos]), "similarity": score}
+                for pos, score in found
+            ]
+            for item_id, found in zip(known, matches)
+        }
 
     # --------------------------------------------------
     # PRICE CLASSIFICATION
     # --------------------------------------------------
 
+    def _price_tier(self, price) -> Optional[str]:
+        for tier in self.tiers:
+            limits = self.price_ranges[tier]
+            if limits["min"] <= price <= limits["max"]:
+                return tier
+        return None
+
     def classify_by_price_range(self, items):
-        buckets = {"low": [], "medium": [], "premium": []}
+        buckets = {tier: [] for tier in self.tiers}
 
         for item in items:
-            for tier, limits in self.price_ranges.items():
-                if tier == "diy":
-                    continue
-                if limits["min"] <= item["price"] <= limits["max"]:
-                    buckets[tier].append(item)
-                    break
+            tier = self._price_tier(item["price"])
+            if tier:
+                buckets[tier].append(item)
 
         return buckets
 
     def select_cheapest(self, items):
-        return sorted(items, key=lambda x: x["price"])[0] if items else None
+        return min(items, key=lambda x: x["price"]) if items else None
 
     # --------------------------------------------------
     # ESTIMATE MINIMUM REMAINING COST
     # --------------------------------------------------
 
+    def _min_low_price(self, entry):
+        low = entry.get("low")
+        return low[0]["price"] if low else 0
+
     def estimate_min_remaining_cost(self, theme, space_type, remaining_item_types):
-        cost = 0
-        for item_type in remaining_item_types:
-            candidates = self.filter_items(theme, space_type, item_type)
-            buckets = self.classify_by_price_range(candidates)
-            cheapest = self.select_cheapest(buckets["low"])
-            if cheapest:
-                cost += cheapest["price"]
-        return cost
+        return sum(
+            self._min_low_price(self._candidates(theme, space_type, item_type))
+            for item_type in remaining_item_types
+        )
+
+    def _resolve_slots(self, theme, space_type, required_items):
+        """
+        Looks up the candidate entry for every slot (sorted by priority) and
+        the suffix sums of their cheapest low-tier prices, so one lookup can
+        serve every plan built for the same request.
+        """
+        required_items = sorted(required_items, key=lambda x: x["priority"])
+        slots = [
+            (item["item_type"], self._candidates(theme, space_type, item["item_type"]))
+            for item in required_items
+        ]
+
+        # min_remaining[i] = conservative cost of slots i..end
+        min_remaining = [0] * (len(slots) + 1)
+        for idx in range(len(slots) - 1, -1, -1):
+            min_remaining[idx] = min_remaining[idx + 1] + self._min_low_price(slots[idx][1])
+
+        return slots, min_remaining
 
     def build_plan(
         self,
@@ -89,73 +300,78 @@ class Agent4ProcurementEngine:
         space_type: str,
         required_items: List[Dict],
         target_budget: int,
-        tier_order: List[str]
+        tier_order: List[str],
+        solver: str = "greedy",
+        alternatives: int = 0
     ):
-        # 🔥 Sort by priority
-        required_items = sorted(required_items, key=lambda x: x["priority"])
-        required_item_types = [item["item_type"] for item in required_items]
+        """
+        solver="greedy" takes the cheapest fitting item slot by slot.
+        solver="optimal" solves the plan as a multiple-choice knapsack.
+        alternatives=K adds up to K swap options to every slot.
+        """
+        if solver not in self.SOLVERS:
+            raise ValueError(f"Unknown plan solver: {solver}")
+        alternatives = self._clamp_alternatives(alternatives)
+
+        slots = self._resolve_slots(theme, space_type, required_items)
+        if solver == "optimal":
+            return self._solve_plan_from_slots(theme, space_type, slots, target_budget, tier_order, alternatives)
+        return self._build_plan_from_slots(theme, space_type, slots, target_budget, tier_order, alternatives)
+
+    def _build_plan_from_slots(self, theme, space_type, slots, target_budget, tier_order, alternatives=0):
+        slots, min_remaining = slots
 
         plan_items = []
+        picks = []
         total_cost = 0
 
         print(f"[AGENT4] Building {target_budget} plan for {theme} in {space_type}")
 
-        for idx, item_type in enumerate(required_item_types):
-            remaining_item_types = required_item_types[idx + 1:]
-
-            candidates = self.filter_items(theme, space_type, item_type)
-            buckets = self.classify_by_price_range(candidates)
-
+        for idx, (item_type, candidates) in enumerate(slots):
             selected_item = None
 
             # Estimate cost of remaining items (conservatively)
-            min_remaining_cost = self.estimate_min_remaining_cost(
-                theme, space_type, remaining_item_types
-            )
+            min_remaining_cost = min_remaining[idx + 1]
 
             # Try to pick best fit based on tier order
             for tier in tier_order:
                 # Fallback: if tier is empty, check next tier in buckets
-                tier_items = buckets.get(tier, [])
+                tier_items = candidates.get(tier, [])
                 if not tier_items:
                     continue
-                    
-                candidate = self.select_cheapest(tier_items)
-                if candidate:
-                    projected_cost = total_cost + candidate["price"] + min_remaining_cost
-                    if projected_cost <= target_budget:
-                        selected_item = candidate
-                        break
-            
+
+                # Buckets are price-sorted, the head is the cheapest
+                candidate = tier_items[0]
+                projected_cost = total_cost + candidate["price"] + min_remaining_cost
+                if projected_cost <= target_budget:
+                    selected_item = candidate
+                    break
+
             # If no item found in preferred tiers that fits budget, try ANY tier
-            if not selected_item:
-                all_candidates = sorted(candidates, key=lambda x: x["price"])
-                for cand in all_candidates:
-                    if total_cost + cand["price"] + min_remaining_cost <= target_budget:
-                        selected_item = cand
-                        break
+            if not selected_item and candidates["all"]:
+                cheapest = candidates["all"][0]
+                if total_cost + cheapest["price"] + min_remaining_cost <= target_budget:
+                    selected_item = cheapest
 
             if not selected_item:
                 # Final fallback: DIY (Price 0)
-                diy = self.get_diy_items(theme, item_type)
-                plan_items.append({
-                    "item_type": item_type.replace("_", " ").title(),
-                    "selection": "Custom DIY Solution",
-                    "price": 0,
-                    "quality_level": "DIY",
-                    "link": diy[0]["diy_link"] if diy else "https://www.youtube.com/results?search_query=diy+"+item_type
-                })
+                diy = self._index.get((item_type, theme, ANY, True))
+                plan_items.append(self.diy_entry(item_type, diy["all"][0] if diy else None))
+                if alternatives:
+                    plan_items[-1]["alternatives"] = []
                 continue
 
             total_cost += selected_item["price"]
 
-            plan_items.append({
-                "item_type": item_type.replace("_", " ").title(),
-                "selection": selected_item["name"],
-                "price": selected_item["price"],
-                "quality_level": selected_item["quality_level"],
-                "link": selected_item["product_link"]
-            })
+            plan_items.append(self.plan_entry(item_type, selected_item))
+            picks.append((plan_items[-1], candidates, selected_item))
+
+        if alternatives:
+            # Headroom of the finished plan, so any single swap keeps it within target_budget
+            for plan_item, candidates, selected_item in picks:
+                plan_item["alternatives"] = self._alternatives(
+                    candidates, target_budget - total_cost, selected_item, alternatives
+                )
 
         return {
             "total_cost": total_cost,
@@ -163,36 +379,410 @@ class Agent4ProcurementEngine:
             "items": plan_items
         }
 
+    # --------------------------------------------------
+    # SWAP ALTERNATIVES
+    # --------------------------------------------------
+
+    def _clamp_alternatives(self, alternatives) -> int:
+        return max(0, min(int(alternatives or 0), self.MAX_ALTERNATIVES))
+
+    def _alternatives(self, candidates, headroom, selected, k):
+        """
+        Up to k other items of the pick's own tier and quality_level,
+        cheapest first, costing at most `headroom` more than the pick. The
+        tier bucket is already price-sorted, so it is cut at that price by
+        bisection and only scanned until k items are found.
+        """
+        if selected is None:
+            return []
+        tier = self._price_tier(selected["price"])
+        bucket = candidates.get(tier, []) if tier else candidates.get("all", [])
+        end = bisect.bisect_right(bucket, selected["price"] + headroom, key=lambda x: x["price"])
+
+        others = (
+            item for item in itertools.islice(bucket, end)
+            if item is not selected and item["quality_level"] == selected["quality_level"]
+        )
+        return [self.alternative_entry(item) for item in itertools.islice(others, k)]
+
+    # --------------------------------------------------
+    # OPTIMAL SOLVER (MULTIPLE-CHOICE KNAPSACK)
+    # --------------------------------------------------
+
+    def _slot_options(self, candidates, tier_order) -> List[Tuple[Optional[Dict], int]]:
+        """
+        Non-dominated (item, quality score) choices for one slot: the quality
+        frontier of every preferred tier plus the cheapest item of any tier,
+        which greedy also falls back to. DIY (None, 0) always comes first.
+        """
+        pool = [item for tier in tier_order for item in candidates["frontier"].get(tier, [])]
+        if candidates["all"]:
+            pool.append(candidates["all"][0])
+        pool.sort(key=lambda x: x["price"])
+
+        options = [(None, 0)]
+        best = 0
+        for item in pool:
+            score = self.quality_scores.get(item["quality_level"], 0)
+            if score > best:
+                options.append((item, score))
+                best = score
+        return options
+
+    def _knapsack_states(self, slots, target_budget, tier_order):
+        """
+        Non-dominated plans within target_budget as value -> (cost, picks).
+        Value is the sum of priority weight x quality score; the first
+        priority slot weighs len(slots), the last weighs 1. Every state is
+        the cheapest way to reach its value, so the result is the
+        cost-vs-quality Pareto frontier for every budget up to target_budget.
+        """
+        weights = range(len(slots), 0, -1)
+
+        # value -> (cost, picks); only the cheapest way to reach each value is kept
+        states = {0: (0, ())}
+
+        for (item_type, candidates), weight in zip(slots, weights):
+            options = self._slot_options(candidates, tier_order)
+            next_states = {}
+            for value, (cost, picks) in states.items():
+                for item, score in options:
+                    new_cost = cost + (item["price"] if item else 0)
+                    # Options are price-sorted, DIY always fits
+                    if item and new_cost > target_budget:
+                        break
+                    new_value = value + weight * score
+                    best = next_states.get(new_value)
+                    if best is None or new_cost < best[0]:
+                        next_states[new_value] = (new_cost, picks + (item,))
+            states = self._prune_dominated(next_states)
+
+        return states
+
+    def _solve_plan_from_slots(self, theme, space_type, slots, target_budget, tier_order, alternatives=0):
+        """
+        Maximizes the sum of priority weight x quality score under
+        target_budget, breaking ties on the lower total cost.
+        """
+        slots, _ = slots
+
+        print(f"[AGENT4] Solving {target_budget} plan for {theme} in {space_type}")
+
+        states = self._knapsack_states(slots, target_budget, tier_order)
+        total_cost, picks = states[max(states)]
+
+        plan_items = self._plan_items_from_picks(theme, slots, picks)
+
+        if alternatives:
+            # Any single swap keeping the whole plan within target_budget
+            for plan_item, (_, candidates), item in zip(plan_items, slots, picks):
+                plan_item["alternatives"] = self._alternatives(
+                    candidates, target_budget - total_cost, item, alternatives
+                )
+
+        return {
+            "total_cost": total_cost,
+            "savings": max(0, target_budget - total_cost),
+            "items": plan_items
+        }
+
+    def _plan_items_from_picks(self, theme, slots, picks):
+        plan_items = []
+        for (item_type, _), item in zip(slots, picks):
+            if item:
+                plan_items.append(self.plan_entry(item_type, item))
+            else:
+                diy = self._index.get((item_type, theme, ANY, True))
+                plan_items.append(self.diy_entry(item_type, diy["all"][0] if diy else None))
+        return plan_items
+
+    @staticmethod
+    def _prune_dominated(states):
+        """Drops states that cost at least as much as a higher-value state."""
+        pruned = {}
+        cheapest = None
+        for value in sorted(states, reverse=True):
+            cost = states[value][0]
+            if cheapest is None or cost < cheapest:
+                pruned[value] = states[value]
+                cheapest = cost
+        return pruned
+
+    @staticmethod
+    def plan_entry(item_type, item):
+        return {
+            "item_type": item_type.replace("_", " ").title(),
+            "selection": item["name"],
+            "price": item["price"],
+            "quality_level": item["quality_level"],
+            "link": item["product_link"]
+        }
+
+    @staticmethod
+    def alternative_entry(item):
+        return {
+            "selection": item["name"],
+            "price": item["price"],
+            "quality_level": item["quality_level"],
+            "link": item["product_link"]
+        }
+
+    @staticmethod
+    def diy_entry(item_type, diy_item=None):
+        return {
+            "item_type": item_type.replace("_", " ").title(),
+            "selection": "Custom DIY Solution",
+            "price": 0,
+            "quality_level": "DIY",
+            "link": diy_item["diy_link"] if diy_item else "https://www.youtube.com/results?search_query=diy+"+item_type
+        }
+
+    # --------------------------------------------------
+    # BUDGET SWEEP (PARETO FRONTIER)
+    # --------------------------------------------------
+
+    def budget_sweep(
+        self,
+        theme: str,
+        space_type: str,
+        required_items: List[Dict],
+        min_budget: int,
+        max_budget: int,
+        tier_order: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Cost-vs-quality Pareto frontier for every budget in [min_budget, max_budget].
+
+        One knapsack pass at max_budget yields every non-dominated plan.
+        Points come back cheapest first; the plan for a budget B is the last
+        point whose total_cost <= B, so a slider can be rendered client-side.
+        """
+        if tier_order is None:
+            tier_order = self.TIER_PREFERENCES[0]
+
+        slots, _ = self._resolve_slots(theme, space_type, required_items)
+        states = self._knapsack_states(slots, max_budget, tier_order)
+
+        frontier = sorted(states.items(), key=lambda state: state[1][0])
+
+        # Keep the plan in effect at min_budget, then everything above it
+        start = 0
+        for idx, (value, (cost, picks)) in enumerate(frontier):
+            if cost <= min_budget:
+                start = idx
+
+        return [
+            {
+                "total_cost": cost,
+                "quality_score": value,
+                "items": self._plan_items_from_picks(theme, slots, picks)
+            }
+            for value, (cost, picks) in frontier[start:]
+        ]
+
+    # --------------------------------------------------
+    # BUDGET FEASIBILITY
+    # --------------------------------------------------
+
+    def budget_bounds(
+        self,
+        theme: str,
+        space_type: str,
+        required_items: List[Dict],
+        user_budget: Optional[int] = None,
+        solver: str = "greedy"
+    ) -> Dict[str, Any]:
+        """
+        Budget limits of the comparison plans, from the price-sorted index
+        entries only (no planning), so it can run before the LLM agents.
+
+        min_budget: below it at least one slot can't get a shop item in any
+        plan. saturation_budget: above it no comparison plan changes, every
+        slot already holds its best pick (only the savings grow).
+
+        The greedy solver only reserves the cheapest low-tier price of the
+        slots still to fill, so an early slot can take a pricier item that
+        leaves a later one without a shop item. Its min_budget replays that
+        rule instead of summing the cheapest prices, and its `feasible`
+        replays the plans at the user budget itself.
+        """
+        if solver not in self.SOLVERS:
+            raise ValueError(f"Unknown plan solver: {solver}")
+
+        resolved = self._resolve_slots(theme, space_type, required_items)
+        slots, _ = resolved
+        min_cost = sum(candidates["all"][0]["price"] for _, candidates in slots if candidates["all"])
+
+        plans = []
+        for name, ratio, tier_order in zip(self.PLAN_NAMES, self.BUDGET_RATIOS, self.TIER_PREFERENCES):
+            best_cost = sum(
+                self._best_pick(candidates, tier_order, solver)["price"]
+                for _, candidates in slots if candidates["all"]
+            )
+            if solver == "greedy":
+                min_budget = self._greedy_min_budget(resolved, tier_order, ratio, min_cost)
+            else:
+                min_budget = self._user_budget_for(min_cost, ratio)
+            plans.append({
+                "plan_name": name,
+                "min_budget": min_budget,
+                "saturation_budget": self._user_budget_for(best_cost, ratio)
+            })
+
+        bounds = {
+            "min_budget": min(plan["min_budget"] for plan in plans),
+            "saturation_budget": max(plan["saturation_budget"] for plan in plans),
+            "plans": plans,
+            "slots": [
+                {
+                    "item_type": item_type,
+                    "available": bool(candidates["all"]),
+                    "min_price": candidates["all"][0]["price"] if candidates["all"] else None,
+                    "max_price": candidates["all"][-1]["price"] if candidates["all"] else None
+                }
+                for item_type, candidates in slots
+            ]
+        }
+        if user_budget is not None:
+            bounds["budget"] = user_budget
+            if solver == "greedy":
+                budget = user_budget // self.budget_step * self.budget_step
+                bounds["feasible"] = any(
+                    self._greedy_shortfall(resolved, target, tier_order) is None
+                    for target, tier_order in zip(self.comparison_budgets(budget), self.TIER_PREFERENCES)
+                )
+            else:
+                bounds["feasible"] = user_budget >= bounds["min_budget"]
+            bounds["saturated"] = user_budget >= bounds["saturation_budget"]
+        return bounds
+
+    def _best_pick(self, candidates, tier_order, solver):
+        """The item a slot settles on once the budget is no constraint."""
+        if solver == "optimal":
+            return self._slot_options(candidates, tier_order)[-1][0]
+        for tier in tier_order:
+            if candidates.get(tier):
+                return candidates[tier][0]
+        return candidates["all"][0]
+
+    def _greedy_shortfall(self, slots, target_budget, tier_order):
+        """
+        Replays _build_plan_from_slots' picks without building the plan.
+        None if every available slot gets a shop item, else (slot index,
+        cost of the picks before it) for the first slot left to DIY.
+        """
+        slots, min_remaining = slots
+        total_cost = 0
+        for idx, (_, candidates) in enumerate(slots):
+            if not candidates["all"]:
+                continue  # DIY at any budget
+            reserve = min_remaining[idx + 1]
+            for tier in tier_order:
+                tier_items = candidates.get(tier)
+                if tier_items and total_cost + tier_items[0]["price"] + reserve <= target_budget:
+                    total_cost += tier_items[0]["price"]
+                    break
+            else:
+                cheapest = candidates["all"][0]["price"]
+                if total_cost + cheapest + reserve > target_budget:
+                    return idx, total_cost
+                total_cost += cheapest
+        return None
+
+    def _greedy_min_budget(self, slots, tier_order, ratio, min_cost):
+        """
+        Smallest user budget whose greedy plan gives every available slot a
+        shop item. Starts from the cheapest-items bound and, while a slot
+        is left short, moves up to the budget that would have covered it
+        with the picks made before it.
+        """
+        budget = self._user_budget_for(min_cost, ratio)
+        while True:
+            target = budget if ratio == 1 else int(budget * ratio)
+            shortfall = self._greedy_shortfall(slots, target, tier_order)
+            if shortfall is None:
+                return budget
+            idx, spent = shortfall
+            needed = spent + slots[0][idx][1]["all"][0]["price"] + slots[1][idx + 1]
+            budget = max(budget + self.budget_step, self._user_budget_for(needed, ratio))
+
+    def _user_budget_for(self, cost, ratio):
+        """Smallest user budget whose plan target (ratio, budget_step) reaches cost."""
+        if ratio == 1:
+            budget = cost
+        else:
+            budget = math.ceil(cost / ratio)
+            while int(budget * ratio) < cost:
+                budget += 1
+            while budget > 0 and int((budget - 1) * ratio) >= cost:
+                budget -= 1
+        return -(-budget // self.budget_step) * self.budget_step
+
     # --------------------------------------------------
     # GENERATE MULTIPLE COMPARISON PLANS
     # --------------------------------------------------
 
+    @classmethod
+    def comparison_budgets(cls, user_budget):
+        return [
+            user_budget if ratio == 1 else int(user_budget * ratio)
+            for ratio in cls.BUDGET_RATIOS
+        ]
+
     def generate_comparison_plans(
         self,
         theme: str,
         space_type: str,
         required_items: List[Dict],
-        user_budget: int
+        user_budget: int,
+        solver: str = "greedy",
+        alternatives: int = 0
     ):
 
-        budget_targets = [
-            user_budget,
-            int(user_budget * 0.7),
-            int(user_budget * 0.5)
-        ]
+        if solver not in self.SOLVERS:
+            raise ValueError(f"Unknown plan solver: {solver}")
+        alternatives = self._clamp_alternatives(alternatives)
 
-        tier_preferences = [
-            ["premium", "medium", "low"],
-            ["medium", "low"],
-            ["low"]
-        ]
+        if self.budget_step > 1:
+            user_budget = user_budget // self.budget_step * self.budget_step
+
+        # Plans depend only on the priority order of item types
+        ordered = sorted(required_items, key=lambda x: x["priority"])
+        cache_key = (
+            self.catalog_version, theme, space_type,
+            tuple(item["item_type"] for item in ordered), user_budget, solver, alternatives
+        )
+
+        plans = self.plan_cache.get(cache_key)
+        if plans is None:
+            plans = self._generate_comparison_plans(theme, space_type, ordered, user_budget, solver, alternatives)
+            self.plan_cache.put(cache_key, plans)
+
+        # Callers may mutate the result, the cached copy stays untouched
+        return [dict(plan, items=[self._copy_plan_item(item) for item in plan["items"]]) for plan in plans]
+
+    @staticmethod
+    def _copy_plan_item(item):
+        item = dict(item)
+        if "alternatives" in item:
+            item["alternatives"] = [dict(alt) for alt in item["alternatives"]]
+        return item
+
+    def _generate_comparison_plans(self, theme, space_type, required_items, user_budget, solver, alternatives=0):
+
+        budget_targets = self.comparison_budgets(user_budget)
+        tier_preferences = self.TIER_PREFERENCES
 
         plans = []
 
-        plan_names = ["Luxury", "Moderate", "Minimal"]
+        plan_names = self.PLAN_NAMES
+
+        # Candidate lookups are shared by all three plans
+        slots = self._resolve_slots(theme, space_type, required_items)
+        build = self._solve_plan_from_slots if solver == "optimal" else self._build_plan_from_slots
 
         for i, (budget, tiers) in enumerate(zip(budget_targets, tier_preferences)):
-            plan = self.build_plan(theme, space_type, required_items, budget, tiers)
+            plan = build(theme, space_type, slots, budget, tiers, alternatives)
             plan["plan_name"] = plan_names[i]
             plan["budget_limit"] = budget
             plans.append(plan)
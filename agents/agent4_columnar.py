@@ -0,0 +1,254 @@
+import copy
+from typing import List, Dict, Any
+
+import numpy as np
+
+from agents.agent4 import Agent4ProcurementEngine
+
+
+class ColumnarProcurementEngine:
+    """
+    Vectorized backend for Agent4ProcurementEngine.
+
+    The catalog is held as NumPy columns (price, tier code, item_type code,
+    theme/space bitmasks) and the cheapest candidate for every
+    (item_type, theme, space_type, tier) is resolved once at load time.
+    quote_batch then runs the greedy build_plan for many requests at once,
+    one slot position at a time, and returns exactly what
+    generate_comparison_plans would for each request.
+    """
+
+    def __init__(self, dataset: Dict[str, Any]):
+        self.items = dataset["items"]
+        self.price_ranges = dataset["metadata"]["price_ranges_inr"]
+        self.tiers = [tier for tier in self.price_ranges if tier != "diy"]
+
+        self.item_types = sorted({item["item_type"] for item in self.items})
+        self.themes = sorted({theme for item in self.items for theme in item["themes"]})
+        self.space_types = sorted({
+            space for item in self.items for space in item.get("space_types", [])
+        })
+
+        if len(self.themes) > 64 or len(self.space_types) > 64:
+            raise ValueError("Columnar engine supports at most 64 themes and 64 space types")
+
+        self.type_codes = {name: code for code, name in enumerate(self.item_types)}
+        self.theme_codes = {name: code for code, name in enumerate(self.themes)}
+        self.space_codes = {name: code for code, name in enumerate(self.space_types)}
+        self.tier_codes = {name: code for code, name in enumerate(self.tiers)}
+
+        self._load_columns()
+        self._build_tables()
+
+    # --------------------------------------------------
+    # COLUMNS
+    # --------------------------------------------------
+
+    def _tier_code(self, price) -> int:
+        for code, tier in enumerate(self.tiers):
+            limits = self.price_ranges[tier]
+            if limits["min"] <= price <= limits["max"]:
+                return code
+        return -1
+
+    def _load_columns(self):
+        n = len(self.items)
+
+        self.price = np.fromiter((item["price"] for item in self.items), dtype=np.int64, count=n)
+        self.tier_code = np.fromiter(
+            (self._tier_code(item["price"]) for item in self.items), dtype=np.int8, count=n
+        )
+        self.type_code = np.fromiter(
+            (self.type_codes[item["item_type"]] for item in self.items), dtype=np.int32, count=n
+        )
+        self.theme_mask = np.fromiter(
+            (sum(1 << self.theme_codes[t] for t in set(item["themes"])) for item in self.items),
+            dtype=np.uint64, count=n
+        )
+        self.space_mask = np.fromiter(
+            (sum(1 << self.space_codes[s] for s in set(item.get("space_types", []))) for item in self.items),
+            dtype=np.uint64, count=n
+        )
+        self.is_diy = np.fromiter((bool(item["is_diy"]) for item in self.items), dtype=bool, count=n)
+
+    def with_updated_items(self, items: List[Dict[str, Any]], changed_positions: List[int]):
+        """
+        Copy of this engine over `items` where only the rows in
+        changed_positions differ (prices only). Columns are patched in
+        place of a full reload and the lookup tables are recomputed.
+        """
+        engine = copy.copy(self)
+        engine.items = items
+
+        rows = np.asarray(changed_positions, dtype=np.int64)
+        engine.price = self.price.copy()
+        engine.tier_code = self.tier_code.copy()
+        if rows.size:
+            engine.price[rows] = [items[row]["price"] for row in rows]
+            engine.tier_code[rows] = [self._tier_code(items[row]["price"]) for row in rows]
+
+        engine._build_tables()
+        return engine
+
+    # --------------------------------------------------
+    # LOOKUP TABLES
+    # --------------------------------------------------
+
+    def _build_tables(self):
+        """
+        resolved[type, theme, space, tier] -> row of the cheapest candidate
+        after the strict/relaxed/item_type-only fallback, or -1.
+        The last theme/space slot means "unknown" and the last type slot is
+        reserved for item types missing from the catalog. The last tier slot
+        is "any tier".
+        """
+        Y, T, S, K = len(self.item_types), len(self.themes), len(self.space_types), len(self.tiers)
+        n = len(self.items)
+
+        # Price order, ties keep catalog order (same as a stable sort)
+        order = np.lexsort((np.arange(n), self.price))
+        o_type = self.type_code[order]
+        o_tier = self.tier_code[order]
+        o_theme = self.theme_mask[order]
+        o_space = self.space_mask[order]
+        o_shop = ~self.is_diy[order]
+
+        cheapest = np.full((Y, T + 1, S + 1, K + 1), -1, dtype=np.int64)
+
+        for t in range(T + 1):
+            theme_ok = o_shop if t == T else o_shop & ((o_theme & np.uint64(1 << t)) != 0)
+            for s in range(S + 1):
+                # Space-only matches are never part of the fallback chain
+                if t == T and s < S:
+                    continue
+                ok = theme_ok if s == S else theme_ok & ((o_space & np.uint64(1 << s)) != 0)
+
+                rows, types, tiers = order[ok], o_type[ok], o_tier[ok]
+                codes, first = np.unique(types, return_index=True)
+                cheapest[codes, t, s, K] = rows[first]
+
+                tiered = tiers >= 0
+                keys = types[tiered].astype(np.int64) * K + tiers[tiered]
+                keys, first = np.unique(keys, return_index=True)
+                cheapest[keys // K, t, s, keys % K] = rows[tiered][first]
+
+        any_theme = cheapest[:, T, S, :]
+        relaxed = cheapest[:, :T, S, :]
+        relaxed = np.where(relaxed[..., K:] >= 0, relaxed, any_theme[:, None, :])
+        strict = cheapest[:, :T, :S, :]
+        strict = np.where(strict[..., K:] >= 0, strict, relaxed[:, :, None, :])
+
+        resolved = np.full((Y + 1, T + 1, S + 1, K + 1), -1, dtype=np.int64)
+        resolved[:Y, :T, :S] = strict
+        resolved[:Y, :T, S] = relaxed
+        resolved[:Y, T, :] = any_theme[:, None, :]
+        self.resolved = resolved
+
+        # First DIY item per (type, theme) in catalog order
+        diy_first = np.full((Y + 1, T + 1), -1, dtype=np.int64)
+        diy_rows = np.flatnonzero(self.is_diy)
+        for t in range(T):
+            rows = diy_rows[(self.theme_mask[diy_rows] & np.uint64(1 << t)) != 0]
+            codes, first = np.unique(self.type_code[rows], return_index=True)
+            diy_first[codes, t] = rows[first]
+        self.diy_first = diy_first
+
+    # --------------------------------------------------
+    # BATCHED PLAN EVALUATION
+    # --------------------------------------------------
+
+    def _pack_requests(self, requests: List[Dict[str, Any]]):
+        Y, T, S = len(self.item_types), len(self.themes), len(self.space_types)
+
+        slot_types = [
+            [item["item_type"] for item in sorted(req.get("required_items", []), key=lambda x: x["priority"])]
+            for req in requests
+        ]
+        width = max((len(types) for types in slot_types), default=0)
+
+        type_idx = np.full((len(requests), width), Y, dtype=np.int64)
+        for r, types in enumerate(slot_types):
+            type_idx[r, :len(types)] = [self.type_codes.get(t, Y) for t in types]
+
+        theme_idx = np.array([self.theme_codes.get(req.get("theme"), T) for req in requests], dtype=np.int64)
+        space_idx = np.array([self.space_codes.get(req.get("space_type"), S) for req in requests], dtype=np.int64)
+        budgets = np.array([int(req["budget"]) for req in requests], dtype=np.int64)
+
+        return slot_types, type_idx, theme_idx, space_idx, budgets
+
+    def quote_batch(self, requests: List[Dict[str, Any]], include_items: bool = True) -> List[List[Dict[str, Any]]]:
+        """
+        Evaluates the three comparison plans for every request in one pass.
+
+        :param requests: dicts with theme, space_type, required_items, budget
+        :param include_items: when False only totals are returned per plan
+        :return: one list of comparison plans per request, in input order
+        """
+        if not requests:
+            return []
+
+        slot_types, type_idx, theme_idx, space_idx, budgets = self._pack_requests(requests)
+        R, M = type_idx.shape
+        K = len(self.tiers)
+
+        # (R, M, K + 1) candidate rows and prices for every slot
+        rows = self.resolved[type_idx, theme_idx[:, None], space_idx[:, None]]
+        prices = np.where(rows >= 0, self.price[rows], 0)
+
+        # Suffix sums of the cheapest low-tier price (estimate_min_remaining_cost)
+        min_remaining = np.zeros((R, M + 1), dtype=np.int64)
+        if "low" in self.tier_codes and M:
+            low_prices = prices[:, :, self.tier_codes["low"]]
+            min_remaining[:, :M] = low_prices[:, ::-1].cumsum(axis=1)[:, ::-1]
+
+        plans = []
+        for ratio, tier_order in zip(Agent4ProcurementEngine.BUDGET_RATIOS, Agent4ProcurementEngine.TIER_PREFERENCES):
+            target = budgets if ratio == 1 else (budgets * ratio).astype(np.int64)
+            tier_slots = [self.tier_codes[tier] for tier in tier_order if tier in self.tier_codes] + [K]
+
+            total = np.zeros(R, dtype=np.int64)
+            chosen = np.full((R, M), -1, dtype=np.int64)
+
+            for j in range(M):
+                selected = np.full(R, -1, dtype=np.int64)
+                headroom = target - total - min_remaining[:, j + 1]
+                # Preferred tiers first, then the cheapest of any tier
+                for k in tier_slots:
+                    fits = (selected < 0) & (rows[:, j, k] >= 0) & (prices[:, j, k] <= headroom)
+                    selected = np.where(fits, rows[:, j, k], selected)
+                chosen[:, j] = selected
+                total += np.where(selected >= 0, self.price[selected], 0)
+
+            plans.append((target, total, chosen))
+
+        return self._materialize(slot_types, theme_idx, type_idx, plans, include_items)
+
+    def _materialize(self, slot_types, theme_idx, type_idx, plans, include_items):
+        results = []
+        plan_names = Agent4ProcurementEngine.PLAN_NAMES
+
+        for r, types in enumerate(slot_types):
+            request_plans = []
+            for name, (target, total, chosen) in zip(plan_names, plans):
+                plan = {
+                    "total_cost": int(total[r]),
+                    "savings": max(0, int(target[r] - total[r]))
+                }
+                if include_items:
+                    plan["items"] = [
+                        self._slot_entry(item_type, int(chosen[r, j]), type_idx[r, j], theme_idx[r])
+                        for j, item_type in enumerate(types)
+                    ]
+                plan["plan_name"] = name
+                plan["budget_limit"] = int(target[r])
+                request_plans.append(plan)
+            results.append(request_plans)
+
+        return results
+
+    def _slot_entry(self, item_type, row, type_code, theme_code):
+        if row >= 0:
+            return Agent4ProcurementEngine.plan_entry(item_type, self.items[row])
+
+        diy_row = self.diy_first[type_code, theme_code]
+        return Agent4ProcurementEngine.diy_entry(item_type, self.items[diy_row] if diy_row >= 0 else None)
@@ -0,0 +1,188 @@
+from array import array
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+
+def _ngrams(text: str, n: int) -> List[str]:
+    """Character n-grams of every word, padded so word edges count."""
+    grams = []
+    for word in text.lower().split():
+        padded = f" {word} "
+        grams.extend(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+    return grams
+
+
+class ItemSimilarityIndex:
+    """
+    Character n-gram TF-IDF over catalog items, for "more like this".
+
+    Every item is a document made of its name and attributes. The weights
+    are kept as one inverted index (column-major sparse matrix) per
+    item_type, so scoring a query item against its own type is a sparse
+    matrix-vector product over only the postings of the query's n-grams.
+    A batch of queries is scored with one bincount.
+
+    N-grams found in more than MAX_DF of an item_type's items (the "car"
+    of every carpet) say nothing about which carpets look alike, so they
+    are dropped from that type's vectors, like a vectorizer's max_df.
+    This also keeps the longest posting lists out of every query.
+    """
+
+    # Caps the dense (queries x candidates) score block scored at once
+    MAX_BLOCK = 1 << 22
+
+    MAX_DF = 0.5
+    # Smaller item_type groups keep every n-gram
+    MAX_DF_MIN_GROUP = 20
+
+    def __init__(self, items: List[Dict[str, Any]], n: int = 3):
+        self.n = n
+        self.size = len(items)
+
+        # Term counts as flat (row, col, tf) triplets, rows ascending
+        vocab: Dict[str, int] = {}
+        cols, tf, lengths = array("i"), array("i"), array("i")
+        for item in items:
+            counts = Counter(_ngrams(self.document(item), n))
+            cols.extend(vocab.setdefault(gram, len(vocab)) for gram in counts)
+            tf.extend(counts.values())
+            lengths.append(len(counts))
+        self.vocab = vocab
+        V = max(1, len(vocab))
+
+        rows = np.repeat(np.arange(self.size, dtype=np.int32), np.frombuffer(lengths, dtype=np.int32))
+        cols = np.frombuffer(cols, dtype=np.int32)
+        tf = np.frombuffer(tf, dtype=np.int32)
+
+        df = np.bincount(cols, minlength=V)
+        self.idf = (np.log((1 + self.size) / (1 + df)) + 1).astype(np.float32)
+        del df
+
+        # Items grouped by item_type; positions are local to their group
+        type_names = sorted({item["item_type"] for item in items})
+        self.type_codes = {name: code for code, name in enumerate(type_names)}
+        group = np.fromiter((self.type_codes[item["item_type"]] for item in items), dtype=np.int64, count=self.size)
+        self.group_rows = [np.flatnonzero(group == code) for code in range(len(type_names))]
+        self.local = np.zeros(self.size, dtype=np.int32)
+        for members in self.group_rows:
+            self.local[members] = np.arange(len(members), dtype=np.int32)
+
+        # Per item_type document frequency -> drop n-grams above MAX_DF
+        group_size = np.array([len(members) for members in self.group_rows])
+        limit = np.where(group_size >= self.MAX_DF_MIN_GROUP, group_size * self.MAX_DF, group_size)
+        keys = group[rows] * V + cols
+        group_df = np.bincount(keys, minlength=len(type_names) * V)
+        keep = group_df[keys] <= limit[group[rows]]
+        rows, cols, tf, keys = rows[keep], cols[keep], tf[keep], keys[keep]
+        del group_df, keep
+
+        weights = self.idf[cols] * tf.astype(np.float32)
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=self.size)).astype(np.float32)
+        weights /= np.maximum(norms, 1e-12)[rows]
+
+        # Inverted index: postings sorted by (group, n-gram), then row
+        order = np.argsort(keys, kind="stable")
+        self.post_rows = self.local[rows[order]]
+        self.post_weights = weights[order]
+        counts = np.bincount(keys, minlength=len(type_names) * V)
+        self.post_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.V = V
+
+        self.shop = np.fromiter((not item["is_diy"] for item in items), dtype=bool, count=self.size)
+        self.themes: Dict[str, np.ndarray] = {}
+        for pos, item in enumerate(items):
+            for theme in item["themes"]:
+                self.themes.setdefault(theme, np.zeros(self.size, dtype=bool))[pos] = True
+
+    @staticmethod
+    def document(item) -> str:
+        return " ".join([
+            item["name"], item.get("category", ""), item["quality_level"],
+            *item.get("space_types", [])
+        ]).replace("_", " ")
+
+    def _vector(self, item) -> Tuple[np.ndarray, np.ndarray]:
+        ids = [self.vocab[gram] for gram in _ngrams(self.document(item), self.n) if gram in self.vocab]
+        cols, tf = np.unique(np.asarray(ids, dtype=np.int64), return_counts=True)
+        # Only n-grams still indexed for the item's type (drops the MAX_DF ones)
+        base = self.type_codes[item["item_type"]] * self.V + cols
+        indexed = self.post_offsets[base + 1] > self.post_offsets[base]
+        cols, tf = cols[indexed], tf[indexed]
+        weights = tf * self.idf[cols]
+        return cols, weights / max(float(np.sqrt((weights * weights).sum())), 1e-12)
+
+    # --------------------------------------------------
+    # QUERIES
+    # --------------------------------------------------
+
+    def query(
+        self,
+        items: List[Dict[str, Any]],
+        positions: List[int],
+        k: int = 5,
+        theme: Optional[str] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k most similar shop items of the same item_type for each
+        position, as (position, cosine similarity), best first. Candidates
+        must share `theme`, or any theme of the query item when None.
+        """
+        results: List[List[Tuple[int, float]]] = [[] for _ in positions]
+
+        by_group: Dict[int, List[int]] = {}
+        for n, pos in enumerate(positions):
+            by_group.setdefault(self.type_codes[items[pos]["item_type"]], []).append(n)
+
+        for code, queries in by_group.items():
+            members = self.group_rows[code]
+            chunk = max(1, self.MAX_BLOCK // max(1, len(members)))
+            for start in range(0, len(queries), chunk):
+                batch = queries[start:start + chunk]
+                scores = self._score_group(code, len(members), [items[positions[n]] for n in batch])
+                for row, n in enumerate(batch):
+                    results[n] = self._top_k(
+                        items, members, scores[row], positions[n], k, theme
+                    )
+        return results
+
+    def _score_group(self, code: int, size: int, query_items) -> np.ndarray:
+        """(len(query_items), size) cosine scores against one item_type group."""
+        vectors = [self._vector(item) for item in query_items]
+        cols = np.concatenate([c for c, _ in vectors])
+        vals = np.concatenate([w for _, w in vectors])
+        owner = np.repeat(np.arange(len(vectors)), [len(c) for c, _ in vectors])
+
+        starts = self.post_offsets[code * self.V + cols]
+        lengths = self.post_offsets[code * self.V + cols + 1] - starts
+        total = int(lengths.sum())
+
+        # Expand every (query, n-gram) into its posting list
+        firsts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        postings = np.repeat(starts, lengths) + (np.arange(total) - firsts)
+        weights = self.post_weights[postings] * np.repeat(vals, lengths)
+        slots = np.repeat(owner, lengths) * size + self.post_rows[postings]
+
+        return np.bincount(slots, weights=weights, minlength=len(vectors) * size).reshape(len(vectors), size)
+
+    def _top_k(self, items, members, scores, pos, k, theme):
+        if theme is not None:
+            allowed = self.themes.get(theme)
+            if allowed is None:
+                return []
+            allowed = allowed[members]
+        else:
+            allowed = np.zeros(len(members), dtype=bool)
+            for name in items[pos]["themes"]:
+                allowed |= self.themes[name][members]
+
+        allowed &= self.shop[members] & (scores > 0)
+        allowed[self.local[pos]] = False
+
+        candidates = np.flatnonzero(allowed)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        # Best first, ties in catalog order
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(int(members[c]), round(float(scores[c]), 4)) for c in candidates]
@@ -0,0 +1,201 @@
+import os
+import sys
+import copy
+from typing import Dict, Any, Optional, Tuple
+
+# Add the project root to sys.path to allow importing from utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.agent1 import SceneStructuringAgent
+from agents.agent2 import DesignPlannerAgent
+from utils.gemini_client import generate_response, generate_response_async
+from utils.aio import run_blocking
+from utils.prompts import PromptBuilder
+from utils.uploads import file_digest
+
+
+class FusedScenePlanAgent:
+    """
+    Agents 1 and 2 in one Gemini call (initial runs only).
+
+    One prompt asks for Agent 1's scene and Agent 2's plan together. Each
+    half then goes through its agent's own _validate_output, so the
+    output matches the two-step path.
+
+    run() returns (scene, plan). plan is None when only the scene half is
+    usable, and run() returns None when the scene half is not usable either.
+    The pipeline then falls back to the separate calls.
+    """
+
+    INSTRUCTIONS_TEMPLATE = """
+You are a Professional Interior Scene and Design Planning Agent.
+
+Your job has two steps, answered together as ONE JSON object:
+1. "scene": convert raw user input (text and optional image) into structured scene data.
+2. "plan": from that scene, generate a culturally accurate, space-aware design plan.
+
+SCENE - Analyze description_text, preferred_theme and budget.
+{image_instruction}
+Infer:
+- space_type (living_room, bedroom, kitchen, study_room)
+- detected_elements (list of furniture or features mentioned in text OR seen in image)
+- theme (must be one of: traditional_indian, contemporary_indian, rustic_indian, rajasthani_mughal)
+- budget (integer; default 20000 if missing)
+- image_analysis (object containing: description, detected_elements, dominant_colors, style_type)
+If theme is missing, default to traditional_indian.
+
+PLAN - STRICT RULES:
+1. Use ONLY these item_type values: study_table, ergonomic_chair, bookshelf, wall_art, wall_panel,
+floor_lamp, ceiling_light, carpet, curtains, storage_unit, decor_statue, accent_wall_paint
+2. Use ONLY these categories: furniture, lighting, decor, textile, storage, wall_treatment
+3. DO NOT recommend items already present in the scene's detected_elements.
+4. DO NOT include product names or prices.
+5. Maximum 6 required_items; priorities are integers starting from 1.
+6. Use the scene's space_type and theme exactly.
+
+Respond ONLY in valid JSON. Do not include markdown or explanations.
+
+Required Output Format:
+{{
+  "scene": {{
+    "space_type": "",
+    "detected_elements": [],
+    "theme": "",
+    "budget": 0,
+    "image_analysis": {{
+      "description": "",
+      "detected_elements": [],
+      "dominant_colors": [],
+      "style_type": "current_state | reference_preference | none"
+    }}
+  }},
+  "plan": {{
+    "design_summary": "",
+    "space_type": "",
+    "theme": "",
+    "required_items": [
+      {{"item_type": "", "category": "", "priority": 0, "placement": "", "reason": ""}}
+    ],
+    "visualization": {{
+      "style_keywords": [],
+      "color_palette": [],
+      "material_focus": [],
+      "lighting_style": "",
+      "visual_prompt": ""
+    }}
+  }}
+}}
+"""
+    INSTRUCTIONS = INSTRUCTIONS_TEMPLATE.format(image_instruction="")
+    IMAGE_INSTRUCTIONS = INSTRUCTIONS_TEMPLATE.format(image_instruction="""
+- Analyze the provided IMAGE carefully: current layout, existing furniture, dominant colors and materials.
+- Say if the image is a 'current_state' or a 'reference_preference'.
+""")
+
+    def __init__(self, agent1: SceneStructuringAgent, agent2: DesignPlannerAgent, prompt_tokens: int = 1400):
+        """
+        :param agent1, agent2: the pipeline's agents, for validation and Agent 1's scene cache
+        :param prompt_tokens: prompt token budget, a longer description_text is shortened
+        """
+        self.agent1 = agent1
+        self.agent2 = agent2
+        self.prompt = PromptBuilder(
+            "FusedScenePlanAgent", self.INSTRUCTIONS, "User Input", prompt_tokens,
+            fields=SceneStructuringAgent.CACHE_FIELDS,
+            truncate="description_text"
+        )
+
+    def run(
+        self,
+        user_input: Dict[str, Any],
+        image_path: str = None,
+        image_hash: Optional[str] = None
+    ) -> Optional[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+
+        if image_path and not image_hash and os.path.exists(image_path):
+            image_hash = file_digest(image_path)
+        cache_key = self.agent1._cache_key(user_input, image_hash)
+
+        cached = self.agent1.cache.get(cache_key)
+        if cached is not None:
+            # Known scene: only the plan call is left, and Agent 2 makes it
+            print("[FUSED] Reusing scene analysis for this image and input.")
+            return copy.deepcopy(cached), None
+
+        prompt = self._build_prompt(user_input, has_image=bool(image_path))
+
+        try:
+            response_text = generate_response(
+                prompt, image_path=image_path, image_hash=image_hash, validate=self._is_usable
+            )
+        except Exception as e:
+            print(f"Fused Agent API Error: {e}")
+            response_text = ""
+
+        return self._finish(cache_key, response_text)
+
+    async def run_async(
+        self,
+        user_input: Dict[str, Any],
+        image_path: str = None,
+        image_hash: Optional[str] = None
+    ) -> Optional[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """run() without blocking the event loop."""
+
+        if image_path and not image_hash and os.path.exists(image_path):
+            image_hash = await run_blocking(file_digest, image_path)
+        cache_key = self.agent1._cache_key(user_input, image_hash)
+
+        cached = self.agent1.cache.get(cache_key)
+        if cached is not None:
+            print("[FUSED] Reusing scene analysis for this image and input.")
+            return copy.deepcopy(cached), None
+
+        prompt = self._build_prompt(user_input, has_image=bool(image_path))
+
+        try:
+            response_text = await generate_response_async(
+                prompt, image_path=image_path, image_hash=image_hash, validate=self._is_usable
+            )
+        except Exception as e:
+            print(f"Fused Agent API Error: {e}")
+            response_text = ""
+
+        return self._finish(cache_key, response_text)
+
+    def _build_prompt(self, user_input: Dict[str, Any], has_image: bool = False) -> str:
+        return self.prompt.build(user_input, self.IMAGE_INSTRUCTIONS if has_image else self.INSTRUCTIONS)
+
+    @staticmethod
+    def _usable_scene(parsed) -> bool:
+        # Agent 1's validation fills in defaults for anything missing, so an
+        # unusable scene half is caught before it
+        scene = parsed.get("scene")
+        return isinstance(scene, dict) and bool(scene.get("space_type")) and bool(scene.get("theme"))
+
+    def _is_usable(self, response_text: str) -> bool:
+        """Whether the LLM cache may keep a response: it must carry a usable scene."""
+        parsed = self.agent1._safe_json_parse(response_text, quiet=True)
+        return isinstance(parsed, dict) and self._usable_scene(parsed)
+
+    def _finish(self, cache_key, response_text: str):
+        parsed = self.agent1._safe_json_parse(response_text) if response_text else None
+        if not isinstance(parsed, dict):
+            print("[FUSED] No usable response. Falling back to separate calls.")
+            return None
+
+        if not self._usable_scene(parsed):
+            print("[FUSED] Scene missing from the response. Falling back to separate calls.")
+            return None
+        scene = parsed["scene"]
+
+        scene_data = self.agent1._validate_output(scene)
+        self.agent1.cache.put(cache_key, copy.deepcopy(scene_data))
+
+        plan = parsed.get("plan")
+        design_plan = self.agent2._validate_output(plan, scene_data) if isinstance(plan, dict) else None
+        if not design_plan or not design_plan["required_items"]:
+            print("[FUSED] Plan missing or empty after validation. Falling back to Agent 2.")
+            return scene_data, None
+
+        return scene_data, design_plan
@@ -1,6 +1,5 @@
 import os
 import json
-import uuid
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
@@ -9,6 +8,12 @@ from auth_utils import encode_token, token_required
 from dotenv import load_dotenv
 from services.pipeline import InteriorDesignPipeline
 from models import DesignHistory
+from services.catalog import CatalogLog, CatalogManager, parse_price_delta
+from services.catalog_search import CatalogSearchIndex, CursorExpired, file_fingerprint
+from utils.catalog_binary import load_catalog_file
+from utils.uploads import save_upload
+from utils.gemini_client import router as gemini_router, response_cache as llm_cache, image_preprocessor, gemini_guard
+from utils.usage import usage_stats
 
 load_dotenv()
 
@@ -29,9 +34,19 @@ app.config['JSON_SORT_KEYS'] = False
 # Configurations
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'instance', 'users.db')
-DATASET_PATH = os.path.join(BASE_DIR, "dataset", "indian_interior_v2.json")
+# JSON or a compiled catalog (python -m utils.catalog_binary compile ...)
+DATASET_PATH = os.environ.get("CATALOG_PATH") or os.path.join(BASE_DIR, "dataset", "indian_interior_v2.json")
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
 
+# Upper bound on projects priced in one bulk quote call
+MAX_BULK_QUOTES = 10000
+
+# Page size cap for /api/catalog/search
+MAX_SEARCH_RESULTS = 100
+
+# Upper bound on items looked up in one /api/catalog/similar call
+MAX_SIMILAR_QUERIES = 1000
+
 # Enumerated Locations for Business Intelligence
 SUPPORTED_LOCATIONS = [
     "Mumbai, MH",
@@ -58,11 +73,31 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'default-secret-key-for-
 db.init_app(app)
 bcrypt = Bcrypt(app)
 
-# Load dataset and initialize pipeline
-with open(DATASET_PATH) as f:
-    dataset = json.load(f)
+# Load dataset and initialize pipeline (Agent 4 keeps a compact copy, the raw JSON is dropped).
+# Compiled catalogs are memory-mapped, so workers forked after import share the pages.
+# Their checksum is left to `python -m utils.catalog_binary inspect`, hashing would read every page.
+dataset = load_catalog_file(DATASET_PATH, verify=False)
 pipeline = InteriorDesignPipeline(dataset)
 
+# On-disk FTS index for /api/catalog/search, rebuilt only when the dataset file changes
+search_index = CatalogSearchIndex()
+search_index.ensure(pipeline.agent4.items, file_fingerprint(DATASET_PATH))
+
+# Opt-in for multi-worker deployments: a shared change log lets every worker apply
+# the reloads and price deltas that reach one of them
+catalog_sync = os.environ.get('CATALOG_SYNC', '0') == '1'
+catalog = CatalogManager(
+    pipeline, dataset_path=DATASET_PATH, search=search_index, loaded=dataset,
+    log=CatalogLog() if catalog_sync else None
+)
+del dataset
+if catalog_sync:
+    catalog.follow(float(os.environ.get('CATALOG_SYNC_INTERVAL', 1.0)))
+
+# Optional: pick up edits to the dataset file without a restart
+if os.environ.get('CATALOG_WATCH') == '1':
+    catalog.watch()
+
 # Create database tables
 with app.app_context():
     db.create_all()
@@ -140,70 +175,247 @@ def logout(current_user_id):
 
 # --- Core AI Interior Routes ---
 
+def user_id_from_auth_header(auth_header):
+    """User id from an optional Bearer token, None when missing or invalid."""
+    if not auth_header:
+        return None
+    # Simple extraction for history tracking, not strictly enforced for the generation itself
+    from auth_utils import decode_token
+    try:
+        token = auth_header.split(" ")[1]
+        return decode_token(token)
+    except:
+        return None
+
+def design_input_from_form(form, image=None):
+    """
+    Pipeline input from multipart/form-data fields.
+    :param image: (stream, filename) of the uploaded photo, if any
+    """
+    user_input = {
+        "description_text": form.get("description_text"),
+        "theme": form.get("theme"),
+        "budget": form.get("budget"),
+        "plan_solver": form.get("plan_solver"),
+        "alternatives": form.get("alternatives"),
+    }
+    
+    # Check if previous_scene_data is present (for iterations)
+    prev_data = form.get("previous_scene_data")
+    if prev_data:
+        user_input["previous_scene_data"] = json.loads(prev_data)
+
+    # Known required_items let the pipeline reject infeasible budgets before any LLM call
+    required_items = form.get("required_items")
+    if required_items:
+        user_input["required_items"] = json.loads(required_items)
+
+    if image:
+        # Same photo, same file: repeat uploads are neither rewritten nor re-analyzed
+        image_path, image_hash, stored = save_upload(*image, UPLOAD_FOLDER)
+        if stored:
+            print(f"[UPLOAD] Reusing stored upload {os.path.basename(image_path)}")
+        user_input["image_path"] = image_path
+        user_input["image_hash"] = image_hash
+    return user_input
+
+def save_design_history(current_user_id, user_input, result):
+    """Records a successful design for the user; needs an app context."""
+    try:
+        history = DesignHistory(
+            user_id=current_user_id,
+            theme=result["design_strategy"].get("theme", ""),
+            space_type=result["design_strategy"].get("space_type", ""),
+            budget=int(user_input.get("budget", 0)),
+            total_cost=result["procurement"]["comparison_plans"][0].get("total_cost", 0) if result["procurement"]["comparison_plans"] else 0,
+            selected_plan=result["procurement"]["comparison_plans"][0].get("plan_name", "") if result["procurement"]["comparison_plans"] else "Generic",
+            design_intensity=result["visuals"].get("used_intensity", "moderate"),
+            image_url=result["visuals"]["image_links"][0] if result["visuals"]["image_links"] else "",
+            procurement_plans_json=json.dumps(result["procurement"].get("comparison_plans", []))
+        )
+        db.session.add(history)
+        db.session.commit()
+    except Exception as e:
+        print(f"Error saving history: {e}")
+
 @app.route("/generate-design", methods=["POST"])
 # @token_required 
 def generate_design():
     # Attempt to get user_id from token if available (semi-protected)
-    auth_header = request.headers.get('Authorization')
-    current_user_id = None
-    if auth_header:
-        # Simple extraction for history tracking, not strictly enforced for the generation itself
-        from auth_utils import decode_token
-        try:
-            token = auth_header.split(" ")[1]
-            current_user_id = decode_token(token)
-        except:
-            pass
+    current_user_id = user_id_from_auth_header(request.headers.get('Authorization'))
 
     # Handle both JSON and Multipart data
     if request.is_json:
         user_input = request.json
     else:
         # Handle multipart/form-data
-        user_input = {
-            "description_text": request.form.get("description_text"),
-            "theme": request.form.get("theme"),
-            "budget": request.form.get("budget"),
-        }
-        
-        # Check if previous_scene_data is present (for iterations)
-        prev_data = request.form.get("previous_scene_data")
-        if prev_data:
-            user_input["previous_scene_data"] = json.loads(prev_data)
-            
         file = request.files.get("image")
-        if file and file.filename != "":
-            filename = f"upload_{uuid.uuid4().hex[:8]}_{file.filename}"
-            image_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(image_path)
-            user_input["image_path"] = image_path
+        image = (file.stream, file.filename) if file and file.filename != "" else None
+        user_input = design_input_from_form(request.form, image)
 
     if not user_input:
         return jsonify({"status": "error", "message": "No input provided"}), 400
+
+    try:
+        pipeline.parse_alternatives(user_input)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid design request: {e}"}), 400
         
-    result = pipeline.run(user_input)
+    # ?timings=1 adds per-call latency, tokens and cost to the response
+    result = pipeline.run(user_input, timings=request.args.get("timings") == "1")
 
     # Save to history if logged in
     if current_user_id and result.get("status") == "success":
-        try:
-            history = DesignHistory(
-                user_id=current_user_id,
-                theme=result["design_strategy"].get("theme", ""),
-                space_type=result["design_strategy"].get("space_type", ""),
-                budget=int(user_input.get("budget", 0)),
-                total_cost=result["procurement"]["comparison_plans"][0].get("total_cost", 0) if result["procurement"]["comparison_plans"] else 0,
-                selected_plan=result["procurement"]["comparison_plans"][0].get("plan_name", "") if result["procurement"]["comparison_plans"] else "Generic",
-                design_intensity=result["visuals"].get("used_intensity", "moderate"),
-                image_url=result["visuals"]["image_links"][0] if result["visuals"]["image_links"] else "",
-                procurement_plans_json=json.dumps(result["procurement"].get("comparison_plans", []))
-            )
-            db.session.add(history)
-            db.session.commit()
-        except Exception as e:
-            print(f"Error saving history: {e}")
+        save_design_history(current_user_id, user_input, result)
 
     return jsonify(result)
 
+@app.route("/api/quotes/bulk", methods=["POST"])
+@token_required
+def bulk_quotes(current_user_id):
+    """
+    Re-prices many saved projects against the current catalog in one pass.
+    Body: {"requests": [{"id", "theme", "space_type", "required_items", "budget"}], "include_items": true}
+    """
+    data = request.get_json(silent=True) or {}
+    projects = data.get("requests")
+
+    if not isinstance(projects, list) or not projects:
+        return jsonify({"status": "error", "message": "'requests' must be a non-empty list"}), 400
+
+    if len(projects) > MAX_BULK_QUOTES:
+        return jsonify({"status": "error", "message": f"At most {MAX_BULK_QUOTES} requests per call"}), 400
+
+    try:
+        quotes = catalog.quote_engine.quote_batch(projects, include_items=bool(data.get("include_items", True)))
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return jsonify({"status": "error", "message": f"Invalid quote request: {e}"}), 400
+
+    return jsonify({
+        "status": "success",
+        "count": len(quotes),
+        "quotes": [
+            {"id": project.get("id"), "comparison_plans": plans}
+            for project, plans in zip(projects, quotes)
+        ]
+    })
+
+@app.route("/api/quotes/sweep", methods=["POST"])
+def budget_sweep():
+    """
+    Cost-vs-quality frontier for a design's required_items across a budget range.
+    Body: {"theme", "space_type", "required_items", "min_budget", "max_budget"}
+    """
+    data = request.get_json(silent=True) or {}
+    required_items = data.get("required_items")
+
+    if not isinstance(required_items, list):
+        return jsonify({"status": "error", "message": "'required_items' must be a list"}), 400
+
+    try:
+        max_budget = int(data.get("max_budget"))
+        min_budget = int(data.get("min_budget", 0))
+        frontier = pipeline.agent4.budget_sweep(
+            theme=data.get("theme"),
+            space_type=data.get("space_type"),
+            required_items=required_items,
+            min_budget=min_budget,
+            max_budget=max_budget
+        )
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return jsonify({"status": "error", "message": f"Invalid sweep request: {e}"}), 400
+
+    return jsonify({
+        "status": "success",
+        "min_budget": min_budget,
+        "max_budget": max_budget,
+        "frontier": frontier
+    })
+
+@app.route("/api/quotes/precheck", methods=["POST"])
+def budget_precheck():
+    """
+    Minimum feasible and saturation budgets for required_items, no LLM calls.
+    Body: {"theme", "space_type", "required_items", "budget": optional, "plan_solver": optional}
+    """
+    data = request.get_json(silent=True) or {}
+    required_items = data.get("required_items")
+
+    if not isinstance(required_items, list):
+        return jsonify({"status": "error", "message": "'required_items' must be a list"}), 400
+
+    try:
+        budget = data.get("budget")
+        bounds = pipeline.agent4.budget_bounds(
+            theme=data.get("theme"),
+            space_type=data.get("space_type"),
+            required_items=required_items,
+            user_budget=int(budget) if budget is not None else None,
+            solver=data.get("plan_solver") or "greedy"
+        )
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return jsonify({"status": "error", "message": f"Invalid precheck request: {e}"}), 400
+
+    return jsonify({"status": "success", **bounds})
+
+@app.route("/api/catalog/search", methods=["GET"])
+def catalog_search():
+    """
+    Full-text search on item names, cheapest first.
+    Query: q, theme, space_type, item_type, min_price, max_price, limit, cursor
+    """
+    args = request.args
+
+    try:
+        limit = int(args.get("limit", 20))
+        if not 1 <= limit <= MAX_SEARCH_RESULTS:
+            raise ValueError(f"limit must be between 1 and {MAX_SEARCH_RESULTS}")
+        min_price, max_price = (
+            int(args[key]) if args.get(key) else None for key in ("min_price", "max_price")
+        )
+        result = search_index.search(
+            args.get("q", ""),
+            theme=args.get("theme"),
+            space_type=args.get("space_type"),
+            item_type=args.get("item_type"),
+            min_price=min_price,
+            max_price=max_price,
+            limit=limit,
+            cursor=args.get("cursor")
+        )
+    except CursorExpired as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid search request: {e}"}), 400
+
+    return jsonify({"status": "success", **result})
+
+@app.route("/api/catalog/similar", methods=["POST"])
+def similar_items():
+    """
+    Look-alikes for rejected plan items, same item_type and theme.
+    Body: {"item_ids": [...], "k": 5, "theme": optional}
+    """
+    data = request.get_json(silent=True) or {}
+    item_ids = data.get("item_ids")
+
+    if not isinstance(item_ids, list) or not item_ids or not all(isinstance(i, str) for i in item_ids):
+        return jsonify({"status": "error", "message": "'item_ids' must be a non-empty list of ids"}), 400
+
+    if len(item_ids) > MAX_SIMILAR_QUERIES:
+        return jsonify({"status": "error", "message": f"At most {MAX_SIMILAR_QUERIES} items per call"}), 400
+
+    try:
+        similar = pipeline.agent4.similar_items(item_ids, k=int(data.get("k", 5)), theme=data.get("theme"))
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid similar items request: {e}"}), 400
+
+    return jsonify({
+        "status": "success",
+        "similar": similar,
+        "unknown_ids": [item_id for item_id in item_ids if item_id not in similar]
+    })
+
 @app.route("/user/history", methods=["GET"])
 @token_required
 def get_user_history(current_user_id):
@@ -289,9 +501,56 @@ def get_admin_stats(current_user_id):
         "budget_distribution": budget_distribution,
         "location_distribution": location_distribution,
         "heatmap_data": heatmap_data,
-        "trend": trend
+        "trend": trend,
+        "plan_cache": pipeline.agent4.plan_cache.stats(),
+        "gemini": gemini_router.stats(),
+        "llm_cache": llm_cache.stats(),
+        "scene_cache": pipeline.agent1.cache.stats(),
+        "image_prep": image_preprocessor.stats(),
+        "upstreams": {
+            "gemini": gemini_guard.stats(),
+            "imagen": pipeline.agent3.guard.stats()
+        },
+        "usage": usage_stats.stats(),
+        "prompts": {
+            "scene": pipeline.agent1.prompt.stats(),
+            "plan": pipeline.agent2.prompt.stats(),
+            "fused": pipeline.fused.prompt.stats() if pipeline.fused else None
+        }
     })
 
+@app.route("/admin/catalog/reload", methods=["POST"])
+@token_required
+def reload_catalog(current_user_id):
+    """
+    Hot-swaps the procurement catalog without restarting workers. Only
+    this worker process is updated unless CATALOG_SYNC=1, in which case
+    the others apply it within CATALOG_SYNC_INTERVAL seconds.
+    - application/json: full catalog in the indian_interior_v2.json schema
+    - text/csv or application/x-ndjson: streamed `id,price` delta
+    - empty body: re-read the dataset file from disk
+    """
+    admin = db.session.get(User, current_user_id)
+    if not admin or not admin.is_admin:
+        return jsonify({"message": "Forbidden"}), 403
+
+    mimetype = request.mimetype
+    try:
+        if mimetype == "application/json":
+            report = catalog.reload_full(request.get_json())
+        elif mimetype in ("text/csv", "application/x-ndjson", "application/jsonl"):
+            fmt = "csv" if mimetype == "text/csv" else "jsonl"
+            lines = (line.decode("utf-8") for line in request.stream)
+            report = catalog.apply_price_delta(parse_price_delta(lines, fmt), source=fmt)
+        elif not request.content_length:
+            report = catalog.reload_from_file()
+        else:
+            return jsonify({"status": "error", "message": f"Unsupported content type: {mimetype}"}), 415
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return jsonify({"status": "error", "message": f"Catalog reload rejected: {e}"}), 400
+
+    return jsonify({"status": "success", "reload": report})
+
 @app.route('/protected', methods=['GET'])
 @token_required
 def protected(current_user_id):
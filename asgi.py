@@ -0,0 +1,76 @@
+"""
+Async entry point.
+
+POST /generate-design runs InteriorDesignPipeline.run_async on the event
+loop, so a design request waiting on Gemini or Imagen holds no thread and
+one process can keep hundreds of them in flight. Every other route is the
+unchanged Flask app, served through a WSGI bridge.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+"""
+import json
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+from app import (
+    app as flask_app, pipeline,
+    design_input_from_form, save_design_history, user_id_from_auth_header
+)
+from utils.aio import run_blocking
+
+# Same headers the Flask app adds in after_request
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type,Authorization",
+    "Access-Control-Allow-Methods": "GET,PUT,POST,DELETE,OPTIONS",
+}
+
+
+def _save_history(current_user_id, user_input, result):
+    with flask_app.app_context():
+        save_design_history(current_user_id, user_input, result)
+
+
+async def generate_design(request: Request):
+    if request.method == "OPTIONS":
+        return Response(status_code=200, headers=CORS_HEADERS)
+
+    current_user_id = user_id_from_auth_header(request.headers.get("Authorization"))
+
+    try:
+        if request.headers.get("content-type", "").startswith("application/json"):
+            user_input = await request.json()
+        else:
+            form = await request.form()
+            file = form.get("image")
+            image = (file.file, file.filename) if getattr(file, "filename", None) else None
+            # Hashing and storing the upload is file I/O
+            user_input = await run_blocking(design_input_from_form, form, image)
+    except (ValueError, json.JSONDecodeError) as e:
+        return JSONResponse({"status": "error", "message": f"Invalid design request: {e}"}, 400, headers=CORS_HEADERS)
+
+    if not user_input:
+        return JSONResponse({"status": "error", "message": "No input provided"}, 400, headers=CORS_HEADERS)
+
+    try:
+        pipeline.parse_alternatives(user_input)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": f"Invalid design request: {e}"}, 400, headers=CORS_HEADERS)
+
+    result = await pipeline.run_async(user_input, timings=request.query_params.get("timings") == "1")
+
+    # Save to history if logged in
+    if current_user_id and result.get("status") == "success":
+        await run_blocking(_save_history, current_user_id, user_input, result)
+
+    return JSONResponse(result, headers=CORS_HEADERS)
+
+
+app = Starlette(routes=[
+    Route("/generate-design", generate_design, methods=["POST", "OPTIONS"]),
+    Mount("/", WSGIMiddleware(flask_app)),
+])
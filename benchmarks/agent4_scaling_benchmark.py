@@ -0,0 +1,184 @@
+"""
+Agent4ProcurementEngine scaling suite.
+
+For each catalog size, builds the engine on a synthetic catalog and reports
+build time, memory, and per-call latency/throughput of filter_items,
+classify_by_price_range, estimate_min_remaining_cost, build_plan,
+generate_comparison_plans (plan cache disabled) and similar_items. Results are compared with
+the stored baseline and the run exits non-zero on a regression.
+
+    python benchmarks/agent4_scaling_benchmark.py --sizes 10000,100000
+    python benchmarks/agent4_scaling_benchmark.py --sizes 10000,100000 --save-baseline
+"""
+import os
+import sys
+import io
+import gc
+import json
+import time
+import random
+import argparse
+import platform
+import contextlib
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.agent4 import Agent4ProcurementEngine
+from benchmarks.generate_catalog import generate_catalog, load_seed_catalog
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "agent4_scaling.json")
+
+SPACES = ["living_room", "bedroom", "study_room", "kitchen"]
+
+
+def build_engine(catalog):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    engine = Agent4ProcurementEngine(catalog, cache_size=0)
+    build_s = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return engine, {
+        "build_s": round(build_s, 3),
+        "engine_mib": round(current / 2 ** 20, 1),
+        "peak_mib": round(peak / 2 ** 20, 1)
+    }
+
+
+def time_calls(fn, args_list, max_seconds):
+    latencies = []
+    deadline = time.perf_counter() + max_seconds
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            latencies.append(time.perf_counter() - start)
+            if start > deadline:
+                break
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "calls": len(latencies),
+        "p50_us": round(latencies[len(latencies) // 2] * 1e6, 2),
+        "p99_us": round(latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1e6, 2),
+        "ops_per_s": round(len(latencies) / total, 1) if total else None
+    }
+
+
+def bench_size(size, seed, calls, max_seconds):
+    catalog = generate_catalog(size, seed=seed)
+    engine, result = build_engine(catalog)
+    del catalog
+
+    meta = seed["metadata"]
+    rng = random.Random(size)
+    requests = []
+    for _ in range(calls):
+        item_types = rng.sample(meta["allowed_item_types"], 6)
+        requests.append((
+            rng.choice(meta["supported_themes"]),
+            rng.choice(SPACES),
+            [{"item_type": t, "priority": p} for p, t in enumerate(item_types, start=1)],
+            rng.choice([15000, 30000, 60000, 100000, 200000])
+        ))
+
+    filtered = [engine.filter_items(theme, space, items[0]["item_type"]) for theme, space, items, _ in requests[:50]]
+
+    result["ops"] = {
+        "filter_items": time_calls(
+            engine.filter_items,
+            [(theme, space, items[0]["item_type"]) for theme, space, items, _ in requests],
+            max_seconds
+        ),
+        "classify_by_price_range": time_calls(
+            engine.classify_by_price_range,
+            [(filtered[n % len(filtered)],) for n in range(calls)],
+            max_seconds
+        ),
+        "estimate_min_remaining_cost": time_calls(
+            engine.estimate_min_remaining_cost,
+            [(theme, space, [item["item_type"] for item in items[1:]]) for theme, space, items, _ in requests],
+            max_seconds
+        ),
+        "build_plan": time_calls(
+            engine.build_plan,
+            [(theme, space, items, budget, ["premium", "medium", "low"]) for theme, space, items, budget in requests],
+            max_seconds
+        ),
+        "generate_comparison_plans": time_calls(engine.generate_comparison_plans, requests, max_seconds),
+        "similar_items": time_calls(
+            engine.similar_items,
+            [([engine.items[rng.randrange(len(engine.items))]["id"]],) for _ in range(calls)],
+            max_seconds
+        )
+    }
+    return result
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for size, result in results.items():
+        base = baseline.get("sizes", {}).get(size)
+        if not base:
+            continue
+        for op, stats in result["ops"].items():
+            base_p50 = base["ops"].get(op, {}).get("p50_us")
+            if base_p50 and stats["p50_us"] > base_p50 * (1 + tolerance):
+                regressions.append(f"{size:>9} {op}: p50 {stats['p50_us']} us vs baseline {base_p50} us")
+        if base.get("engine_mib") and result["engine_mib"] > base["engine_mib"] * (1 + tolerance):
+            regressions.append(f"{size:>9} engine memory: {result['engine_mib']} MiB vs baseline {base['engine_mib']} MiB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000", help="comma separated catalog sizes (10k to 5M)")
+    parser.add_argument("--calls", type=int, default=2000, help="calls per operation")
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="time cap per operation")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="allowed slowdown vs baseline (1.0 = 2x)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    seed = load_seed_catalog()
+    results = {}
+
+    print(f"{'size':>9} | {'operation':<28} | {'p50 us':>9} | {'p99 us':>9} | {'ops/s':>10}")
+    print("-" * 78)
+    for size in [int(s) for s in args.sizes.split(",")]:
+        result = results[str(size)] = bench_size(size, seed, args.calls, args.max_seconds)
+        print(
+            f"{size:>9} | {'engine build':<28} | {result['build_s']:>8}s | "
+            f"{result['engine_mib']:>6} MiB held, {result['peak_mib']} MiB peak"
+        )
+        for op, stats in result["ops"].items():
+            print(f"{size:>9} | {op:<28} | {stats['p50_us']:>9} | {stats['p99_us']:>9} | {stats['ops_per_s']:>10}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "sizes": results}, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline stored yet, run with --save-baseline.")
+        return
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+
+    if regressions:
+        print("\nREGRESSIONS:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nNo regressions against the stored baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Memory of the catalog as loaded by json.load (one dict per item) versus
+the compact CatalogRecord layout Agent4ProcurementEngine keeps.
+
+    python benchmarks/catalog_memory_benchmark.py --size 200000
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.catalog_store import compact_catalog
+from benchmarks.generate_catalog import DATASET_PATH, generate_catalog
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=200000, help="synthetic catalog size")
+    args = parser.parse_args()
+
+    with open(DATASET_PATH) as f:
+        dataset = json.load(f)
+
+    items = generate_catalog(args.size, seed=dataset)["items"]
+
+    # Round-trip through JSON so every item owns its lists and strings, as after json.load
+    raw = json.dumps(items)
+    del items
+
+    items, dict_bytes, dict_peak, dict_time = measure(lambda: json.loads(raw))
+    records = compact_catalog(items)
+
+    # The compact layout must hand back the same values
+    assert all(record.to_dict() == item for record, item in zip(records, items))
+    del items, records
+    gc.collect()
+
+    _, compact_bytes, compact_peak, compact_time = measure(lambda: compact_catalog(json.loads(raw)))
+
+    print(f"{'layout':<22} | {'items':>9} | {'MiB':>9} | {'bytes/item':>10} | {'peak MiB':>9} | {'load s':>7}")
+    print("-" * 81)
+    for name, size, peak, elapsed in (
+        ("dict-of-lists (json)", dict_bytes, dict_peak, dict_time),
+        ("compact records", compact_bytes, compact_peak, compact_time)
+    ):
+        print(
+            f"{name:<22} | {args.size:>9} | {size / 2 ** 20:>9.1f} | {size / args.size:>10.0f} | "
+            f"{peak / 2 ** 20:>9.1f} | {elapsed:>7.2f}"
+        )
+    print(f"\nretained memory: {compact_bytes / dict_bytes:.0%} of the dict layout")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,447 @@
+"""
+Local stand-in for the Gemini API and Bytez, for offline load tests.
+
+Serves Gemini's gRPC GenerativeService and Bytez's HTTP model API with
+configurable latency distributions and error rates. Responses come from
+fixtures by default (valid JSON for Agents 1 and 2, separate or fused, a
+guide text for Agent 3, a generated PNG for Imagen and a 4-bytes-per-token
+estimate for CountTokens). --record forwards every call
+to the real APIs and saves the responses. --replay answers only from
+those recordings, byte for byte, so a load test can be repeated exactly
+without network access.
+
+    python benchmarks/fake_upstream.py
+    python benchmarks/fake_upstream.py --gemini-latency lognormal:0.8,0.5 --gemini-error-rate 0.02 --bytez-latency uniform:4,9
+    python benchmarks/fake_upstream.py --record benchmarks/cassettes      # needs GEMINI_API_KEY
+    python benchmarks/fake_upstream.py --replay benchmarks/cassettes --gemini-latency recorded
+
+Point the app at it with:
+
+    GEMINI_ENDPOINT=127.0.0.1:50051 BYTEZ_BASE_URL=http://127.0.0.1:8081
+
+Latency specs: 0, fixed:S, uniform:LO,HI, normal:MEAN,SD,
+lognormal:MEDIAN,SIGMA, or recorded (replay only), all in seconds.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import functools
+
+import grpc
+import uvicorn
+import requests
+from PIL import Image, ImageDraw
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.ai import generativelanguage as glm
+
+GEMINI_SERVICE = "/google.ai.generativelanguage."
+GEMINI_UPSTREAM = "generativelanguage.googleapis.com:443"
+BYTEZ_UPSTREAM = "https://api.bytez.com"
+
+FIXTURE_SCENE = {
+    "space_type": "living_room",
+    "detected_elements": ["sofa", "coffee table", "window"],
+    "theme": "rajasthani_mughal",
+    "budget": 60000,
+    "image_analysis": {
+        "description": "A bright living room with a grey sofa, a low wooden coffee table and a large window.",
+        "detected_elements": ["sofa", "coffee table", "window"],
+        "dominant_colors": ["grey", "white", "brown"]
+    }
+}
+
+FIXTURE_PLAN = {
+    "design_summary": "Warm Rajasthani accents layered over the existing layout.",
+    "space_type": "living_room",
+    "theme": "rajasthani_mughal",
+    "required_items": [
+        {"item_type": "wall_art", "category": "decor", "priority": 1, "placement": "Above the sofa", "reason": "Anchors the theme"},
+        {"item_type": "carpet", "category": "textile", "priority": 2, "placement": "Under the coffee table", "reason": "Adds warmth"},
+        {"item_type": "floor_lamp", "category": "lighting", "priority": 3, "placement": "Beside the sofa", "reason": "Evening light"},
+        {"item_type": "curtains", "category": "textile", "priority": 4, "placement": "Main window", "reason": "Softens the light"}
+    ],
+    "visualization": {
+        "style_keywords": ["jharokha", "block print", "brass"],
+        "color_palette": ["terracotta", "indigo", "ivory"],
+        "material_focus": ["carved wood", "cotton", "brass"],
+        "lighting_style": "warm ambient",
+        "visual_prompt": "Terracotta accent wall, indigo block-print curtains and a brass floor lamp."
+    }
+}
+
+# Prompt marker -> response text; the first marker found in the prompt wins, "" matches anything
+DEFAULT_GEMINI_FIXTURES = [
+    {"match": "Scene and Design Planning Agent", "text": json.dumps({"scene": FIXTURE_SCENE, "plan": FIXTURE_PLAN})},
+    {"match": "Scene Structuring Agent", "text": json.dumps(FIXTURE_SCENE)},
+    {"match": "Design Planner Agent", "text": json.dumps(FIXTURE_PLAN)},
+    {
+        "match": "",
+        "text": (
+            "1. Concept: Courtyard Warmth\n"
+            "Bring the palette of a Rajasthani courtyard indoors with terracotta and indigo.\n"
+            "- Paint the wall behind the sofa terracotta.\n"
+            "- Hang framed miniature paintings above it.\n"
+            "- Lay a hand-knotted carpet under the coffee table.\n"
+        )
+    }
+]
+
+
+class Latency:
+    """Delay sampler parsed from a spec such as "lognormal:0.8,0.5"."""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        self.kind = kind or "0"
+        self.args = [float(arg) for arg in args.split(",") if arg]
+        expected = {"0": 0, "fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "recorded": 0}
+        if self.kind not in expected or len(self.args) != expected[self.kind]:
+            raise argparse.ArgumentTypeError(f"Bad latency spec: {spec}")
+
+    def sample(self, rng: random.Random, recorded: float = 0.0) -> float:
+        if self.kind == "fixed":
+            return self.args[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.args)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(*self.args))
+        if self.kind == "lognormal":
+            median, sigma = self.args
+            return median * rng.lognormvariate(0, sigma)
+        if self.kind == "recorded":
+            return recorded
+        return 0.0
+
+
+class Cassette:
+    """Recorded responses, one body file and one metadata file per request hash."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def key(*parts: bytes) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _paths(self, upstream: str, key: str):
+        base = os.path.join(self.root, upstream, key)
+        return base + ".bin", base + ".json"
+
+    def load(self, upstream: str, key: str):
+        body_path, meta_path = self._paths(upstream, key)
+        if not os.path.exists(meta_path):
+            return None, None
+        with open(body_path, "rb") as f:
+            body = f.read()
+        with open(meta_path) as f:
+            return body, json.load(f)
+
+    def save(self, upstream: str, key: str, body: bytes, meta: dict):
+        body_path, meta_path = self._paths(upstream, key)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        with open(body_path, "wb") as f:
+            f.write(body)
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+
+
+def pack_frames(frames):
+    return b"".join(len(frame).to_bytes(4, "big") + frame for frame in frames)
+
+
+def unpack_frames(body: bytes):
+    frames, pos = [], 0
+    while pos < len(body):
+        size = int.from_bytes(body[pos:pos + 4], "big")
+        frames.append(body[pos + 4:pos + 4 + size])
+        pos += 4 + size
+    return frames
+
+
+class FakeUpstream:
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.gemini_latency = args.gemini_latency
+        self.bytez_latency = args.bytez_latency
+        self.fixtures = DEFAULT_GEMINI_FIXTURES
+        self.bytez_output = None
+        if args.fixtures:
+            with open(args.fixtures) as f:
+                fixtures = json.load(f)
+            self.fixtures = fixtures.get("gemini", self.fixtures)
+            self.bytez_output = fixtures.get("bytez", {}).get("output")
+
+        self.cassette = Cassette(args.record or args.replay) if (args.record or args.replay) else None
+        self.mode = "record" if args.record else "replay" if args.replay else "fixtures"
+        self._upstream_channel = None
+        self.image = self._fixture_image()
+        self.counts = {
+            "gemini": {"requests": 0, "errors_injected": 0, "recorded": 0, "replayed": 0, "replay_misses": 0},
+            "bytez": {"requests": 0, "errors_injected": 0, "recorded": 0, "replayed": 0, "replay_misses": 0}
+        }
+
+    @staticmethod
+    def _fixture_image() -> bytes:
+        img = Image.new("RGB", (1024, 1024), (176, 92, 60))
+        draw = ImageDraw.Draw(img)
+        draw.rectangle((0, 700, 1024, 1024), fill=(120, 70, 40))
+        draw.rectangle((380, 250, 640, 520), fill=(40, 50, 110))
+        out = io.BytesIO()
+        img.save(out, format="PNG")
+        return out.getvalue()
+
+    def _inject_error(self, upstream: str, rate: float) -> bool:
+        if rate and self.rng.random() < rate:
+            self.counts[upstream]["errors_injected"] += 1
+            return True
+        return False
+
+    # --------------------------------------------------
+    # GEMINI (gRPC)
+    # --------------------------------------------------
+
+    def _fixture_text(self, request: glm.GenerateContentRequest) -> str:
+        prompt = "".join(part.text for content in request.contents for part in content.parts)
+        for fixture in self.fixtures:
+            if fixture["match"] in prompt:
+                return fixture["text"]
+        return ""
+
+    @staticmethod
+    def _response(text: str, prompt_tokens: int, finish: bool = True, generated: int = 0) -> bytes:
+        # Like the real API, streamed chunks report the tokens generated so far
+        candidates = max(1, (generated or len(text)) // 4)
+        response = glm.GenerateContentResponse(
+            candidates=[glm.Candidate(
+                content=glm.Content(parts=[glm.Part(text=text)], role="model"),
+                finish_reason=glm.Candidate.FinishReason.STOP if finish else 0
+            )],
+            usage_metadata=glm.GenerateContentResponse.UsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=candidates,
+                total_token_count=prompt_tokens + candidates
+            )
+        )
+        return glm.GenerateContentResponse.serialize(response)
+
+    def _fixture_frames(self, method: str, request_bytes: bytes, stream: bool):
+        prompt_tokens = max(1, len(request_bytes) // 4)
+        if method.endswith("/CountTokens"):
+            return [glm.CountTokensResponse.serialize(glm.CountTokensResponse(total_tokens=prompt_tokens))]
+        request = glm.GenerateContentRequest.deserialize(request_bytes)
+        text = self._fixture_text(request)
+        if not stream:
+            return [self._response(text, prompt_tokens)]
+        size = max(1, len(text) // self.args.stream_chunks)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        return [
+            self._response(piece, prompt_tokens, i == len(pieces) - 1, generated=min(len(text), (i + 1) * size))
+            for i, piece in enumerate(pieces)
+        ]
+
+    def _upstream(self):
+        if self._upstream_channel is None:
+            target = self.args.gemini_upstream
+            if target.startswith(("127.0.0.1:", "localhost:")):
+                # Another local stand-in, e.g. to try out recording offline
+                self._upstream_channel = grpc.aio.insecure_channel(target)
+            else:
+                self._upstream_channel = grpc.aio.secure_channel(target, grpc.ssl_channel_credentials())
+        return self._upstream_channel
+
+    async def _record_gemini(self, method: str, request_bytes: bytes, stream: bool):
+        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+        metadata = [("x-goog-api-key", api_key)] if api_key else []
+        start = time.perf_counter()
+        frames, offsets = [], []
+        if stream:
+            async for frame in self._upstream().unary_stream(method)(request_bytes, metadata=metadata):
+                frames.append(frame)
+                offsets.append(time.perf_counter() - start)
+        else:
+            frames.append(await self._upstream().unary_unary(method)(request_bytes, metadata=metadata))
+            offsets.append(time.perf_counter() - start)
+        return frames, offsets
+
+    async def gemini(self, method: str, stream: bool, request_bytes: bytes, context):
+        counts = self.counts["gemini"]
+        counts["requests"] += 1
+        key = Cassette.key(method.encode(), request_bytes)
+
+        if self.mode == "record":
+            try:
+                frames, offsets = await self._record_gemini(method, request_bytes, stream)
+            except grpc.aio.AioRpcError as e:
+                # Upstream errors are passed through, not recorded
+                await context.abort(e.code(), e.details())
+            self.cassette.save("gemini", key, pack_frames(frames), {"method": method, "stream": stream, "offsets": offsets})
+            counts["recorded"] += 1
+            return frames, [0.0] * len(frames)
+
+        if self.mode == "replay":
+            body, meta = self.cassette.load("gemini", key)
+            if body is None:
+                counts["replay_misses"] += 1
+                await context.abort(grpc.StatusCode.NOT_FOUND, f"No recorded response for {method} {key[:12]}")
+            counts["replayed"] += 1
+            frames, offsets = unpack_frames(body), meta["offsets"]
+        else:
+            frames = self._fixture_frames(method, request_bytes, stream)
+            offsets = [i * self.args.stream_chunk_delay for i in range(len(frames))]
+
+        first = self.gemini_latency.sample(self.rng, recorded=offsets[0])
+        if self._inject_error("gemini", self.args.gemini_error_rate):
+            await asyncio.sleep(first)
+            await context.abort(grpc.StatusCode[self.args.gemini_error_code], "Injected upstream error")
+        # Delay before each frame, keeping the recorded (or fixture) spacing between frames
+        delays = [first] + [max(0.0, b - a) for a, b in zip(offsets, offsets[1:])]
+        return frames, delays
+
+    def gemini_handler(self):
+        upstream = self
+
+        class Handler(grpc.GenericRpcHandler):
+            def service(self, details):
+                if not details.method.startswith(GEMINI_SERVICE):
+                    return None
+                if "Stream" in details.method.rsplit("/", 1)[-1]:
+                    async def stream(request_bytes, context):
+                        frames, delays = await upstream.gemini(details.method, True, request_bytes, context)
+                        for frame, delay in zip(frames, delays):
+                            await asyncio.sleep(delay)
+                            yield frame
+                    return grpc.unary_stream_rpc_method_handler(stream)
+
+                async def unary(request_bytes, context):
+                    frames, delays = await upstream.gemini(details.method, False, request_bytes, context)
+                    await asyncio.sleep(delays[0])
+                    return frames[0]
+                return grpc.unary_unary_rpc_method_handler(unary)
+
+        return Handler()
+
+    # --------------------------------------------------
+    # BYTEZ (HTTP)
+    # --------------------------------------------------
+
+    async def bytez(self, request: Request):
+        counts = self.counts["bytez"]
+        counts["requests"] += 1
+        body = await request.body()
+        path = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+        key = Cassette.key(request.method.encode(), path.encode(), body)
+
+        if self.mode == "record":
+            start = time.perf_counter()
+            upstream = await asyncio.to_thread(functools.partial(
+                requests.request, request.method, self.args.bytez_upstream + path, data=body or None, timeout=600,
+                headers={name: value for name, value in request.headers.items() if name in ("authorization", "content-type", "provider-key", "lang")}
+            ))
+            meta = {
+                "method": request.method, "path": path, "status": upstream.status_code,
+                "content_type": upstream.headers.get("content-type", "application/json"),
+                "offsets": [time.perf_counter() - start]
+            }
+            self.cassette.save("bytez", key, upstream.content, meta)
+            counts["recorded"] += 1
+            return Response(upstream.content, upstream.status_code, media_type=meta["content_type"])
+
+        if self.mode == "replay":
+            content, meta = self.cassette.load("bytez", key)
+            if content is None:
+                counts["replay_misses"] += 1
+                return JSONResponse({"output": None, "error": f"No recorded response for {request.method} {path}"}, 404)
+            counts["replayed"] += 1
+            await asyncio.sleep(self.bytez_latency.sample(self.rng, recorded=meta["offsets"][0]))
+            return Response(content, meta["status"], media_type=meta["content_type"])
+
+        await asyncio.sleep(self.bytez_latency.sample(self.rng))
+        if self._inject_error("bytez", self.args.bytez_error_rate):
+            return JSONResponse({"output": None, "error": "Injected upstream error"}, 503)
+        if request.url.path.endswith("/list/models"):
+            model_id = request.query_params.get("modelId", "")
+            return JSONResponse({"output": [{"modelId": model_id, "task": "text-to-image"}], "error": None})
+        output = self.bytez_output or f"{str(request.base_url).rstrip('/')}/fixtures/design.png"
+        return JSONResponse({"output": output, "error": None, "provider": "fake"})
+
+    async def fixture_image(self, request: Request):
+        return Response(self.image, media_type="image/png")
+
+    async def stats(self, request: Request):
+        return JSONResponse({"mode": self.mode, **self.counts})
+
+    # --------------------------------------------------
+    # SERVERS
+    # --------------------------------------------------
+
+    async def serve(self):
+        server = grpc.aio.server()
+        server.add_generic_rpc_handlers([self.gemini_handler()])
+        server.add_insecure_port(f"{self.args.host}:{self.args.gemini_port}")
+        await server.start()
+
+        app = Starlette(routes=[
+            Route("/fixtures/design.png", self.fixture_image),
+            Route("/stats", self.stats),
+            Route("/models/v2/{path:path}", self.bytez, methods=["GET", "POST"]),
+        ])
+        http = uvicorn.Server(uvicorn.Config(app, host=self.args.host, port=self.args.bytez_port, log_level="warning"))
+
+        print(f"[FAKE] {self.mode} mode | Gemini grpc {self.args.host}:{self.args.gemini_port} | Bytez http://{self.args.host}:{self.args.bytez_port}")
+        print(f"[FAKE] GEMINI_ENDPOINT={self.args.host}:{self.args.gemini_port} BYTEZ_BASE_URL=http://{self.args.host}:{self.args.bytez_port}")
+        try:
+            await http.serve()
+        finally:
+            await server.stop(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--gemini-port", type=int, default=50051)
+    parser.add_argument("--bytez-port", type=int, default=8081)
+    parser.add_argument("--gemini-latency", type=Latency, default=Latency("0"))
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-error-code", default="UNAVAILABLE", choices=[code.name for code in grpc.StatusCode])
+    parser.add_argument("--bytez-latency", type=Latency, default=Latency("0"))
+    parser.add_argument("--bytez-error-rate", type=float, default=0.0)
+    parser.add_argument("--stream-chunks", type=int, default=8, help="frames per streamed fixture response")
+    parser.add_argument("--stream-chunk-delay", type=float, default=0.02, help="seconds between streamed fixture frames")
+    parser.add_argument("--fixtures", help='JSON file: {"gemini": [{"match": "...", "text": "..."}], "bytez": {"output": "..."}}')
+    parser.add_argument("--seed", type=int, default=1, help="seeds latency and error sampling")
+    parser.add_argument("--gemini-upstream", default=GEMINI_UPSTREAM, help="Gemini API address used by --record")
+    parser.add_argument("--bytez-upstream", default=BYTEZ_UPSTREAM, help="Bytez API base URL used by --record")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="DIR", help="forward to the real APIs and save every response")
+    cassette.add_argument("--replay", metavar="DIR", help="answer only from responses saved with --record")
+    args = parser.parse_args()
+
+    if args.gemini_latency.kind == "recorded" and not args.replay:
+        parser.error("--gemini-latency recorded needs --replay")
+    if args.bytez_latency.kind == "recorded" and not args.replay:
+        parser.error("--bytez-latency recorded needs --replay")
+
+    asyncio.run(FakeUpstream(args).serve())
+
+
+if __name__ == "__main__":
+    main()
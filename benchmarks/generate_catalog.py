@@ -0,0 +1,166 @@
+"""
+Synthetic catalog generator in the indian_interior_v2.json schema.
+
+Item types, categories, names, price tiers and the theme/space/item_type
+mix are taken from the shipped catalog unless overridden, so generated
+catalogs look like the real one at any size.
+
+    python benchmarks/generate_catalog.py --size 1000000 --out /tmp/catalog_1m.json
+    python benchmarks/generate_catalog.py --size 10000 --theme-weights rajasthani_mughal=3,rustic_indian=1
+"""
+import os
+import json
+import random
+import argparse
+from collections import Counter
+from typing import Any, Dict, Iterator, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET_PATH = os.path.join(BASE_DIR, "dataset", "indian_interior_v2.json")
+
+
+def load_seed_catalog(path: str = DATASET_PATH) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def catalog_profile(seed: Dict[str, Any]) -> Dict[str, Any]:
+    """Empirical distributions of the seed catalog used as generator defaults."""
+    items = seed["items"]
+    shop = [item for item in items if not item["is_diy"]]
+
+    names = {}
+    categories = {}
+    for item in items:
+        names.setdefault(item["item_type"], []).append(item["name"])
+        categories[item["item_type"]] = item["category"]
+
+    return {
+        "item_type_weights": Counter(item["item_type"] for item in items),
+        "theme_weights": Counter(theme for item in items for theme in item["themes"]),
+        "space_weights": Counter(space for item in items for space in item.get("space_types", [])),
+        "quality_weights": Counter(item["quality_level"] for item in shop),
+        "themes_per_item": Counter(len(item["themes"]) for item in items),
+        "spaces_per_item": Counter(len(item.get("space_types", [])) for item in items),
+        "diy_rate": (len(items) - len(shop)) / len(items),
+        "names": names,
+        "categories": categories,
+        "diy_links": [item["diy_link"] for item in items if item["is_diy"] and item["diy_link"]]
+    }
+
+
+def _sample_distinct(rng, population, weights, k):
+    picked = []
+    while len(picked) < min(k, len(population)):
+        value = rng.choices(population, weights)[0]
+        if value not in picked:
+            picked.append(value)
+    return picked
+
+
+def iter_items(
+    size: int,
+    seed: Optional[Dict[str, Any]] = None,
+    rng_seed: int = 0,
+    theme_weights: Optional[Dict[str, float]] = None,
+    space_weights: Optional[Dict[str, float]] = None,
+    item_type_weights: Optional[Dict[str, float]] = None
+) -> Iterator[Dict[str, Any]]:
+    """Yields `size` items lazily so multi-million item catalogs can be streamed."""
+    seed = seed or load_seed_catalog()
+    profile = catalog_profile(seed)
+    ranges = seed["metadata"]["price_ranges_inr"]
+    rng = random.Random(rng_seed)
+
+    type_weights = item_type_weights or profile["item_type_weights"]
+    types, type_w = list(type_weights), list(type_weights.values())
+    theme_weights = theme_weights or profile["theme_weights"]
+    themes, theme_w = list(theme_weights), list(theme_weights.values())
+    space_weights = space_weights or profile["space_weights"]
+    spaces, space_w = list(space_weights), list(space_weights.values())
+    qualities, quality_w = list(profile["quality_weights"]), list(profile["quality_weights"].values())
+    n_themes, n_themes_w = list(profile["themes_per_item"]), list(profile["themes_per_item"].values())
+    n_spaces, n_spaces_w = list(profile["spaces_per_item"]), list(profile["spaces_per_item"].values())
+
+    for n in range(size):
+        item_type = rng.choices(types, type_w)[0]
+        is_diy = rng.random() < profile["diy_rate"]
+        quality = "low" if is_diy else rng.choices(qualities, quality_w)[0]
+
+        if is_diy:
+            price = 0
+        else:
+            limits = ranges[quality]
+            price = rng.randrange(limits["min"], limits["max"] + 1, 100)
+
+        base_name = rng.choice(profile["names"].get(item_type, [item_type.replace("_", " ").title()]))
+
+        yield {
+            "id": f"{item_type}_{n:07d}",
+            "item_type": item_type,
+            "name": f"{base_name} #{n}",
+            "category": profile["categories"].get(item_type, "decor"),
+            "themes": _sample_distinct(rng, themes, theme_w, rng.choices(n_themes, n_themes_w)[0]),
+            "space_types": _sample_distinct(rng, spaces, space_w, rng.choices(n_spaces, n_spaces_w)[0]),
+            "price": price,
+            "quality_level": quality,
+            "product_link": "" if is_diy else f"https://www.flipkart.com/p/{item_type}-{n:07d}",
+            "diy_link": rng.choice(profile["diy_links"]) if is_diy and profile["diy_links"] else "",
+            "is_diy": is_diy
+        }
+
+
+def generate_catalog(size: int, seed: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+    seed = seed or load_seed_catalog()
+    return {
+        "metadata": dict(seed["metadata"], total_items=size),
+        "items": list(iter_items(size, seed=seed, **kwargs))
+    }
+
+
+def write_catalog(path: str, size: int, seed: Optional[Dict[str, Any]] = None, **kwargs):
+    """Streams the catalog to disk item by item instead of building it in memory."""
+    seed = seed or load_seed_catalog()
+    metadata = dict(seed["metadata"], total_items=size)
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"metadata": ' + json.dumps(metadata) + ', "items": [\n')
+        for n, item in enumerate(iter_items(size, seed=seed, **kwargs)):
+            if n:
+                f.write(",\n")
+            f.write(json.dumps(item))
+        f.write("\n]}\n")
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """'a=3,b=1' -> {'a': 3.0, 'b': 1.0}"""
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, required=True)
+    parser.add_argument("--out", help="output path (default: dataset/synthetic_<size>.json)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--theme-weights", type=parse_weights)
+    parser.add_argument("--space-weights", type=parse_weights)
+    parser.add_argument("--item-type-weights", type=parse_weights)
+    args = parser.parse_args()
+
+    out = args.out or os.path.join(BASE_DIR, "dataset", f"synthetic_{args.size}.json")
+    write_catalog(
+        out, args.size,
+        rng_seed=args.seed,
+        theme_weights=args.theme_weights,
+        space_weights=args.space_weights,
+        item_type_weights=args.item_type_weights
+    )
+    print(f"Wrote {args.size} items to {out}")
+
+
+if __name__ == "__main__":
+    main()
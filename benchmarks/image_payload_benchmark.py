@@ -0,0 +1,116 @@
+"""
+Gemini request payload size for room photos, before and after preprocessing.
+
+"Before" is the GenerateContentRequest the SDK builds from the PIL image
+the pipeline used to send; "after" is the request built from the
+utils.image_prep output. Also reports the preprocessing time, cold and
+from the per-hash cache.
+
+    python benchmarks/image_payload_benchmark.py
+    python benchmarks/image_payload_benchmark.py photo1.jpg photo2.png --max-edge 1024 --format webp
+    python benchmarks/image_payload_benchmark.py --synthetic 3
+"""
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFilter
+from google.ai import generativelanguage as glm
+from google.generativeai.types import content_types
+
+from utils.image_prep import ImagePreprocessor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT = "Analyze this room photo."
+
+
+def request_size(model_name, content):
+    request = glm.GenerateContentRequest(
+        model=f"models/{model_name}",
+        contents=content_types.to_contents(content)
+    )
+    return len(glm.GenerateContentRequest.serialize(request))
+
+
+def synthetic_photo(path, seed, size=(4032, 3024)):
+    """Phone-sized JPEG with smooth shapes, sensor noise and a rotate-90 EXIF flag."""
+    rng = random.Random(seed)
+    small = Image.new("RGB", (size[0] // 8, size[1] // 8), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(small)
+    for _ in range(40):
+        x, y = rng.randrange(small.width), rng.randrange(small.height)
+        draw.rectangle(
+            (x, y, x + rng.randrange(20, 200), y + rng.randrange(20, 200)),
+            fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        )
+    img = small.resize(size, Image.BICUBIC).filter(ImageFilter.GaussianBlur(3))
+    noise = Image.effect_noise(size, 12).convert("RGB")
+    img = Image.blend(img, noise, 0.08)
+
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    img.save(path, format="JPEG", quality=92, exif=exif)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="photos to measure (default: uploads/ and images/current/)")
+    parser.add_argument("--synthetic", type=int, default=0, help="also measure N generated 12 MP phone photos")
+    parser.add_argument("--max-edge", type=int, default=1536)
+    parser.add_argument("--format", default="jpeg", choices=["jpeg", "webp"])
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(
+        glob.glob(os.path.join(BASE_DIR, "uploads", "*.*")) +
+        glob.glob(os.path.join(BASE_DIR, "images", "current", "*.*"))
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in range(args.synthetic):
+            path = os.path.join(tmp, f"synthetic_{n}.jpg")
+            synthetic_photo(path, n)
+            paths.append(path)
+
+        prep = ImagePreprocessor(args.max_edge, args.format, args.quality, cache_dir=os.path.join(tmp, "prepared"))
+
+        print(f"{'photo':<40} | {'source':>12} | {'request before':>14} | {'request after':>13} | {'ratio':>6} | {'cold ms':>8} | {'cached ms':>9}")
+        print("-" * 120)
+        total_before = total_after = 0
+        for path in paths:
+            with Image.open(path) as img:
+                img.load()
+                before = request_size(args.model, [PROMPT, img])
+                dims = f"{img.width}x{img.height}"
+
+            start = time.perf_counter()
+            data, mime_type = prep.prepare(path)
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            prep.prepare(path)
+            cached = time.perf_counter() - start
+
+            after = request_size(args.model, [PROMPT, {"mime_type": mime_type, "data": data}])
+            total_before += before
+            total_after += after
+
+            name = f"{os.path.basename(path)[-28:]} {dims}"
+            print(
+                f"{name:<40} | {os.path.getsize(path):>12,} | {before:>14,} | {after:>13,} | "
+                f"{after / before:>6.2f} | {cold * 1e3:>8.1f} | {cached * 1e3:>9.2f}"
+            )
+
+        if paths:
+            print("-" * 120)
+            print(f"{'total':<40} | {'':>12} | {total_before:>14,} | {total_after:>13,} | {total_after / total_before:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
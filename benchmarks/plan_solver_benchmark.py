@@ -0,0 +1,105 @@
+"""
+Greedy vs optimal build_plan: latency and plan quality.
+
+Runs both solvers over the same random requests against the shipped
+catalog and a synthetic catalog of --size items, then reports per-call
+latency and the priority-weighted quality score each solver reached.
+
+    python benchmarks/plan_solver_benchmark.py --size 50000
+"""
+import os
+import sys
+import io
+import json
+import time
+import random
+import argparse
+import contextlib
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.agent4 import Agent4ProcurementEngine
+from benchmarks.generate_catalog import DATASET_PATH, generate_catalog
+
+
+def plan_score(engine, plan):
+    weights = range(len(plan["items"]), 0, -1)
+    return sum(
+        weight * engine.quality_scores.get(item["quality_level"], 0)
+        for weight, item in zip(weights, plan["items"])
+    )
+
+
+def random_requests(dataset, count, seed=1):
+    rng = random.Random(seed)
+    meta = dataset["metadata"]
+    spaces = ["living_room", "bedroom", "study_room", "kitchen"]
+    requests = []
+
+    for _ in range(count):
+        item_types = rng.sample(meta["allowed_item_types"], 6)
+        requests.append({
+            "theme": rng.choice(meta["supported_themes"]),
+            "space_type": rng.choice(spaces),
+            "required_items": [{"item_type": t, "priority": p} for p, t in enumerate(item_types, start=1)],
+            "target_budget": rng.choice([15000, 30000, 60000, 100000, 200000]),
+            "tier_order": rng.choice(Agent4ProcurementEngine.TIER_PREFERENCES)
+        })
+
+    return requests
+
+
+def run(engine, requests, solver):
+    latencies, scores, costs = [], [], []
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for req in requests:
+            start = time.perf_counter()
+            plan = engine.build_plan(solver=solver, **req)
+            latencies.append((time.perf_counter() - start) * 1000)
+            scores.append(plan_score(engine, plan))
+            costs.append(plan["total_cost"])
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "mean_score": statistics.mean(scores),
+        "mean_cost": statistics.mean(costs),
+        "scores": scores
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=50000, help="synthetic catalog size")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    with open(DATASET_PATH) as f:
+        dataset = json.load(f)
+
+    catalogs = [("shipped", dataset), (f"synthetic_{args.size}", generate_catalog(args.size, seed=dataset))]
+
+    print(f"{'catalog':<18} | {'solver':<8} | {'p50 ms':>8} | {'p99 ms':>8} | {'score':>7} | {'cost':>9} | {'wins':>5}")
+    print("-" * 80)
+
+    for name, catalog in catalogs:
+        engine = Agent4ProcurementEngine(catalog)
+        requests = random_requests(catalog, args.requests)
+
+        greedy = run(engine, requests, "greedy")
+        optimal = run(engine, requests, "optimal")
+        wins = sum(o > g for o, g in zip(optimal["scores"], greedy["scores"]))
+
+        for solver, res in (("greedy", greedy), ("optimal", optimal)):
+            print(
+                f"{name:<18} | {solver:<8} | {res['p50_ms']:>8.3f} | {res['p99_ms']:>8.3f} | "
+                f"{res['mean_score']:>7.2f} | {res['mean_cost']:>9.0f} | "
+                f"{wins if solver == 'optimal' else '':>5}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Measured prompt tokens of Agents 1 and 2, before and after compaction.
+
+"Before" is the old prompt (every input as indent=2 JSON), "after" the
+PromptBuilder output the agents send now. Both are counted by the model's
+tokenizer with count_tokens, so the savings are measured, not estimated;
+the 4-chars-per-token estimate the builders budget with is shown next to
+them. Needs GEMINI_API_KEY, or GEMINI_ENDPOINT pointing at a recording
+of benchmarks/fake_upstream.py (its fixture mode only estimates counts).
+Text only: a photo adds the same image tokens to both prompts.
+
+    python benchmarks/prompt_token_benchmark.py
+    python benchmarks/prompt_token_benchmark.py --model gemini-2.5-pro
+"""
+import os
+import sys
+import copy
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.agent1 import SceneStructuringAgent
+from agents.agent2 import DesignPlannerAgent
+from benchmarks.fake_upstream import FIXTURE_SCENE
+from utils.gemini_client import DEFAULT_MODEL, router
+from utils.prompts import estimate_tokens
+
+# Form input as the routes pass it on, server-side fields included
+FORM_INPUT = {
+    "description_text": "A bright living room with a grey sofa and a large window. We want warm Rajasthani accents without replacing the furniture.",
+    "theme": "rajasthani_mughal",
+    "budget": "60000",
+    "plan_solver": "greedy",
+    "alternatives": "3",
+    "image_path": "uploads/3f1c9a0e7b5d4c2a.jpg",
+    "image_hash": "3f1c9a0e7b5d4c2a9e8f7a6b5c4d3e2f1a0b9c8d7e6f5a4b3c2d1e0f9a8b7c6d"
+}
+
+# Iterations send back the previous scene with whatever the client kept
+ITERATION_SCENE = dict(
+    copy.deepcopy(FIXTURE_SCENE),
+    design_summary="Warm Rajasthani accents layered over the existing layout.",
+    required_items=[],
+    image_analysis=dict(
+        FIXTURE_SCENE["image_analysis"],
+        detected_elements=["sofa", "Sofa", "coffee table", "window", "rug", ""],
+        style_type=""
+    )
+)
+
+
+def cases():
+    agent1, agent2 = SceneStructuringAgent(), DesignPlannerAgent()
+    yield "SceneStructuringAgent", "form input", agent1.prompt, FORM_INPUT, agent1.INSTRUCTIONS
+    yield "SceneStructuringAgent", "form input + photo", agent1.prompt, FORM_INPUT, agent1.IMAGE_INSTRUCTIONS
+    yield "DesignPlannerAgent", "first run scene", agent2.prompt, FIXTURE_SCENE, None
+    yield "DesignPlannerAgent", "iteration scene", agent2.prompt, ITERATION_SCENE, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="model whose tokenizer counts the prompts")
+    args = parser.parse_args()
+
+    model = router.clients[0].model(args.model)
+
+    def count(prompt):
+        return model.count_tokens(prompt).total_tokens
+
+    print(f"{'agent':<22} | {'input':<20} | {'before':>7} | {'after':>7} | {'saved':>6} | {'est before':>10} | {'est after':>9} | {'est saved':>9}")
+    print("-" * 112)
+    totals = [0, 0]
+    for agent, label, builder, inputs, instructions in cases():
+        before_prompt = builder.uncompacted(inputs, instructions)
+        after_prompt = builder.build(inputs, instructions)
+        before, after = count(before_prompt), count(after_prompt)
+        est_before, est_after = estimate_tokens(before_prompt), estimate_tokens(after_prompt)
+        totals[0] += before
+        totals[1] += after
+        print(
+            f"{agent:<22} | {label:<20} | {before:>7,} | {after:>7,} | {1 - after / before:>6.1%} | "
+            f"{est_before:>10,} | {est_after:>9,} | {1 - est_after / est_before:>9.1%}"
+        )
+    print("-" * 112)
+    print(f"{'total':<22} | {'':<20} | {totals[0]:>7,} | {totals[1]:>7,} | {1 - totals[1] / totals[0]:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
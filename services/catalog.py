@@ -0,0 +1,459 @@
+import os
+import csv
+import copy
+import json
+import time
+import sqlite3
+import hashlib
+import weakref
+import threading
+import contextlib
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from agents.agent4_columnar import ColumnarProcurementEngine
+from utils.catalog_binary import BinaryCatalog, load_catalog_file
+from utils.lru_cache import LRUCache
+from utils.uploads import file_digest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATALOG_LOG_PATH = os.path.join(BASE_DIR, "instance", "catalog_log.db")
+
+LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    generation INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT,
+    source TEXT,
+    payload TEXT,
+    created REAL
+);
+"""
+
+
+def parse_price_delta(lines: Iterable[str], fmt: str) -> Iterable[Tuple[str, int]]:
+    """
+    Yields (item id, price) from a streamed price delta.
+
+    csv:   header row with at least `id,price`
+    jsonl: one {"id": ..., "price": ...} object per line
+    """
+    if fmt == "csv":
+        rows = csv.DictReader(lines)
+    elif fmt == "jsonl":
+        rows = (json.loads(line) for line in lines if line.strip())
+    else:
+        raise ValueError(f"Unsupported delta format: {fmt}")
+
+    for row in rows:
+        price = int(row["price"])
+        if price < 0:
+            raise ValueError(f"Negative price for {row['id']}")
+        yield row["id"], price
+
+
+class CatalogLog:
+    """
+    Ordered record of catalog changes, shared by every worker process.
+
+    A reload or price delta reaches one worker; the others replay it from
+    here in the same order (CatalogManager.follow). Appends happen under
+    SQLite's write lock, which also serializes catalog changes across
+    workers. A full reload supersedes everything before it, so older
+    entries (and stored catalogs) are pruned when one is appended.
+
+    kind is "full", with the {"path", "sha256"} of the catalog file to
+    load, or "delta", with the price updates as jsonl. Catalogs pushed
+    as a request body are written to `catalog_dir` first, so rows stay
+    small whatever the catalog size.
+    """
+
+    def __init__(self, path: str = CATALOG_LOG_PATH):
+        self.path = path
+        self.catalog_dir = os.path.join(os.path.dirname(path), "catalogs")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Short-lived connections: the log is read rarely and they must not cross a fork
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(LOG_SCHEMA)
+        return conn
+
+    def latest(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COALESCE(MAX(generation), 0) FROM changes").fetchone()[0]
+        finally:
+            conn.close()
+
+    @contextlib.contextmanager
+    def writing(self):
+        """Connection holding the log's write lock until the block ends."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def store(self, dataset: Dict[str, Any]) -> Tuple[str, str]:
+        """Writes a pushed catalog under catalog_dir, returns (path, sha256)."""
+        data = json.dumps(dataset, separators=(",", ":"), ensure_ascii=False).encode()
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.catalog_dir, f"catalog_{digest}.json")
+        if not os.path.exists(path):
+            os.makedirs(self.catalog_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return path, digest
+
+    def base(self, conn: sqlite3.Connection) -> Optional[tuple]:
+        """(generation, kind, source, payload, created) of the latest full reload."""
+        return conn.execute(
+            "SELECT generation, kind, source, payload, created FROM changes "
+            "WHERE kind = 'full' ORDER BY generation DESC LIMIT 1"
+        ).fetchone()
+
+    def pending(self, conn: sqlite3.Connection, after: int) -> List[tuple]:
+        """Changes to apply on top of generation `after`, from the latest full reload past it."""
+        base = conn.execute(
+            "SELECT MAX(generation) FROM changes WHERE kind = 'full' AND generation > ?", (after,)
+        ).fetchone()[0]
+        return conn.execute(
+            "SELECT generation, kind, source, payload, created FROM changes WHERE generation >= ? ORDER BY generation",
+            (base if base is not None else after + 1,)
+        ).fetchall()
+
+    def append(self, conn: sqlite3.Connection, kind: str, source: str, payload: str) -> int:
+        generation = conn.execute(
+            "INSERT INTO changes (kind, source, payload, created) VALUES (?, ?, ?, ?)",
+            (kind, source, payload, time.time())
+        ).lastrowid
+        if kind == "full":
+            conn.execute("DELETE FROM changes WHERE generation < ?", (generation,))
+            # Workers replay under the write lock held here, so no one is reading these
+            keep = os.path.basename(json.loads(payload)["path"])
+            if os.path.isdir(self.catalog_dir):
+                for name in os.listdir(self.catalog_dir):
+                    if name != keep and name.startswith("catalog_"):
+                        os.remove(os.path.join(self.catalog_dir, name))
+        return generation
+
+
+class CatalogManager:
+    """
+    Owns the live catalog and the procurement engines derived from it.
+
+    Reloads build new engine instances off to the side and publish them by
+    swapping references, so a request only ever sees the old catalog or
+    the new one. Writers are serialized by a lock; readers never block.
+
+    Engines live in each worker process. With a CatalogLog, every change
+    is also logged and the other workers apply it through follow();
+    without one, reloads only affect the process that received them.
+    """
+
+    def __init__(self, pipeline, dataset_path: str = None, search=None, loaded=None, log: CatalogLog = None):
+        """
+        :param loaded: the dataset pipeline.agent4 was built from; a compiled
+                       (memory-mapped) one is closed once a full reload replaces it
+        :param log: shared CatalogLog, for multi-process deployments
+        """
+        self.pipeline = pipeline
+        self.dataset_path = dataset_path
+        # Optional CatalogSearchIndex, rebuilt in the background after each reload
+        self.search = search
+        self.log = log
+        # Built from Agent4's compact records so raw item dicts can be freed
+        self.dataset = self._compact_dataset(pipeline.agent4)
+        self.quote_engine = ColumnarProcurementEngine(self.dataset)
+        self.last_reload = None
+        # Last log generation applied here
+        self.generation = 0
+
+        # The mapped catalog the published engines read links from, and those engines
+        items = (loaded or {}).get("items")
+        self._mapped = items if isinstance(items, BinaryCatalog) else None
+        self._mapped_engines = weakref.WeakSet((pipeline.agent4, self.quote_engine))
+        # (path, sha256) of the catalog file serving now, None until known
+        self._loaded = None
+
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._follower = None
+        self._intervals = {}
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    # --------------------------------------------------
+    # FULL RELOAD
+    # --------------------------------------------------
+
+    def reload_full(self, dataset: Dict[str, Any], source: str = "payload") -> Dict[str, Any]:
+        with self._lock, self._writing() as conn:
+            self._catch_up(conn)
+            report = self._reload_full(dataset, source)
+            self._loaded = None
+            if conn is not None:
+                # Other workers load the stored copy; the row only points at it
+                self._loaded = self.log.store(dataset)
+                self._append_full(conn, source)
+            return report
+
+    def reload_from_file(self, path: str = None, if_changed: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Full reload from `path` (dataset_path by default). With if_changed,
+        None when the live catalog already comes from this version of it.
+        """
+        path = path or self.dataset_path
+        with self._lock, self._writing() as conn:
+            self._catch_up(conn)
+            loaded = (path, file_digest(path))
+            if if_changed and self._loaded == loaded:
+                return None
+            # A new file is checked once, here; workers catching up from the log skip it
+            report = self._reload_full(load_catalog_file(path, verify=True), source=path)
+            self._loaded = loaded
+            if conn is not None:
+                self._append_full(conn, path)
+            return report
+
+    def _reload_full(self, dataset: Dict[str, Any], source: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+
+        if not isinstance(dataset.get("items"), (list, BinaryCatalog)):
+            raise ValueError("Catalog must contain an 'items' list")
+
+        agent4 = copy.copy(self.pipeline.agent4)
+        # Its own plan cache: the replaced engine may still be serving requests
+        agent4.plan_cache = LRUCache(agent4.plan_cache.max_size)
+        agent4.load_catalog(dataset)
+        items = dataset["items"]
+        dataset = self._compact_dataset(agent4)
+        quote_engine = ColumnarProcurementEngine(dataset)
+
+        retired = self._mapped, self._mapped_engines
+        self._mapped = items if isinstance(items, BinaryCatalog) else None
+        self._mapped_engines = weakref.WeakSet()
+        self._publish(dataset, agent4, quote_engine)
+        self._close_when_unused(*retired)
+
+        return self._report("full", source, start, updated=len(dataset["items"]))
+
+    # --------------------------------------------------
+    # INCREMENTAL PRICE DELTA
+    # --------------------------------------------------
+
+    def apply_price_delta(self, updates: Iterable[Tuple[str, int]], source: str = "delta") -> Dict[str, Any]:
+        with self._lock, self._writing() as conn:
+            self._catch_up(conn)
+            if conn is None:
+                return self._apply_price_delta(updates, source)
+            # Kept for the log, so other workers apply the same prices
+            updates = list(updates)
+            report = self._apply_price_delta(updates, source)
+            self._append(conn, "delta", source, "\n".join(
+                json.dumps({"id": item_id, "price": price}) for item_id, price in updates
+            ))
+            return report
+
+    def _apply_price_delta(self, updates: Iterable[Tuple[str, int]], source: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+
+        agent4, changed, unknown = self.pipeline.agent4.with_price_updates(updates)
+        quote_engine = self.quote_engine.with_updated_items(agent4.items, changed)
+        dataset = self._compact_dataset(agent4)
+
+        self._publish(dataset, agent4, quote_engine)
+
+        return self._report("delta", source, start, updated=len(changed), unknown_ids=unknown[:20])
+
+    # --------------------------------------------------
+    # FILE WATCH
+    # --------------------------------------------------
+
+    def watch(self, interval: float = 2.0):
+        """Polls dataset_path and reloads the full catalog when it changes."""
+        if self._watcher or not self.dataset_path:
+            return
+        self._intervals["watch"] = interval
+
+        def _loop():
+            last_mtime = os.path.getmtime(self.dataset_path)
+            while True:
+                time.sleep(interval)
+                try:
+                    mtime = os.path.getmtime(self.dataset_path)
+                    if mtime == last_mtime:
+                        continue
+                    last_mtime = mtime
+                    # Another worker may have logged (and this one applied) the same change
+                    report = self.reload_from_file(if_changed=True)
+                    if report:
+                        print(f"[CATALOG] Reloaded {report['updated']} items in {report['reload_ms']} ms")
+                except Exception as e:
+                    print(f"[CATALOG] Watch reload failed: {e}")
+
+        self._watcher = threading.Thread(target=_loop, name="catalog-watch", daemon=True)
+        self._watcher.start()
+
+    # --------------------------------------------------
+    # CROSS-PROCESS SYNC
+    # --------------------------------------------------
+
+    def follow(self, interval: float = 1.0):
+        """
+        Applies the changes logged by other workers, now and then every
+        `interval` seconds. On startup the log's catalog wins, unless
+        dataset_path changed after it was logged: then the file this
+        process just loaded is logged as the new base instead.
+        """
+        if self._follower or not self.log:
+            return
+        self._intervals["follow"] = interval
+
+        with self._lock, self.log.writing() as conn:
+            base = self.log.base(conn)
+            if self.dataset_path:
+                self._loaded = (self.dataset_path, file_digest(self.dataset_path))
+            if self._loaded and (base is None or base[4] < os.path.getmtime(self.dataset_path)):
+                self._append_full(conn, self.dataset_path)
+            else:
+                self._catch_up(conn)
+
+        self._start_follower()
+
+    def sync(self) -> int:
+        """Applies any logged changes not seen yet, returns how many."""
+        if not self.log or self.log.latest() <= self.generation:
+            return 0
+        with self._lock, self.log.writing() as conn:
+            return self._catch_up(conn)
+
+    def _start_follower(self):
+        interval = self._intervals["follow"]
+
+        def _loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"[CATALOG] Sync failed: {e}")
+
+        self._follower = threading.Thread(target=_loop, name="catalog-sync", daemon=True)
+        self._follower.start()
+
+    def _after_fork(self):
+        # Threads don't survive fork(): restart them in every worker forked after import
+        self._lock = threading.Lock()
+        if self._watcher:
+            self._watcher = None
+            self.watch(self._intervals["watch"])
+        if self._follower:
+            self._start_follower()
+
+    def _writing(self):
+        return self.log.writing() if self.log else contextlib.nullcontext()
+
+    def _append_full(self, conn, source: str):
+        path, digest = self._loaded
+        self._append(conn, "full", source, json.dumps({"path": path, "sha256": digest}))
+
+    def _append(self, conn, kind: str, source: str, payload: str):
+        self.generation = self.log.append(conn, kind, source, payload)
+        if self.last_reload is not None:
+            self.last_reload["generation"] = self.generation
+
+    def _catch_up(self, conn) -> int:
+        """Replays the changes other workers logged after self.generation."""
+        if conn is None:
+            return 0
+        changes = self.log.pending(conn, self.generation)
+        for generation, kind, source, payload, _ in changes:
+            if kind == "full":
+                info = json.loads(payload)
+                if self._loaded == (info["path"], info["sha256"]):
+                    # Already serving this version of the file
+                    self.generation = generation
+                    continue
+                loaded = (info["path"], file_digest(info["path"]))
+                if loaded[1] != info["sha256"]:
+                    print(f"[CATALOG] {info['path']} changed after change {generation} was logged, loading it as is")
+                self._reload_full(load_catalog_file(info["path"]), source)
+                self._loaded = loaded
+            else:
+                self._apply_price_delta(parse_price_delta(payload.splitlines(), "jsonl"), source)
+            self.generation = generation
+            print(f"[CATALOG] Applied logged {kind} change {generation} from {source}")
+        return len(changes)
+
+    # --------------------------------------------------
+    # HELPERS
+    # --------------------------------------------------
+
+    @staticmethod
+    def _compact_dataset(agent4):
+        return {"metadata": agent4.metadata, "items": agent4.items}
+
+    def _publish(self, dataset, agent4, quote_engine):
+        self.dataset = dataset
+        self.quote_engine = quote_engine
+        self.pipeline.agent4 = agent4
+        if self._mapped is not None:
+            self._mapped_engines.update((agent4, quote_engine))
+
+        if self.search:
+            threading.Thread(
+                target=self._rebuild_search, args=(dataset["items"], agent4.catalog_version),
+                name="catalog-search-rebuild", daemon=True
+            ).start()
+
+    @staticmethod
+    def _close_when_unused(mapped, engines):
+        """
+        Unmaps a replaced compiled catalog once every engine published over
+        it is gone. Requests that still hold one keep reading its links.
+        """
+        if mapped is None:
+            return
+        engines = list(engines)
+        if not engines:
+            mapped.close()
+            return
+
+        remaining = [len(engines)]
+        lock = threading.Lock()
+
+        def _release():
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            mapped.close()
+
+        for engine in engines:
+            weakref.finalize(engine, _release)
+
+    def _rebuild_search(self, items, catalog_version):
+        try:
+            self.search.rebuild(items, f"catalog:{catalog_version}", catalog_version=catalog_version)
+        except Exception as e:
+            print(f"[CATALOG] Search index rebuild failed: {e}")
+
+    def _report(self, mode, source, start, **details):
+        self.last_reload = {
+            "mode": mode,
+            "source": source,
+            "catalog_version": self.pipeline.agent4.catalog_version,
+            "generation": self.generation,
+            "total_items": len(self.dataset["items"]),
+            "reload_ms": round((time.perf_counter() - start) * 1000, 3),
+            **details
+        }
+        return self.last_reload
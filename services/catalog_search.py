@@ -0,0 +1,416 @@
+"""
+On-disk full-text search over the catalog.
+
+Items are written to a SQLite database with an FTS5 index over their
+names and tags.
+Rows are inserted in price order, so rowid order is price order:
+results stream out of the index already sorted, a price range becomes a
+rowid range and the keyset cursor is simply the last rowid returned.
+Workers only hold a connection, never the catalog itself.
+
+    python -m services.catalog_search build dataset/indian_interior_v2.json
+    python -m services.catalog_search query "jute carpet" --theme rustic_indian
+"""
+import os
+import re
+import sys
+import json
+import uuid
+import sqlite3
+import argparse
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.catalog_binary import load_catalog_file
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEARCH_DB_PATH = os.path.join(BASE_DIR, "instance", "catalog_search.db")
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE vocab (kind TEXT, name TEXT, bit INTEGER, PRIMARY KEY (kind, name));
+CREATE TABLE words (word TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE items (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT, item_type TEXT, name TEXT, category TEXT,
+    themes TEXT, space_types TEXT, theme_mask INTEGER, space_mask INTEGER,
+    price INTEGER, quality_level TEXT, product_link TEXT, diy_link TEXT, is_diy INTEGER
+);
+CREATE VIRTUAL TABLE items_fts USING fts5(
+    terms, content='', detail='none', prefix='2 3', tokenize="unicode61 tokenchars '_'"
+);
+"""
+
+INDEXES = """
+CREATE INDEX items_item_type ON items (item_type);
+CREATE INDEX items_price ON items (price);
+"""
+
+# SQLite integers are signed 64-bit
+MAX_TAGS = 63
+
+# A partial last word is expanded into at most this many indexed words
+# before falling back to an FTS5 prefix query. FTS5 has to merge the full
+# doclist of every prefix it is given that is not in its prefix index;
+# an OR over whole words is streamed instead.
+MAX_COMPLETIONS = 64
+PREFIX_INDEX = (2, 3)
+
+
+class CursorExpired(ValueError):
+    """The index was rebuilt since the cursor was issued."""
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _typed_words(item_type: str, words: Iterable[str]) -> List[str]:
+    # "__carpet__jute": a name word scoped to one item type
+    scope = "_".join(_words(item_type))
+    return [f"__{scope}__{word}" for word in words]
+
+
+def _tag(kind: str, value: str) -> str:
+    # "_theme_rustic_indian" / "_space_living_room"
+    return f"_{kind}_" + "_".join(_words(value))
+
+
+def _index_terms(item) -> str:
+    """
+    Every term an item is findable by, as one FTS5 column: its name words,
+    the same words scoped to its item type, and its theme/space tags.
+    Plain name words never start with "_", so prefix scans on them never
+    touch the scoped terms or tags.
+    """
+    words = _words(item["name"])
+    terms = words + _typed_words(item["item_type"], words)
+    terms += [_tag("theme", theme) for theme in item["themes"]]
+    terms += [_tag("space", space) for space in item.get("space_types", [])]
+    return " ".join(terms)
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _fts_query(
+    words: List[str],
+    completions: Optional[List[str]],
+    item_type: Optional[str],
+    theme: Optional[str],
+    space_type: Optional[str]
+) -> str:
+    """
+    Search words -> FTS5 query: every word must match. The last word
+    matches any of `completions` (the indexed words it is a prefix of),
+    or is sent as an FTS5 prefix query when completions is None. With an
+    item_type the words are looked up in their type-scoped form, so a
+    name/type mismatch costs one term lookup instead of merging two large
+    doclists. Theme and space filters become tag terms. Everything is
+    quoted, so user input is never parsed as FTS5 syntax.
+    """
+    scope = (lambda terms: _typed_words(item_type, terms)) if item_type is not None else list
+
+    terms = [_quote(word) for word in scope(words[:-1])]
+    if completions is None:
+        terms.append(_quote(scope(words[-1:])[0]) + "*")
+    else:
+        terms.append("(" + " OR ".join(_quote(word) for word in scope(completions)) + ")")
+
+    if theme is not None:
+        terms.append(_quote(_tag("theme", theme)))
+    if space_type is not None:
+        terms.append(_quote(_tag("space", space_type)))
+    return " AND ".join(terms)
+
+
+class CatalogSearchIndex:
+    """
+    Builds and queries the search database at `path`.
+
+    Rebuilds write a new file next to the live one and swap it in with
+    os.replace, so searches keep running against the old index until the
+    new one is complete. Each thread keeps its own read-only connection
+    and reopens it after a swap.
+    """
+
+    def __init__(self, path: str = SEARCH_DB_PATH):
+        self.path = path
+        self.generation = 0
+        self.catalog_version = -1
+
+        self._local = threading.local()
+        self._build_lock = threading.Lock()
+
+    # --------------------------------------------------
+    # BUILD
+    # --------------------------------------------------
+
+    def fingerprint(self) -> Optional[str]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            row = self._connection().execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        except sqlite3.DatabaseError:
+            return None
+        return row[0] if row else None
+
+    def ensure(self, items: Iterable[Any], fingerprint: str):
+        """Builds the index unless the one on disk was built from `fingerprint`."""
+        if self.fingerprint() != fingerprint:
+            self.rebuild(items, fingerprint)
+
+    def rebuild(self, items: Iterable[Any], fingerprint: str, catalog_version: int = 0):
+        """
+        Writes a fresh index. A rebuild for an older catalog_version than
+        the one already published is dropped, so out-of-order background
+        rebuilds cannot roll the index back.
+        """
+        with self._build_lock:
+            if catalog_version and catalog_version <= self.catalog_version:
+                return
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+            conn = sqlite3.connect(tmp_path)
+            try:
+                conn.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + SCHEMA)
+                self._write_items(conn, items)
+                conn.executescript(INDEXES)
+                conn.execute("INSERT INTO items_fts (items_fts) VALUES ('optimize')")
+                conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+                    ("fingerprint", fingerprint), ("build_id", uuid.uuid4().hex[:12])
+                ])
+                conn.commit()
+                conn.execute("VACUUM")
+            finally:
+                conn.close()
+
+            os.replace(tmp_path, self.path)
+            self.catalog_version = catalog_version
+            self.generation += 1
+
+    @staticmethod
+    def _write_items(conn, items):
+        items = sorted(enumerate(items), key=lambda pair: (pair[1]["price"], pair[0]))
+
+        bits = {"theme": {}, "space": {}}
+
+        def mask(kind, names):
+            value = 0
+            for name in names:
+                table = bits[kind]
+                if name not in table:
+                    if len(table) == MAX_TAGS:
+                        raise ValueError(f"Search index supports at most {MAX_TAGS} {kind} values")
+                    table[name] = len(table)
+                value |= 1 << table[name]
+            return value
+
+        rows = [
+            (
+                rowid, item["id"], item["item_type"], item["name"], item.get("category", ""),
+                json.dumps(list(item["themes"])), json.dumps(list(item.get("space_types", []))),
+                mask("theme", item["themes"]), mask("space", item.get("space_types", [])),
+                item["price"], item["quality_level"], item.get("product_link", ""),
+                item.get("diy_link", ""), int(bool(item["is_diy"]))
+            )
+            for rowid, (_, item) in enumerate(items, start=1)
+        ]
+        conn.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany(
+            "INSERT INTO items_fts (rowid, terms) VALUES (?, ?)",
+            ((rowid, _index_terms(item)) for rowid, (_, item) in enumerate(items, start=1))
+        )
+        conn.executemany(
+            "INSERT INTO words VALUES (?)",
+            ((word,) for word in sorted({word for _, item in items for word in _words(item["name"])}))
+        )
+        conn.executemany(
+            "INSERT INTO vocab VALUES (?, ?, ?)",
+            [(kind, name, bit) for kind, table in bits.items() for name, bit in table.items()]
+        )
+
+    # --------------------------------------------------
+    # QUERY
+    # --------------------------------------------------
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, "generation", None) != self.generation:
+            if getattr(local, "conn", None):
+                local.conn.close()
+            local.conn = conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            local.generation = self.generation
+
+            local.vocab = {"theme": {}, "space": {}}
+            for kind, name, bit in conn.execute("SELECT kind, name, bit FROM vocab"):
+                local.vocab[kind][name] = bit
+            row = conn.execute("SELECT value FROM meta WHERE key = 'build_id'").fetchone()
+            local.build_id = row[0] if row else ""
+            conn.row_factory = sqlite3.Row
+        return local.conn
+
+    @staticmethod
+    def _completions(conn, prefix: str, scoped: bool) -> Optional[List[str]]:
+        """
+        Indexed words starting with `prefix`, or None to let FTS5 expand it
+        (short unscoped prefixes it has precomputed, or too many words).
+        """
+        if not scoped and len(prefix) in PREFIX_INDEX:
+            return None
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        rows = conn.execute(
+            "SELECT word FROM words WHERE word >= ? AND word < ? LIMIT ?",
+            (prefix, upper, MAX_COMPLETIONS + 1)
+        ).fetchall()
+        if len(rows) > MAX_COMPLETIONS:
+            return None
+        return [row[0] for row in rows]
+
+    def _rowid_range(self, conn, min_price, max_price):
+        """Price bounds -> inclusive rowid bounds (rowids are in price order)."""
+        low, high = 1, sys.maxsize
+        if min_price is not None:
+            row = conn.execute(
+                "SELECT rowid FROM items WHERE price >= ? ORDER BY price, rowid LIMIT 1", (min_price,)
+            ).fetchone()
+            low = row[0] if row else sys.maxsize
+        if max_price is not None:
+            row = conn.execute(
+                "SELECT rowid FROM items WHERE price <= ? ORDER BY price DESC, rowid DESC LIMIT 1", (max_price,)
+            ).fetchone()
+            high = row[0] if row else 0
+        return low, high
+
+    def search(
+        self,
+        query: str = "",
+        theme: Optional[str] = None,
+        space_type: Optional[str] = None,
+        item_type: Optional[str] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Items whose name matches `query` (all words, last one as a prefix)
+        and every given filter, cheapest first.
+
+        :return: {"items": [...], "next_cursor": str or None}
+        """
+        conn = self._connection()
+        build_id = self._local.build_id
+
+        after = 0
+        if cursor:
+            cursor_build, _, rowid = cursor.partition(".")
+            if not rowid.isdigit():
+                raise ValueError("Malformed cursor")
+            if cursor_build != build_id:
+                raise CursorExpired("The catalog changed, restart the search")
+            after = int(rowid)
+
+        low, high = self._rowid_range(conn, min_price, max_price)
+        low = max(low, after + 1)
+
+        where = ["items.rowid BETWEEN ? AND ?"]
+        params: List[Any] = [low, high]
+
+        bits = self._local.vocab
+        for kind, value in (("theme", theme), ("space", space_type)):
+            if value is None:
+                continue
+            if value not in bits[kind]:
+                return {"items": [], "next_cursor": None}
+            where.append(f"items.{kind}_mask & ? != 0")
+            params.append(1 << bits[kind][value])
+
+        if item_type is not None:
+            where.append("items.item_type = ?")
+            params.append(item_type)
+
+        words = _words(query or "")
+        if words:
+            completions = self._completions(conn, words[-1], scoped=item_type is not None)
+            if completions == []:
+                return {"items": [], "next_cursor": None}
+            match = _fts_query(words, completions, item_type, theme, space_type)
+            # Ordering on the FTS rowid streams matches in index order, no sort
+            sql = (
+                "SELECT items.* FROM items_fts JOIN items ON items.rowid = items_fts.rowid "
+                "WHERE items_fts MATCH ? AND items_fts.rowid BETWEEN ? AND ? AND "
+                + " AND ".join(where) + " ORDER BY items_fts.rowid LIMIT ?"
+            )
+            params = [match, low, high] + params
+        else:
+            sql = "SELECT items.* FROM items WHERE " + " AND ".join(where) + " ORDER BY items.rowid LIMIT ?"
+
+        params.append(limit + 1)
+
+        rows = conn.execute(sql, params).fetchall()
+        page = rows[:limit]
+        next_cursor = f"{build_id}.{page[-1]['rowid']}" if len(rows) > limit else None
+
+        return {"items": [self._item(row) for row in page], "next_cursor": next_cursor}
+
+    @staticmethod
+    def _item(row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "item_type": row["item_type"],
+            "name": row["name"],
+            "category": row["category"],
+            "themes": json.loads(row["themes"]),
+            "space_types": json.loads(row["space_types"]),
+            "price": row["price"],
+            "quality_level": row["quality_level"],
+            "product_link": row["product_link"],
+            "diy_link": row["diy_link"],
+            "is_diy": bool(row["is_diy"])
+        }
+
+
+def file_fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the catalog search index.")
+    parser.add_argument("--db", default=SEARCH_DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="index a JSON or compiled catalog")
+    build.add_argument("path")
+
+    query = commands.add_parser("query", help="run a search against the index")
+    query.add_argument("text", nargs="?", default="")
+    for name in ("theme", "space-type", "item-type", "cursor"):
+        query.add_argument(f"--{name}")
+    query.add_argument("--min-price", type=int)
+    query.add_argument("--max-price", type=int)
+    query.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args()
+    index = CatalogSearchIndex(args.db)
+
+    if args.command == "build":
+        dataset = load_catalog_file(args.path)
+        index.rebuild(dataset["items"], file_fingerprint(args.path))
+        print(f"Indexed {len(dataset['items'])} items into {args.db}")
+        return
+
+    print(json.dumps(index.search(
+        args.text, theme=args.theme, space_type=args.space_type, item_type=args.item_type,
+        min_price=args.min_price, max_price=args.max_price, limit=args.limit, cursor=args.cursor
+    ), indent=2))
+
+
+if __name__ == "__main__":
+    main()
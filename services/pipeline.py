@@ -1,58 +1,227 @@
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from agents.agent1 import SceneStructuringAgent
 from agents.agent2 import DesignPlannerAgent
 from agents.agent3 import VisualizationAgent
 from agents.agent4 import Agent4ProcurementEngine
+from agents.fused_scene_plan import FusedScenePlanAgent
+from utils.gemini_client import agent_route
+from utils.usage import trace_request
 
 class InteriorDesignPipeline:
     def __init__(self, dataset: Dict[str, Any]):
-        self.agent1 = SceneStructuringAgent()
-        self.agent2 = DesignPlannerAgent()
+        self.agent1 = SceneStructuringAgent(
+            cache_size=int(os.getenv("SCENE_CACHE_SIZE", 256)),
+            prompt_tokens=int(os.getenv("SCENE_PROMPT_TOKENS", 1000))
+        )
+        self.agent2 = DesignPlannerAgent(prompt_tokens=int(os.getenv("PLAN_PROMPT_TOKENS", 1200)))
+        # Opt-in: Agent 2's plan is streamed and its items logged as soon as each is complete
+        self.stream_plan = os.getenv("STREAM_PLAN", "0") == "1"
+        # Opt-in: one Gemini call for the scene and the plan on initial runs
+        self.fused = None
+        if os.getenv("FUSED_SCENE_PLAN", "0") == "1":
+            self.fused = FusedScenePlanAgent(
+                self.agent1, self.agent2,
+                prompt_tokens=int(os.getenv("FUSED_PROMPT_TOKENS", 1400))
+            )
         self.agent3 = VisualizationAgent()
-        self.agent4 = Agent4ProcurementEngine(dataset)
+        self.agent4 = Agent4ProcurementEngine(
+            dataset,
+            cache_size=int(os.getenv("PLAN_CACHE_SIZE", 1024)),
+            budget_step=int(os.getenv("PLAN_CACHE_BUDGET_STEP", 1))
+        )
+
+    def precheck(self, user_input: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Budget feasibility from the catalog index alone, for requests that
+        already carry their required_items (e.g. iterations). None otherwise.
+
+        Only those requests can be rejected before the LLM agents run. On
+        other runs the items come from Agent 2, and the same check is just
+        reported under procurement.budget_check.
+        """
+        required_items = user_input.get("required_items")
+        if not required_items:
+            return None
+
+        scene = user_input.get("previous_scene_data") or {}
+        try:
+            return self.agent4.budget_bounds(
+                theme=user_input.get("theme") or scene.get("theme"),
+                space_type=user_input.get("space_type") or scene.get("space_type"),
+                required_items=required_items,
+                user_budget=int(user_input["budget"]),
+                solver=user_input.get("plan_solver") or "greedy"
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            # Malformed input is left for the full run to handle as before
+            print(f"[PIPELINE] Budget precheck skipped: {e}")
+            return None
 
-    def run(self, user_input: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def parse_alternatives(user_input: Dict[str, Any]) -> int:
+        """
+        Swap options requested per plan slot, 0 when absent. Raises
+        ValueError unless it is a whole number >= 0, so the routes answer
+        400 instead of Agent 4 failing on it mid-run.
+        """
+        value = user_input.get("alternatives")
+        if value is None or value == "":
+            return 0
+        try:
+            alternatives = int(str(value).strip())
+        except ValueError:
+            raise ValueError(f"'alternatives' must be a whole number, got {value!r}")
+        if alternatives < 0:
+            raise ValueError("'alternatives' cannot be negative")
+        return alternatives
+
+    def run(self, user_input: Dict[str, Any], timings: bool = False) -> Dict[str, Any]:
         """
         Orchestrates the four agents. Supports iterations (skipping Agent 1).
+        With timings, the response carries the per-call usage of the request
+        (see utils.usage).
+        """
+        with trace_request() as trace:
+            result = self._run(user_input)
+        if timings:
+            result["timings"] = trace.summary()
+        return result
+
+    async def run_async(self, user_input: Dict[str, Any], timings: bool = False) -> Dict[str, Any]:
         """
+        run() for an event loop: Gemini calls are awaited instead of holding
+        a thread, and Agent 3's image and guide are generated concurrently.
+        """
+        with trace_request() as trace:
+            result = await self._run_async(user_input)
+        if timings:
+            result["timings"] = trace.summary()
+        return result
+
+    def _run(self, user_input: Dict[str, Any]) -> Dict[str, Any]:
+        # --- PHASE 0: Input checks and budget precheck (no LLM calls) ---
+        user_input = dict(user_input, alternatives=self.parse_alternatives(user_input))
+        rejected = self._reject_infeasible(user_input)
+        if rejected:
+            return rejected
+
         # --- PHASE 1: Scene Structuring (or Iteration) ---
-        previous_scene = user_input.get("previous_scene_data")
-        
-        if previous_scene:
-            # ITERATION MODE: Skip Agent 1, use previous data
-            print("\n[PIPELINE] Detected Iteration Mode. Skipping Agent 1...")
-            scene_data = previous_scene
-            
-            # Update specific fields if the user provided new ones
-            if "theme" in user_input:
-                scene_data["theme"] = user_input["theme"]
-            if "budget" in user_input:
-                scene_data["budget"] = user_input["budget"]
-        else:
+        scene_data = self._iteration_scene(user_input)
+        design_plan = None
+        if scene_data is None and self.fused:
+            # FUSED MODE: Agents 1 and 2 in one call
+            print("\n[PIPELINE] Initial Run. Calling fused Agent 1+2...")
+            with agent_route("FusedScenePlanAgent"):
+                fused = self.fused.run(user_input, image_path=user_input.get("image_path"), image_hash=user_input.get("image_hash"))
+            if fused:
+                scene_data, design_plan = fused
+        if scene_data is None:
             # INITIAL MODE: Run Agent 1
             print("\n[PIPELINE] Initial Run. Calling Agent 1...")
             image_path = user_input.get("image_path")
-            scene_data = self.agent1.run(user_input, image_path=image_path)
+            with agent_route("SceneStructuringAgent"):
+                scene_data = self.agent1.run(user_input, image_path=image_path, image_hash=user_input.get("image_hash"))
 
         # --- PHASE 2: Design Planning (Agent 2) ---
-        print("[PIPELINE] Calling Agent 2 (Design Planner)...")
-        design_plan = self.agent2.run(scene_data)
+        if design_plan is None and self.stream_plan:
+            print("[PIPELINE] Streaming Agent 2 (Design Planner)...")
+            with agent_route("DesignPlannerAgent"):
+                design_plan = self.agent2.run_stream(scene_data, on_item=self._log_item)
+        elif design_plan is None:
+            print("[PIPELINE] Calling Agent 2 (Design Planner)...")
+            with agent_route("DesignPlannerAgent"):
+                design_plan = self.agent2.run(scene_data)
 
         # --- PHASE 3: Visualization (Agent 3) ---
         print("[PIPELINE] Calling Agent 3 (Visualizer & Guide)...")
-        visual_output = self.agent3.run(scene_data, design_plan)
-        print(f"[PIPELINE] Agent 3 Guide Length: {len(visual_output.get('guide', ''))}")
-        print(f"[PIPELINE] Agent 3 Image Links: {visual_output.get('image_links')}")
+        with agent_route("VisualizationAgent"):
+            visual_output = self.agent3.run(scene_data, design_plan)
 
-        # --- PHASE 4: Procurement (Agent 4) ---
-        print("[PIPELINE] Calling Agent 4 (Procurement Engine)...")
+        return self._finish(user_input, scene_data, design_plan, visual_output)
+
+    async def _run_async(self, user_input: Dict[str, Any]) -> Dict[str, Any]:
+        # --- PHASE 0: Input checks and budget precheck (no LLM calls) ---
+        user_input = dict(user_input, alternatives=self.parse_alternatives(user_input))
+        rejected = self._reject_infeasible(user_input)
+        if rejected:
+            return rejected
+
+        # --- PHASE 1: Scene Structuring (or Iteration) ---
+        scene_data = self._iteration_scene(user_input)
+        design_plan = None
+        if scene_data is None and self.fused:
+            print("\n[PIPELINE] Initial Run. Calling fused Agent 1+2...")
+            with agent_route("FusedScenePlanAgent"):
+                fused = await self.fused.run_async(user_input, image_path=user_input.get("image_path"), image_hash=user_input.get("image_hash"))
+            if fused:
+                scene_data, design_plan = fused
+        if scene_data is None:
+            print("\n[PIPELINE] Initial Run. Calling Agent 1...")
+            image_path = user_input.get("image_path")
+            with agent_route("SceneStructuringAgent"):
+                scene_data = await self.agent1.run_async(user_input, image_path=image_path, image_hash=user_input.get("image_hash"))
+
+        # --- PHASE 2: Design Planning (Agent 2) ---
+        if design_plan is None and self.stream_plan:
+            print("[PIPELINE] Streaming Agent 2 (Design Planner)...")
+            with agent_route("DesignPlannerAgent"):
+                design_plan = await self.agent2.run_stream_async(scene_data, on_item=self._log_item)
+        elif design_plan is None:
+            print("[PIPELINE] Calling Agent 2 (Design Planner)...")
+            with agent_route("DesignPlannerAgent"):
+                design_plan = await self.agent2.run_async(scene_data)
+
+        # --- PHASE 3: Visualization (Agent 3) ---
+        print("[PIPELINE] Calling Agent 3 (Visualizer & Guide)...")
+        with agent_route("VisualizationAgent"):
+            visual_output = await self.agent3.run_async(scene_data, design_plan)
+
+        return self._finish(user_input, scene_data, design_plan, visual_output)
+
+    @staticmethod
+    def _log_item(item: Dict[str, Any]):
+        print(f"[PIPELINE] Agent 2 planned {item['item_type']} ({item['category']})")
+
+    def _reject_infeasible(self, user_input: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        budget_check = self.precheck(user_input)
+        if budget_check and not budget_check["feasible"]:
+            print(f"[PIPELINE] Budget {budget_check['budget']} below minimum {budget_check['min_budget']}. Skipping agents.")
+            return {
+                "status": "error",
+                "message": f"Budget too low: at least {budget_check['min_budget']} is needed to buy every required item.",
+                "budget_check": budget_check
+            }
+        return None
+
+    def _iteration_scene(self, user_input: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Scene data of the previous run in iteration mode, None on initial runs."""
+        previous_scene = user_input.get("previous_scene_data")
+        if not previous_scene:
+            return None
+
+        # ITERATION MODE: Skip Agent 1, use previous data
+        print("\n[PIPELINE] Detected Iteration Mode. Skipping Agent 1...")
+        scene_data = previous_scene
+
+        # Update specific fields if the user provided new ones
+        if "theme" in user_input:
+            scene_data["theme"] = user_input["theme"]
+        if "budget" in user_input:
+            scene_data["budget"] = user_input["budget"]
+        return scene_data
+
+    def _procure(self, user_input, scene_data, required_items):
+        """(procurement plans, budget check) for the planned items (Agent 4, in-memory)."""
+        budget_check = None
         try:
             procurement_plans = self.agent4.generate_comparison_plans(
                 theme=scene_data.get("theme"),
                 space_type=scene_data.get("space_type"),
-                required_items=design_plan.get("required_items", []),
-                user_budget=scene_data.get("budget", 30000)
+                required_items=required_items,
+                user_budget=scene_data.get("budget", 30000),
+                solver=user_input.get("plan_solver") or "greedy",
+                alternatives=user_input["alternatives"]
             )
             # Ensure we always have 3 plans
             if len(procurement_plans) < 3:
@@ -72,6 +241,30 @@ class InteriorDesignPipeline:
                 {"plan_name": "Minimal", "total_cost": 0, "savings": 0, "items": []}
             ]
 
+        # Informational only: a failure here leaves the plans above as they are
+        try:
+            budget_check = self.agent4.budget_bounds(
+                theme=scene_data.get("theme"),
+                space_type=scene_data.get("space_type"),
+                required_items=required_items,
+                user_budget=scene_data.get("budget", 30000),
+                solver=user_input.get("plan_solver") or "greedy"
+            )
+        except Exception as e:
+            print(f"[PIPELINE] Budget check skipped: {e}")
+        return procurement_plans, budget_check
+
+    def _finish(self, user_input, scene_data, design_plan, visual_output) -> Dict[str, Any]:
+        """Procurement (Agent 4, in-memory) and the response."""
+        previous_scene = user_input.get("previous_scene_data")
+        print(f"[PIPELINE] Agent 3 Guide Length: {len(visual_output.get('guide', ''))}")
+        print(f"[PIPELINE] Agent 3 Image Links: {visual_output.get('image_links')}")
+
+        # --- PHASE 4: Procurement (Agent 4) ---
+        print("[PIPELINE] Calling Agent 4 (Procurement Engine)...")
+        required_items = design_plan.get("required_items", [])
+        procurement_plans, budget_check = self._procure(user_input, scene_data, required_items)
+
         return {
             "status": "success",
             "is_iteration": bool(previous_scene),
@@ -88,6 +281,7 @@ class InteriorDesignPipeline:
                 "used_intensity": visual_output.get("visuals", {}).get("used_intensity", "moderate")
             },
             "procurement": {
-                "comparison_plans": procurement_plans
+                "comparison_plans": procurement_plans,
+                "budget_check": budget_check
             }
         }
\ No newline at end of file
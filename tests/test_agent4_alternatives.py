@@ -0,0 +1,37 @@
+import json
+import os
+
+import pytest
+
+from agents.agent4 import Agent4ProcurementEngine
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset", "indian_interior_v2.json")
+
+REQUESTS = [
+    ("traditional_indian", "living_room", ["carpet", "wall_art", "floor_lamp", "curtains"], 60000),
+    ("rajasthani_mughal", "bedroom", ["wall_art", "carpet", "decor_statue"], 120000),
+    ("contemporary_indian", "study_room", ["study_table", "ergonomic_chair", "bookshelf", "ceiling_light"], 40000),
+]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    with open(DATASET_PATH) as f:
+        return Agent4ProcurementEngine(json.load(f))
+
+
+@pytest.mark.parametrize("solver", Agent4ProcurementEngine.SOLVERS)
+@pytest.mark.parametrize("theme,space_type,item_types,budget", REQUESTS)
+def test_alternatives_stay_in_the_picks_tier_and_headroom(engine, solver, theme, space_type, item_types, budget):
+    required_items = [{"item_type": t, "priority": p} for p, t in enumerate(item_types, start=1)]
+    plans = engine.generate_comparison_plans(theme, space_type, required_items, budget, solver=solver, alternatives=5)
+
+    for plan, target in zip(plans, engine.comparison_budgets(budget)):
+        for item in plan["items"]:
+            prices = [alt["price"] for alt in item["alternatives"]]
+            assert prices == sorted(prices)
+            for alt in item["alternatives"]:
+                assert alt["quality_level"] == item["quality_level"]
+                assert alt["selection"] != item["selection"] or alt["link"] != item["link"]
+                # Any single swap keeps the plan within its budget
+                assert plan["total_cost"] - item["price"] + alt["price"] <= target
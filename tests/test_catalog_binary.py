@@ -0,0 +1,49 @@
+import json
+import os
+
+import pytest
+
+from utils.catalog_binary import BinaryCatalog, compile_catalog, load_catalog_file
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset", "indian_interior_v2.json")
+
+
+@pytest.fixture
+def compiled(tmp_path):
+    with open(DATASET_PATH) as f:
+        dataset = json.load(f)
+    path = str(tmp_path / "catalog.catbin")
+    compile_catalog(dataset, path)
+    return path, dataset
+
+
+def test_round_trip(compiled):
+    path, dataset = compiled
+    items = load_catalog_file(path)["items"]
+    try:
+        assert [record.to_dict() for record in items] == dataset["items"]
+    finally:
+        items.close()
+
+
+def test_checksum_only_checked_on_request(compiled):
+    path, _ = compiled
+    with open(path, "r+b") as f:
+        # Flip the last byte: padding of the last record, covered by the checksum only
+        f.seek(-1, os.SEEK_END)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    BinaryCatalog(path).close()
+    with pytest.raises(ValueError, match="checksum"):
+        BinaryCatalog(path, verify=True)
+
+
+def test_truncated_file_rejected_without_hashing(compiled):
+    path, _ = compiled
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 8)
+
+    with pytest.raises(ValueError, match="truncated"):
+        BinaryCatalog(path)
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("BYTEZ_API_KEY", "test")
+
+from services.pipeline import InteriorDesignPipeline
+
+
+@pytest.mark.parametrize("value,expected", [(None, 0), ("", 0), ("3", 3), (" 2 ", 2), (4, 4)])
+def test_alternatives_parsed(value, expected):
+    assert InteriorDesignPipeline.parse_alternatives({"alternatives": value}) == expected
+
+
+@pytest.mark.parametrize("value", ["three", "2.5", -1, [1]])
+def test_bad_alternatives_rejected(value):
+    with pytest.raises(ValueError):
+        InteriorDesignPipeline.parse_alternatives({"alternatives": value})
+
+
+def test_route_answers_400_before_running_agents(monkeypatch):
+    import app
+
+    def run(*args, **kwargs):
+        raise AssertionError("pipeline ran on invalid input")
+
+    monkeypatch.setattr(app.pipeline, "run", run)
+    response = app.app.test_client().post(
+        "/generate-design", json={"description_text": "room", "budget": 60000, "alternatives": "lots"}
+    )
+
+    assert response.status_code == 400
+    assert response.get_json()["status"] == "error"
+    assert "alternatives" in response.get_json()["message"]
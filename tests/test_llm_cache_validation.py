@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+from agents.agent2 import DesignPlannerAgent
+from utils import gemini_client
+from utils.llm_cache import ResponseCache
+
+SCENE = {"space_type": "living_room", "theme": "traditional_indian", "detected_elements": [], "budget": 60000}
+PLAN = '{"required_items": [{"item_type": "carpet", "category": "decor", "priority": 1}]}'
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch):
+    """Replaces the model with a queue of replies and gives the client a fresh cache."""
+    replies = []
+
+    def call(fn, *args, key=None, **kwargs):
+        return FakeResponse(replies.pop(0))
+
+    monkeypatch.setattr(gemini_client, "response_cache", ResponseCache(str(tmp_path / "llm_cache.db")))
+    monkeypatch.setattr(gemini_client.gemini_guard, "call", call)
+    return replies
+
+
+def test_unparseable_response_is_not_served_from_cache(upstream):
+    agent = DesignPlannerAgent()
+    upstream.extend(["Sorry, I can't help with that.", PLAN])
+
+    first = agent.run(SCENE)
+    second = agent.run(SCENE)
+
+    assert first["required_items"] == []
+    assert [item["item_type"] for item in second["required_items"]] == ["carpet"]
+    assert not upstream
+
+    # The good answer is the one kept
+    assert agent.run(SCENE) == second
+    assert gemini_client.response_cache.stats()["hits"] == 1
+
+
+def test_cached_response_the_caller_rejects_is_dropped(upstream):
+    upstream.extend(["not json", "still not json"])
+
+    assert gemini_client.generate_response("prompt") == "not json"
+    assert gemini_client.generate_response("prompt", validate=lambda text: text.startswith("{")) == "still not json"
+    assert not upstream
+    assert gemini_client.response_cache.stats()["invalidated"] == 1
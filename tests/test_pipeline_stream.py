@@ -0,0 +1,98 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("BYTEZ_API_KEY", "test")
+
+from services.pipeline import InteriorDesignPipeline
+from utils import gemini_client
+from utils.llm_cache import ResponseCache
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset", "indian_interior_v2.json")
+
+SCENE = {
+    "space_type": "living_room",
+    "detected_elements": ["sofa", "window"],
+    "theme": "rajasthani_mughal",
+    "budget": 60000
+}
+
+PLAN = json.dumps({
+    "design_summary": "Warm Rajasthani accents.",
+    "space_type": "living_room",
+    "theme": "rajasthani_mughal",
+    "required_items": [
+        {"item_type": "wall_art", "category": "decor", "priority": 1},
+        {"item_type": "carpet", "category": "decor", "priority": 2},
+        {"item_type": "floor_lamp", "category": "lighting", "priority": 3},
+        {"item_type": "curtains", "category": "decor", "priority": 4}
+    ],
+    "visualization": {"style_keywords": ["jharokha"], "color_palette": ["indigo"]}
+})
+
+VISUALS = {"visuals": {"used_intensity": "moderate"}, "image_links": [], "guide": "A guide long enough to keep."}
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+def chunks():
+    return [FakeResponse(PLAN[i:i + 40]) for i in range(0, len(PLAN), 40)]
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    with open(DATASET_PATH) as f:
+        pipeline = InteriorDesignPipeline(json.load(f))
+    pipeline.agent3.run = lambda scene, plan: dict(VISUALS)
+
+    async def run_async(scene, plan):
+        return dict(VISUALS)
+
+    pipeline.agent3.run_async = run_async
+    return pipeline
+
+
+@pytest.fixture(autouse=True)
+def upstream(tmp_path, monkeypatch):
+    guard = gemini_client.gemini_guard
+
+    async def call_async(fn, *args, key=None, **kwargs):
+        return FakeResponse(PLAN)
+
+    async def stream_async(fn, *args, key=None, **kwargs):
+        for chunk in chunks():
+            yield chunk
+
+    monkeypatch.setattr(gemini_client, "response_cache", ResponseCache(str(tmp_path / "llm_cache.db"), max_bytes=0))
+    monkeypatch.setattr(guard, "call", lambda fn, *args, key=None, **kwargs: FakeResponse(PLAN))
+    monkeypatch.setattr(guard, "stream", lambda fn, *args, key=None, **kwargs: iter(chunks()))
+    monkeypatch.setattr(guard, "call_async", call_async)
+    monkeypatch.setattr(guard, "stream_async", stream_async)
+
+
+def comparable(result):
+    return {key: result[key] for key in ("scene_analysis", "design_strategy", "procurement")}
+
+
+@pytest.mark.parametrize("run_async", [False, True])
+def test_streamed_and_unary_plans_match(pipeline, monkeypatch, run_async):
+    user_input = {"previous_scene_data": SCENE, "alternatives": "2"}
+
+    def run(stream_plan):
+        monkeypatch.setattr(pipeline, "stream_plan", stream_plan)
+        if run_async:
+            return asyncio.run(pipeline.run_async(user_input))
+        return pipeline.run(user_input)
+
+    unary, streamed = run(False), run(True)
+
+    assert unary["status"] == streamed["status"] == "success"
+    assert len(unary["procurement"]["comparison_plans"][0]["items"]) == 4
+    assert comparable(streamed) == comparable(unary)
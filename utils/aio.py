@@ -0,0 +1,23 @@
+"""
+Bridge from asyncio to blocking calls (SDKs without async APIs, SQLite, PIL).
+
+Blocking work runs on one shared pool. Its threads mostly wait on the
+network, so the pool is sized for in-flight requests, not for CPU count.
+"""
+import os
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+blocking_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ASYNC_IO_THREADS", 256)),
+    thread_name_prefix="blocking"
+)
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Awaits fn(*args, **kwargs) on the blocking pool, in the caller's context variables."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(blocking_executor, functools.partial(context.run, fn, *args, **kwargs))
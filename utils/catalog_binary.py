@@ -0,0 +1,422 @@
+"""
+Compiled binary catalog.
+
+`indian_interior_v2.json` is validated once and compiled into a single
+file that workers memory-map instead of running json.load on every start:
+
+    python -m utils.catalog_binary validate dataset/indian_interior_v2.json
+    python -m utils.catalog_binary compile dataset/indian_interior_v2.json
+    python -m utils.catalog_binary inspect dataset/indian_interior_v2.catbin
+
+Layout (little endian):
+
+    header    magic, format version, counts, sha256 of everything after
+              the header, section offsets
+    metadata  catalog metadata as UTF-8 JSON
+    strings   u32 offsets + UTF-8 blob; every distinct string stored once
+    tuples    u32 offsets + u32 string ids (themes / space_types lists)
+    records   fixed size rows of string/tuple ids, price and is_diy
+
+Strings are decoded on first use, links are never copied out of the
+mapping, so pre-forked workers share the catalog pages.
+
+Hashing the whole file would touch every page of it, so the sha256 is
+checked by `inspect` and when an admin reloads a new file, not when a
+worker opens the catalog. Opening only checks the header and that every
+section lies within the file.
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import argparse
+from typing import Any, Dict, List, Tuple
+
+from utils.catalog_store import CatalogRecord
+
+MAGIC = b"IDCATBIN"
+FORMAT_VERSION = 1
+
+# magic, version, flags, records, strings, tuples, sha256, metadata length,
+# section offsets (metadata, string index, string blob, tuple index,
+# tuple data, records)
+HEADER = struct.Struct("<8sHHIII32sQ6Q")
+# id, item_type, name, category, themes, space_types, price, quality_level,
+# product_link, diy_link, extra fields (JSON), is_diy
+RECORD = struct.Struct("<6IqIIIIB3x")
+U32 = struct.Struct("<I")
+
+REQUIRED_FIELDS = {
+    "id": str, "item_type": str, "name": str, "themes": list,
+    "price": int, "quality_level": str, "is_diy": bool
+}
+
+
+# --------------------------------------------------
+# VALIDATION
+# --------------------------------------------------
+
+def _tier_ranges(price_ranges: Dict[str, Any]) -> List[Tuple[str, int, int]]:
+    return sorted(
+        ((tier, limits["min"], limits["max"]) for tier, limits in price_ranges.items() if tier != "diy"),
+        key=lambda tier: tier[1]
+    )
+
+
+def validate_catalog(dataset: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """
+    Checks a catalog dict and returns (errors, warnings).
+
+    Non-DIY prices outside every tier of price_ranges_inr are errors:
+    classify_by_price_range drops them, so they can never be planned.
+    Prices in the gap between two tiers (e.g. 3001-3499) are reported
+    with the neighbouring tiers.
+    """
+    errors, warnings = [], []
+
+    metadata = dataset.get("metadata")
+    items = dataset.get("items")
+    if not isinstance(metadata, dict) or "price_ranges_inr" not in metadata:
+        return ["metadata.price_ranges_inr is missing"], warnings
+    if not isinstance(items, list):
+        return ["'items' must be a list"], warnings
+
+    tiers = _tier_ranges(metadata["price_ranges_inr"])
+    for (low, _, low_max), (high, high_min, _) in zip(tiers, tiers[1:]):
+        if high_min <= low_max:
+            errors.append(f"price tiers '{low}' and '{high}' overlap ({high_min}-{low_max})")
+
+    allowed = {
+        "item_type": set(metadata.get("allowed_item_types", [])),
+        "category": set(metadata.get("allowed_categories", [])),
+        "quality_level": set(metadata.get("quality_levels", [])),
+    }
+    themes = set(metadata.get("supported_themes", []))
+    diy_price = metadata["price_ranges_inr"].get("diy", {}).get("price", 0)
+
+    seen = set()
+    for pos, item in enumerate(items):
+        label = f"item {item.get('id', pos)!r}" if isinstance(item, dict) else f"item #{pos}"
+        if not isinstance(item, dict):
+            errors.append(f"{label}: not an object")
+            continue
+
+        bad = [field for field, kind in REQUIRED_FIELDS.items() if not isinstance(item.get(field), kind)]
+        if bad:
+            errors.append(f"{label}: missing or invalid {', '.join(bad)}")
+            continue
+
+        if item["id"] in seen:
+            errors.append(f"{label}: duplicate id")
+        seen.add(item["id"])
+
+        for field, values in allowed.items():
+            if values and field in item and item[field] not in values:
+                warnings.append(f"{label}: unknown {field} '{item[field]}'")
+        unknown_themes = [theme for theme in item["themes"] if themes and theme not in themes]
+        if unknown_themes:
+            warnings.append(f"{label}: unknown themes {unknown_themes}")
+
+        price = item["price"]
+        if item["is_diy"]:
+            if price != diy_price:
+                warnings.append(f"{label}: DIY item priced {price}, expected {diy_price}")
+            continue
+
+        tier = next((name for name, low, high in tiers if low <= price <= high), None)
+        if tier is None:
+            below = [name for name, _, high in tiers if high < price]
+            above = [name for name, low, _ in tiers if low > price]
+            if below and above:
+                errors.append(f"{label}: price {price} falls in the gap between '{below[-1]}' and '{above[0]}'")
+            else:
+                errors.append(f"{label}: price {price} is outside every price tier")
+        elif tier != item["quality_level"]:
+            warnings.append(f"{label}: quality_level '{item['quality_level']}' but priced in the '{tier}' tier")
+
+    return errors, warnings
+
+
+# --------------------------------------------------
+# COMPILER
+# --------------------------------------------------
+
+def compile_catalog(dataset: Dict[str, Any], path: str) -> Dict[str, Any]:
+    """Writes `dataset` to `path` in the binary layout and returns a summary."""
+    strings: Dict[str, int] = {}
+    tuples: Dict[Tuple[int, ...], int] = {}
+
+    def sid(value: str) -> int:
+        return strings.setdefault(value, len(strings))
+
+    def tid(values) -> int:
+        return tuples.setdefault(tuple(sid(value) for value in values), len(tuples))
+
+    sid("")
+    records = bytearray()
+    for item in dataset["items"]:
+        extra = {key: item[key] for key in item.keys() if key not in CatalogRecord._FIELD_SET}
+        records += RECORD.pack(
+            sid(item["id"]), sid(item["item_type"]), sid(item["name"]), sid(item.get("category", "")),
+            tid(item["themes"]), tid(item.get("space_types", [])), item["price"],
+            sid(item["quality_level"]), sid(item.get("product_link", "")), sid(item.get("diy_link", "")),
+            sid(json.dumps(extra) if extra else ""), bool(item["is_diy"])
+        )
+
+    metadata = json.dumps(dataset["metadata"]).encode("utf-8")
+    blob = bytearray()
+    string_offsets = bytearray()
+    for value in strings:
+        string_offsets += U32.pack(len(blob))
+        blob += value.encode("utf-8")
+    string_offsets += U32.pack(len(blob))
+
+    tuple_offsets = bytearray()
+    tuple_data = bytearray()
+    for ids in tuples:
+        tuple_offsets += U32.pack(len(tuple_data) // U32.size)
+        tuple_data += struct.pack(f"<{len(ids)}I", *ids)
+    tuple_offsets += U32.pack(len(tuple_data) // U32.size)
+
+    sections = [metadata, string_offsets, blob, tuple_offsets, tuple_data, records]
+    offsets = []
+    payload = bytearray()
+    for section in sections:
+        # Keep every section 8-byte aligned
+        payload += b"\0" * (-len(payload) % 8)
+        offsets.append(HEADER.size + len(payload))
+        payload += section
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, 0, len(dataset["items"]), len(strings), len(tuples),
+        hashlib.sha256(payload).digest(), len(metadata), *offsets
+    )
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+    return {
+        "path": path,
+        "items": len(dataset["items"]),
+        "strings": len(strings),
+        "tuples": len(tuples),
+        "bytes": HEADER.size + len(payload),
+        "sha256": hashlib.sha256(payload).hexdigest()
+    }
+
+
+# --------------------------------------------------
+# MEMORY-MAPPED READER
+# --------------------------------------------------
+
+class MappedStringTable:
+    """
+    Read-only string table backed by the mapping. Stands in for
+    catalog_store.StringTable as a record's link table, so links are
+    only decoded when a plan is formatted.
+    """
+
+    def __init__(self, buf, index_offset: int, blob_offset: int, count: int):
+        self._buf = buf
+        self._index_offset = index_offset
+        self._blob_offset = blob_offset
+        self._count = count
+
+    def __getitem__(self, string_id: int) -> str:
+        start, end = struct.unpack_from("<2I", self._buf, self._index_offset + string_id * U32.size)
+        return str(self._buf[self._blob_offset + start:self._blob_offset + end], "utf-8")
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class BinaryCatalog:
+    """
+    Memory-mapped compiled catalog.
+
+    Behaves as a read-only sequence of CatalogRecords built on access, so
+    it can be passed wherever the catalog's "items" list is expected.
+    Enum strings and theme/space tuples are decoded once and shared by
+    every record.
+    """
+
+    def __init__(self, path: str, verify: bool = False):
+        """:param verify: also check the sha256 of everything after the header"""
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = self._buf = memoryview(self._map)
+
+        if len(buf) < HEADER.size or buf[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a compiled catalog")
+
+        (_, version, _, self._count, n_strings, n_tuples, digest, metadata_len,
+         metadata_off, string_index, string_blob, tuple_index, tuple_data, records) = HEADER.unpack_from(buf)
+
+        if version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} has catalog format v{version}, expected v{FORMAT_VERSION}")
+        # Each index ends with the end offset of its last entry
+        sections = (metadata_off + metadata_len, string_index + (n_strings + 1) * U32.size,
+                    tuple_index + (n_tuples + 1) * U32.size, records + self._count * RECORD.size)
+        if max(sections) > len(buf):
+            self.close()
+            raise ValueError(f"{path} is truncated")
+        if verify and hashlib.sha256(buf[HEADER.size:]).digest() != digest:
+            self.close()
+            raise ValueError(f"{path} failed its checksum")
+
+        self.version = version
+        self.sha256 = digest.hex()
+        self.metadata = json.loads(str(buf[metadata_off:metadata_off + metadata_len], "utf-8"))
+        self.strings = MappedStringTable(buf, string_index, string_blob, n_strings)
+
+        self._tuple_index = tuple_index
+        self._tuple_data = tuple_data
+        self._records = records
+        self._interned: Dict[int, str] = {}
+        self._tuples: Dict[int, tuple] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, pos: int) -> CatalogRecord:
+        if pos < 0:
+            pos += self._count
+        if not 0 <= pos < self._count:
+            raise IndexError(pos)
+        return self._record(pos)
+
+    def __iter__(self):
+        for pos in range(self._count):
+            yield self._record(pos)
+
+    def _intern(self, string_id: int) -> str:
+        value = self._interned.get(string_id)
+        if value is None:
+            value = self._interned[string_id] = sys.intern(self.strings[string_id])
+        return value
+
+    def _tuple(self, tuple_id: int) -> tuple:
+        value = self._tuples.get(tuple_id)
+        if value is None:
+            start, end = struct.unpack_from("<2I", self._buf, self._tuple_index + tuple_id * U32.size)
+            ids = struct.unpack_from(f"<{end - start}I", self._buf, self._tuple_data + start * U32.size)
+            value = self._tuples[tuple_id] = tuple(self._intern(string_id) for string_id in ids)
+        return value
+
+    def _record(self, pos: int) -> CatalogRecord:
+        (item_id, item_type, name, category, themes, spaces, price,
+         quality, product_link, diy_link, extra, is_diy) = RECORD.unpack_from(
+            self._buf, self._records + pos * RECORD.size
+        )
+
+        record = CatalogRecord.__new__(CatalogRecord)
+        record.id = self.strings[item_id]
+        record.item_type = self._intern(item_type)
+        record.name = self.strings[name]
+        record.category = self._intern(category)
+        record.themes = self._tuple(themes)
+        record.space_types = self._tuple(spaces)
+        record.price = price
+        record.quality_level = self._intern(quality)
+        record.is_diy = bool(is_diy)
+        record._links = self.strings
+        record._product_link = product_link
+        record._diy_link = diy_link
+        record._extra = json.loads(self.strings[extra]) if extra else None
+        return record
+
+    def close(self):
+        """Unmaps the file. Records built from it can no longer read their links."""
+        if self._buf is not None:
+            # The string table shares this view; releasing it lets the map close
+            self._buf.release()
+            self._buf = None
+        self._map.close()
+
+
+def is_compiled_catalog(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load_catalog_file(path: str, verify: bool = False) -> Dict[str, Any]:
+    """
+    Returns {"metadata", "items"} for a JSON catalog or a compiled one.
+    Compiled catalogs come back with a lazy BinaryCatalog as "items";
+    verify checks their sha256 too.
+    """
+    if is_compiled_catalog(path):
+        items = BinaryCatalog(path, verify=verify)
+        return {"metadata": items.metadata, "items": items}
+    with open(path) as f:
+        return json.load(f)
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+
+def _report(errors: List[str], warnings: List[str], limit: int = 50):
+    for label, lines in (("ERROR", errors), ("WARNING", warnings)):
+        for line in lines[:limit]:
+            print(f"{label}: {line}")
+        if len(lines) > limit:
+            print(f"{label}: ... {len(lines) - limit} more")
+    print(f"{len(errors)} errors, {len(warnings)} warnings")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and compile the procurement catalog.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    validate = commands.add_parser("validate", help="check a JSON catalog")
+    validate.add_argument("path")
+
+    build = commands.add_parser("compile", help="validate and compile a JSON catalog")
+    build.add_argument("path")
+    build.add_argument("-o", "--out", help="output path (default: <path>.catbin)")
+    build.add_argument("--force", action="store_true", help="compile even if validation fails")
+
+    inspect = commands.add_parser("inspect", help="verify a compiled catalog and print its header")
+    inspect.add_argument("path")
+
+    args = parser.parse_args()
+
+    if args.command == "inspect":
+        catalog = BinaryCatalog(args.path, verify=True)
+        print(json.dumps({
+            "path": args.path,
+            "format_version": catalog.version,
+            "items": len(catalog),
+            "strings": len(catalog.strings),
+            "sha256": catalog.sha256,
+            "catalog_version": catalog.metadata.get("version")
+        }, indent=2))
+        return
+
+    with open(args.path) as f:
+        dataset = json.load(f)
+    errors, warnings = validate_catalog(dataset)
+    _report(errors, warnings)
+
+    if args.command == "validate":
+        sys.exit(1 if errors else 0)
+
+    if errors and not args.force:
+        print("Not compiled, fix the errors above or pass --force.")
+        sys.exit(1)
+
+    out = args.out or os.path.splitext(args.path)[0] + ".catbin"
+    print(json.dumps(compile_catalog(dataset, out), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import sys
+from typing import Any, Dict, Iterable, List
+
+
+class StringTable:
+    """
+    Append-only table of unique strings addressed by integer id. Product and
+    DIY links are stored here once and records keep only the id.
+    """
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = self._ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def freeze(self):
+        """Drops the reverse lookup once loading is done; ids stay valid."""
+        self._ids = {}
+
+    def __getitem__(self, string_id: int) -> str:
+        return self.strings[string_id]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class CatalogRecord:
+    """
+    Slotted stand-in for a catalog item dict.
+
+    Enum-like fields (item_type, category, quality_level, themes,
+    space_types) point at interned strings/tuples shared by every record,
+    and links live in a StringTable. Item access (record["price"],
+    record.get("space_types", [])) behaves like the original dict.
+    """
+
+    __slots__ = (
+        "id", "item_type", "name", "category", "themes", "space_types",
+        "price", "quality_level", "is_diy", "_links", "_product_link", "_diy_link", "_extra"
+    )
+
+    FIELDS = (
+        "id", "item_type", "name", "category", "themes", "space_types",
+        "price", "quality_level", "product_link", "diy_link", "is_diy"
+    )
+    _FIELD_SET = frozenset(FIELDS)
+
+    @property
+    def product_link(self) -> str:
+        return self._links[self._product_link]
+
+    @property
+    def diy_link(self) -> str:
+        return self._links[self._diy_link]
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELD_SET:
+            return getattr(self, key)
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._FIELD_SET or bool(self._extra and key in self._extra)
+
+    def keys(self) -> List[str]:
+        return list(self.FIELDS) + list(self._extra or ())
+
+    def to_dict(self) -> Dict[str, Any]:
+        item = {field: self[field] for field in self.FIELDS}
+        item["themes"] = list(self.themes)
+        item["space_types"] = list(self.space_types)
+        item.update(self._extra or {})
+        return item
+
+    def with_price(self, price: int) -> "CatalogRecord":
+        record = CatalogRecord.__new__(CatalogRecord)
+        for slot in self.__slots__:
+            setattr(record, slot, getattr(self, slot))
+        record.price = price
+        return record
+
+    def __repr__(self) -> str:
+        return f"<CatalogRecord {self.id} {self.price}>"
+
+
+def compact_catalog(items: Iterable[Any]) -> List[CatalogRecord]:
+    """
+    Converts catalog item dicts into CatalogRecords sharing one string
+    table and one copy of every theme/space_types tuple. Records that are
+    already compact are passed through unchanged.
+    """
+    links = StringTable()
+    shared_tuples: Dict[tuple, tuple] = {}
+    records = []
+
+    for item in items:
+        if isinstance(item, CatalogRecord):
+            records.append(item)
+            continue
+
+        record = CatalogRecord.__new__(CatalogRecord)
+        record.id = item["id"]
+        record.item_type = sys.intern(item["item_type"])
+        record.name = item["name"]
+        record.category = sys.intern(item.get("category", ""))
+        record.price = item["price"]
+        record.quality_level = sys.intern(item["quality_level"])
+        record.is_diy = bool(item["is_diy"])
+
+        themes = tuple(sys.intern(theme) for theme in item["themes"])
+        record.themes = shared_tuples.setdefault(themes, themes)
+        spaces = tuple(sys.intern(space) for space in item.get("space_types", []))
+        record.space_types = shared_tuples.setdefault(spaces, spaces)
+
+        record._links = links
+        record._product_link = links.add(item.get("product_link", ""))
+        record._diy_link = links.add(item.get("diy_link", ""))
+
+        extra = {key: value for key, value in item.items() if key not in CatalogRecord._FIELD_SET}
+        record._extra = extra or None
+
+        records.append(record)
+
+    links.freeze()
+    return records
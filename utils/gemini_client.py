@@ -1,12 +1,35 @@
+import io
 import os
+import time
+import asyncio
+import weakref
+import functools
+import threading
+import contextlib
+import contextvars
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import grpc
+import google.auth.api_key
 import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from google.api_core import exceptions as api_exceptions
 from dotenv import load_dotenv
 
+from utils.llm_cache import ResponseCache
+from utils.image_prep import ImagePreprocessor
+from utils.aio import run_blocking
+from utils.resilience import ResilientCaller, CircuitBreaker
+from utils.usage import record_call
+
 # Load environment variables
 load_dotenv()
 
 # Configure Gemini API
 api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+# Optional pool of keys to spread calls over, comma-separated
+api_keys = [key.strip() for key in os.getenv("GEMINI_API_KEYS", "").split(",") if key.strip()]
+api_key = api_key or (api_keys[0] if api_keys else None)
 
 if not api_key:
     print("Warning: Neither GEMINI_API_KEY nor GOOGLE_API_KEY found in environment variables.")
@@ -15,28 +38,825 @@ genai.configure(api_key=api_key)
 
 from PIL import Image
 
-def generate_response(prompt: str, model_name: str = "gemini-2.5-flash", image_path: str = None) -> str:
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+
+class GeminiClient:
     """
-    Helper function to generate a response from the Gemini model.
+    Shared Gemini access for all agents.
+
+    One GenerativeModel per model name and one gRPC channel for all of them,
+    so a design request's calls reuse the same HTTP/2 connection instead of
+    setting up a client per call. Keep-alive pings hold the connection open
+    between requests. gRPC channels are thread-safe, so a single instance
+    serves every Flask worker thread.
+
+    Async calls use grpc.aio, whose channels belong to one event loop, so
+    each running loop gets its own channel and model handles.
+
+    `endpoint` ("host:port") points the channels at a plaintext stand-in
+    such as benchmarks/fake_upstream.py instead of the Gemini API.
     """
-    # Prepare content
+
+    def __init__(self, api_key: Optional[str] = None, keepalive_seconds: int = 60, endpoint: Optional[str] = None):
+        self.api_key = api_key
+        self.keepalive_seconds = keepalive_seconds
+        self.endpoint = endpoint
+        self._models: Dict[str, genai.GenerativeModel] = {}
+        self._service = None
+        # event loop -> {"service", "models"} for the async channel of that loop
+        self._async = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+        # channel key ("sync" or an event loop) -> currently connected
+        self._connected = {}
+        self.connections = 0
+        self.calls = 0
+        self.reused_calls = 0
+        self.model_calls: Dict[str, int] = {}
+
+    # --------------------------------------------------
+    # CONNECTION
+    # --------------------------------------------------
+
+    def _channel_options(self):
+        options = [
+            # Same limits the SDK sets on the channels it creates
+            ("grpc.max_send_message_length", -1),
+            ("grpc.max_receive_message_length", -1),
+        ]
+        if self.keepalive_seconds > 0:
+            options += [
+                ("grpc.keepalive_time_ms", self.keepalive_seconds * 1000),
+                ("grpc.keepalive_timeout_ms", 10000),
+                ("grpc.keepalive_permit_without_calls", 1),
+                ("grpc.http2.max_pings_without_data", 0),
+            ]
+        return options
+
+    def _create_channel(self, transport_cls, insecure_channel):
+        if self.endpoint:
+            return insecure_channel(self.endpoint, options=self._channel_options())
+        return transport_cls.create_channel(
+            credentials=google.auth.api_key.Credentials(self.api_key),
+            options=self._channel_options()
+        )
+
+    def _build_service(self):
+        transport_cls = glm.GenerativeServiceClient.get_transport_class("grpc")
+        channel = self._create_channel(transport_cls, grpc.insecure_channel)
+        channel.subscribe(functools.partial(self._on_connectivity, "sync"), try_to_connect=True)
+        return glm.GenerativeServiceClient(transport=transport_cls(channel=channel))
+
+    def _build_async_service(self, loop):
+        transport_cls = glm.GenerativeServiceAsyncClient.get_transport_class("grpc_asyncio")
+        channel = self._create_channel(transport_cls, grpc.aio.insecure_channel)
+        # grpc.aio has no subscribe(), the loop watches the channel instead
+        loop.create_task(self._watch_connectivity(loop, channel))
+        return glm.GenerativeServiceAsyncClient(transport=transport_cls(channel=channel))
+
+    async def _watch_connectivity(self, key, channel):
+        state = channel.get_state(try_to_connect=True)
+        while True:
+            self._on_connectivity(key, state)
+            await channel.wait_for_state_change(state)
+            state = channel.get_state()
+
+    def _on_connectivity(self, key, state):
+        with self._lock:
+            ready = state == grpc.ChannelConnectivity.READY
+            if ready and not self._connected.get(key):
+                self.connections += 1
+            self._connected[key] = ready
+
+    def model(self, model_name: str = DEFAULT_MODEL) -> genai.GenerativeModel:
+        """Cached model handle bound to the shared channel."""
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                if self._service is None and (self.api_key or self.endpoint):
+                    try:
+                        self._service = self._build_service()
+                    except Exception as e:
+                        print(f"[GEMINI] Shared channel unavailable, using SDK defaults: {e}")
+                        self.api_key = self.endpoint = None
+                model = genai.GenerativeModel(model_name)
+                if self._service is not None:
+                    # The 0.5 SDK has no public hook for the service client
+                    model._client = self._service
+                self._models[model_name] = model
+        return model
+
+    def async_model(self, model_name: str = DEFAULT_MODEL) -> genai.GenerativeModel:
+        """Cached model handle bound to the running loop's async channel."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._async.get(loop)
+            if state is None:
+                service = None
+                if self.api_key or self.endpoint:
+                    try:
+                        service = self._build_async_service(loop)
+                    except Exception as e:
+                        print(f"[GEMINI] Shared async channel unavailable, using SDK defaults: {e}")
+                state = self._async[loop] = {"service": service, "models": {}}
+
+            model = state["models"].get(model_name)
+            if model is None:
+                model = state["models"][model_name] = genai.GenerativeModel(model_name)
+                if state["service"] is not None:
+                    model._async_client = state["service"]
+        return model
+
+    # --------------------------------------------------
+    # GENERATION
+    # --------------------------------------------------
+
+    def _count_call(self, model_name: str, key):
+        with self._lock:
+            self.calls += 1
+            self.reused_calls += bool(self._connected.get(key))
+            self.model_calls[model_name] = self.model_calls.get(model_name, 0) + 1
+
+    def generate(self, content, model_name: str = DEFAULT_MODEL, timeout: Optional[float] = None):
+        model = self.model(model_name)
+        self._count_call(model_name, "sync")
+        return model.generate_content(content, request_options={"timeout": timeout} if timeout else None)
+
+    async def generate_async(self, content, model_name: str = DEFAULT_MODEL, timeout: Optional[float] = None):
+        model = self.async_model(model_name)
+        self._count_call(model_name, asyncio.get_running_loop())
+        return await model.generate_content_async(content, request_options={"timeout": timeout} if timeout else None)
+
+    def stream(self, content, model_name: str = DEFAULT_MODEL, timeout: Optional[float] = None):
+        """Response chunks as Gemini generates them."""
+        model = self.model(model_name)
+        self._count_call(model_name, "sync")
+        yield from model.generate_content(content, stream=True, request_options={"timeout": timeout} if timeout else None)
+
+    async def stream_async(self, content, model_name: str = DEFAULT_MODEL, timeout: Optional[float] = None):
+        model = self.async_model(model_name)
+        self._count_call(model_name, asyncio.get_running_loop())
+        response = await model.generate_content_async(content, stream=True, request_options={"timeout": timeout} if timeout else None)
+        async for chunk in response:
+            yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "models": len(self._models),
+                "shared_channel": self._service is not None,
+                "async_channels": sum(1 for state in self._async.values() if state["service"] is not None),
+                "connections": self.connections,
+                "calls": self.calls,
+                "reused_calls": self.reused_calls,
+                "reuse_rate": round(self.reused_calls / self.calls, 4) if self.calls else 0.0,
+                "calls_per_model": dict(self.model_calls)
+            }
+
+
+# --------------------------------------------------
+# ROUTING
+# --------------------------------------------------
+
+# Agent whose calls are being made, set by the pipeline with agent_route()
+current_agent: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_agent", default=None)
+
+
+@contextlib.contextmanager
+def agent_route(agent_name: str):
+    """Routes the Gemini calls made inside the block with `agent_name`'s model override."""
+    token = current_agent.set(agent_name)
+    try:
+        yield
+    finally:
+        current_agent.reset(token)
+
+
+class RateLimited(RuntimeError):
+    """Every key is out of tokens for longer than the call may wait."""
+
+
+class TokenBucket:
+    """`rate` requests per second with bursts of up to `capacity`; rate 0 is unlimited."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, now: float) -> float:
+        """0 when a request may go now, else seconds until the next token."""
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        if self.rate > 0:
+            self.tokens -= 1
+
+    def drain(self):
+        """Empties the bucket after the upstream reported the key as over quota."""
+        self.tokens = min(self.tokens, 0.0)
+
+
+class Backend:
+    """One (key, model) pair with its latency and error EWMAs."""
+
+    ALPHA = 0.2
+    # Errors count against a backend less and less while it sits idle
+    ERROR_HALF_LIFE = 30.0
+    ERROR_WEIGHT = 4.0
+
+    def __init__(self, key_index: int, client: GeminiClient, model_name: str):
+        self.key_index = key_index
+        self.client = client
+        self.model_name = model_name
+        self.latency: Optional[float] = None
+        self.error = 0.0
+        self.last_outcome = 0.0
+        self.inflight = 0
+        self.calls = 0
+        self.errors = 0
+
+    def error_rate(self, now: float) -> float:
+        return self.error * 0.5 ** ((now - self.last_outcome) / self.ERROR_HALF_LIFE)
+
+    def expected_cost(self, now: float, fallback_latency: float) -> float:
+        if self.calls == 0:
+            # Every backend is tried once before latencies are compared
+            return 0.0
+        latency = self.latency if self.latency is not None else fallback_latency
+        return latency * (self.inflight + 1) * (1 + self.ERROR_WEIGHT * self.error_rate(now))
+
+    def record(self, now: float, latency: Optional[float]):
+        ok = latency is not None
+        self.error = self.error_rate(now) * (1 - self.ALPHA) + (0 if ok else self.ALPHA)
+        if ok:
+            self.latency = latency if self.latency is None else self.latency * (1 - self.ALPHA) + latency * self.ALPHA
+        else:
+            self.errors += 1
+        self.last_outcome = now
+
+
+class GeminiRouter:
+    """
+    Spreads Gemini calls over a pool of API keys and interchangeable models.
+
+    Each call goes to the (key, model) backend with the lowest expected
+    wait: its latency EWMA, scaled by the calls already in flight on it and
+    by its recent error rate. Each key has a token bucket of `key_rpm`
+    requests per minute. When every key is out of tokens, the call waits
+    for the earliest one instead of being rejected by the API. A backend
+    that reports the key over quota is drained and the call moves to the
+    next backend.
+
+    Agents pick up per-agent model lists through agent_route(), so agent
+    code keeps calling generate_response() unchanged. `sent`, when given,
+    receives the model that answered and when its request went out.
+    """
+
+    def __init__(
+        self,
+        keys: List[Optional[str]],
+        models: List[str],
+        agent_models: Optional[Dict[str, List[str]]] = None,
+        key_rpm: float = 0,
+        keepalive_seconds: int = 60,
+        endpoint: Optional[str] = None
+    ):
+        self.clients = [GeminiClient(key, keepalive_seconds, endpoint) for key in (keys or [None])]
+        self.models = list(models) or [DEFAULT_MODEL]
+        self.agent_models = {name: list(names) for name, names in (agent_models or {}).items() if names}
+        self.key_rpm = key_rpm
+        # Ten seconds' worth of requests may go out at once
+        self._buckets = [TokenBucket(key_rpm / 60, key_rpm / 6) for _ in self.clients]
+        self._backends: Dict[Tuple[int, str], Backend] = {}
+        self._lock = threading.Lock()
+
+        self.throttled = 0
+        self.quota_errors = 0
+
+    def models_for(self, model_name: Optional[str] = None) -> Tuple[str, ...]:
+        """Models a call may use: the one asked for, else the current agent's, else the pool."""
+        if model_name:
+            return (model_name,)
+        return tuple(self.agent_models.get(current_agent.get(), self.models))
+
+    def _backend(self, key_index: int, model_name: str) -> Backend:
+        backend = self._backends.get((key_index, model_name))
+        if backend is None:
+            backend = self._backends[(key_index, model_name)] = Backend(key_index, self.clients[key_index], model_name)
+        return backend
+
+    def _pick(self, models: Tuple[str, ...], exclude) -> Tuple[Optional[Backend], float]:
+        """(backend, 0) reserved for a call, or (None, seconds until a key frees up)."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [
+                self._backend(index, model_name)
+                for index in range(len(self.clients)) for model_name in models
+                if (index, model_name) not in exclude
+            ]
+            if not candidates:
+                return None, -1.0
+
+            known = [b.latency for b in self._backends.values() if b.latency is not None]
+            fallback_latency = max(known) if known else 1.0
+
+            best, best_cost, wait = None, None, None
+            for backend in candidates:
+                key_wait = self._buckets[backend.key_index].wait_time(now)
+                if key_wait > 0:
+                    wait = key_wait if wait is None else min(wait, key_wait)
+                    continue
+                cost = backend.expected_cost(now, fallback_latency)
+                if best is None or cost < best_cost:
+                    best, best_cost = backend, cost
+
+            if best is None:
+                self.throttled += 1
+                return None, wait
+            self._buckets[best.key_index].take()
+            best.inflight += 1
+            best.calls += 1
+            return best, 0.0
+
+    def _release(self, backend: Backend, latency: Optional[float], over_quota: bool = False):
+        with self._lock:
+            backend.inflight -= 1
+            backend.record(time.monotonic(), latency)
+            if over_quota:
+                self.quota_errors += 1
+                self._buckets[backend.key_index].drain()
+
+    def _next_wait(self, models, tried, deadline) -> Tuple[Optional[Backend], float]:
+        backend, wait = self._pick(models, tried)
+        if backend is None and wait < 0:
+            raise RateLimited("Every Gemini key is over quota")
+        if backend is None and deadline is not None and time.monotonic() + wait > deadline:
+            raise RateLimited(f"No Gemini key frees up within {deadline - time.monotonic():.1f}s")
+        return backend, wait
+
+    def generate(self, content, models: Tuple[str, ...], timeout: Optional[float] = None, sent: Optional[dict] = None):
+        deadline = time.monotonic() + timeout if timeout else None
+        tried = set()
+        while True:
+            backend, wait = self._next_wait(models, tried, deadline)
+            if backend is None:
+                time.sleep(wait)
+                continue
+
+            start, sent_at = time.monotonic(), time.perf_counter()
+            remaining = deadline - start if deadline is not None else None
+            try:
+                response = backend.client.generate(content, backend.model_name, remaining)
+            except api_exceptions.ResourceExhausted:
+                self._release(backend, None, over_quota=True)
+                tried.add((backend.key_index, backend.model_name))
+                continue
+            except Exception:
+                self._release(backend, None)
+                raise
+            self._release(backend, time.monotonic() - start)
+            if sent is not None and "at" not in sent:  # first hedge attempt to answer wins
+                sent.update(model=backend.model_name, at=sent_at)
+            return response
+
+    async def generate_async(self, content, models: Tuple[str, ...], timeout: Optional[float] = None, sent: Optional[dict] = None):
+        deadline = time.monotonic() + timeout if timeout else None
+        tried = set()
+        while True:
+            backend, wait = self._next_wait(models, tried, deadline)
+            if backend is None:
+                await asyncio.sleep(wait)
+                continue
+
+            start, sent_at = time.monotonic(), time.perf_counter()
+            remaining = deadline - start if deadline is not None else None
+            try:
+                response = await backend.client.generate_async(content, backend.model_name, remaining)
+            except api_exceptions.ResourceExhausted:
+                self._release(backend, None, over_quota=True)
+                tried.add((backend.key_index, backend.model_name))
+                continue
+            except BaseException:
+                # Includes cancellation of a losing hedge
+                self._release(backend, None)
+                raise
+            self._release(backend, time.monotonic() - start)
+            if sent is not None and "at" not in sent:  # first hedge attempt to answer wins
+                sent.update(model=backend.model_name, at=sent_at)
+            return response
+
+    def stream(self, content, models: Tuple[str, ...], timeout: Optional[float] = None, sent: Optional[dict] = None):
+        """generate() for a streamed answer; a key over quota is only skipped before the first chunk."""
+        deadline = time.monotonic() + timeout if timeout else None
+        tried = set()
+        while True:
+            backend, wait = self._next_wait(models, tried, deadline)
+            if backend is None:
+                time.sleep(wait)
+                continue
+
+            start, sent_at = time.monotonic(), time.perf_counter()
+            remaining = deadline - start if deadline is not None else None
+            chunks = backend.client.stream(content, backend.model_name, remaining)
+            try:
+                # Errors, quota included, surface on the first read of a stream
+                first = next(chunks, None)
+            except api_exceptions.ResourceExhausted:
+                self._release(backend, None, over_quota=True)
+                tried.add((backend.key_index, backend.model_name))
+                continue
+            except Exception:
+                self._release(backend, None)
+                raise
+            if sent is not None:
+                sent.update(model=backend.model_name, at=sent_at)
+
+            try:
+                if first is not None:
+                    yield first
+                yield from chunks
+            except BaseException:
+                # Includes the reader stopping early
+                self._release(backend, None)
+                raise
+            self._release(backend, time.monotonic() - start)
+            return
+
+    async def stream_async(self, content, models: Tuple[str, ...], timeout: Optional[float] = None, sent: Optional[dict] = None):
+        deadline = time.monotonic() + timeout if timeout else None
+        tried = set()
+        while True:
+            backend, wait = self._next_wait(models, tried, deadline)
+            if backend is None:
+                await asyncio.sleep(wait)
+                continue
+
+            start, sent_at = time.monotonic(), time.perf_counter()
+            remaining = deadline - start if deadline is not None else None
+            chunks = backend.client.stream_async(content, backend.model_name, remaining)
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                first = None
+            except api_exceptions.ResourceExhausted:
+                self._release(backend, None, over_quota=True)
+                tried.add((backend.key_index, backend.model_name))
+                continue
+            except BaseException:
+                self._release(backend, None)
+                raise
+            if sent is not None:
+                sent.update(model=backend.model_name, at=sent_at)
+
+            try:
+                if first is not None:
+                    yield first
+                    async for chunk in chunks:
+                        yield chunk
+            except BaseException:
+                self._release(backend, None)
+                raise
+            self._release(backend, time.monotonic() - start)
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            backends = [
+                {
+                    "key": f"key{backend.key_index + 1}",
+                    "model": backend.model_name,
+                    "calls": backend.calls,
+                    "errors": backend.errors,
+                    "inflight": backend.inflight,
+                    "latency_ms": round(backend.latency * 1e3, 1) if backend.latency is not None else None,
+                    "error_rate": round(backend.error_rate(now), 4)
+                }
+                for backend in self._backends.values()
+            ]
+            stats = {
+                "keys": len(self.clients),
+                "models": self.models,
+                "agent_models": self.agent_models,
+                "key_rpm": self.key_rpm,
+                "throttled": self.throttled,
+                "quota_errors": self.quota_errors,
+                "backends": backends
+            }
+        stats["channels"] = [client.stats() for client in self.clients]
+        return stats
+
+
+def _model_list(value: str) -> List[str]:
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def _agent_models(value: str) -> Dict[str, List[str]]:
+    """"DesignPlannerAgent=gemini-2.5-flash-lite;VisualizationAgent=a,b" -> {agent: [models]}"""
+    agent_models = {}
+    for entry in value.split(";"):
+        name, _, models = entry.partition("=")
+        if name.strip() and models.strip():
+            agent_models[name.strip()] = _model_list(models)
+    return agent_models
+
+
+router = GeminiRouter(
+    keys=api_keys or [api_key],
+    models=_model_list(os.getenv("GEMINI_MODELS", DEFAULT_MODEL)),
+    agent_models=_agent_models(os.getenv("GEMINI_AGENT_MODELS", "")),
+    key_rpm=float(os.getenv("GEMINI_KEY_RPM", 0)),
+    keepalive_seconds=int(os.getenv("GEMINI_KEEPALIVE_SECONDS", 60)),
+    endpoint=os.getenv("GEMINI_ENDPOINT") or None
+)
+
+# Identical prompts (and images) are answered from disk; LLM_CACHE_MAX_MB=0 disables it
+response_cache = ResponseCache(
+    ttl=float(os.getenv("LLM_CACHE_TTL", 86400)),
+    max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", 64)) * 2 ** 20)
+)
+
+# Photos are sent upright, at most IMAGE_MAX_EDGE px and without metadata; 0 sends them as uploaded
+image_preprocessor = ImagePreprocessor(
+    max_edge=int(os.getenv("IMAGE_MAX_EDGE", 1536)),
+    fmt=os.getenv("IMAGE_FORMAT", "jpeg"),
+    quality=int(os.getenv("IMAGE_QUALITY", 85))
+)
+
+# Deadline per call, a hedge request after the recent p95 and a breaker that fails fast while Gemini is down.
+# Running out of key quota on our side says nothing about Gemini's health.
+gemini_guard = ResilientCaller(
+    "gemini",
+    neutral_errors=(RateLimited,),
+    timeout=float(os.getenv("GEMINI_TIMEOUT", 60)),
+    # Sized for the hundreds of in-flight requests the async app serves
+    max_workers=int(os.getenv("GEMINI_THREADS", 256)),
+    hedge=os.getenv("GEMINI_HEDGE", "1") == "1",
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("BREAKER_FAILURES", 5)),
+        reset_seconds=float(os.getenv("BREAKER_RESET_SECONDS", 30))
+    )
+)
+
+
+def _prepare_content(prompt: str, image_path: str = None, image_hash: Optional[str] = None):
+    """(content, image bytes sent) for a prompt and optional photo."""
     content = [prompt]
+    image_bytes = None
     if image_path and os.path.exists(image_path):
         try:
-            img = Image.open(image_path)
-            content.append(img)
+            if image_preprocessor.enabled:
+                image_bytes, mime_type = image_preprocessor.prepare(image_path, image_hash)
+                content.append({"mime_type": mime_type, "data": image_bytes})
+            else:
+                with open(image_path, "rb") as f:
+                    image_bytes = f.read()
+                content.append(Image.open(io.BytesIO(image_bytes)))
         except Exception as e:
             print(f"Error loading image {image_path}: {e}")
+            image_bytes = None
+    return content, image_bytes
+
+
+def _record(agent, start, ready, sent, route, image_bytes, response=None, cached=False, error=None):
+    """Usage record of one generate_response call; queue time runs from content ready to request sent."""
+    usage = getattr(response, "usage_metadata", None)
+    record_call(
+        agent, "gemini",
+        wall=time.perf_counter() - start,
+        queue=sent["at"] - ready if "at" in sent else 0.0,
+        model=sent.get("model", route),
+        prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+        response_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+        image_bytes=len(image_bytes or b""),
+        cached=cached,
+        error=error
+    )
+
+
+def _usable(text: str, validate: Optional[Callable[[str], bool]]) -> bool:
+    if validate is None:
+        return True
+    try:
+        return bool(validate(text))
+    except Exception:
+        return False
+
+
+def _cached_response(cache_key: str, validate: Optional[Callable[[str], bool]]) -> Optional[str]:
+    """Cached text for cache_key, unless the caller's validate rejects it."""
+    cached = response_cache.get(cache_key)
+    if cached is not None and not _usable(cached, validate):
+        response_cache.invalidate(cache_key)
+        return None
+    return cached
+
+
+def _store_response(cache_key: str, route: str, text: str, latency: float, validate: Optional[Callable[[str], bool]]):
+    # An answer the caller can't use would be replayed for the whole TTL
+    if _usable(text, validate):
+        response_cache.put(cache_key, route, text, latency)
+    else:
+        print("[LLM CACHE] Response rejected by the caller's check, not cached.")
+
+
+def _chunk_text(chunk) -> str:
+    # A chunk carrying only the finish reason or usage has no text part
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+def _latency_key(route: str, image_bytes: Optional[bytes]) -> str:
+    # Vision calls are much slower than text ones, so they get their own p95
+    return f"{route}+image" if image_bytes else route
+
+
+def generate_response(
+    prompt: str,
+    model_name: Optional[str] = None,
+    image_path: str = None,
+    image_hash: Optional[str] = None,
+    validate: Optional[Callable[[str], bool]] = None
+) -> str:
+    """
+    Helper function to generate a response from the Gemini model.
+    Photos are downscaled and re-encoded first (see utils.image_prep).
+    Without a model_name the router picks the key and model (see
+    GeminiRouter). Timeouts, hedging and circuit breaking are handled by
+    gemini_guard (see utils.resilience); any failure returns "".
+    Only responses `validate` accepts (all when None) are cached, and a
+    cached one it rejects is dropped and fetched again.
+    """
+    agent = current_agent.get()
+    start = time.perf_counter()
+    models = router.models_for(model_name)
+    route = ",".join(models)
+    content, image_bytes = _prepare_content(prompt, image_path, image_hash)
+
+    cache_key = response_cache.key(route, prompt, image_bytes)
+    cached = _cached_response(cache_key, validate)
+    if cached is not None:
+        _record(agent, start, start, {}, route, image_bytes, cached=True)
+        return cached
+
+    sent = {}
+    ready = time.perf_counter()
+    try:
+        response = gemini_guard.call(
+            router.generate, content, models, key=_latency_key(route, image_bytes), sent=sent
+        )
+
+        if not response or not response.text:
+            raise ValueError("Empty response or blocked content from Gemini.")
 
+        _store_response(cache_key, route, response.text, time.perf_counter() - ready, validate)
+        _record(agent, start, ready, sent, route, image_bytes, response=response)
+        return response.text
+
+    except Exception as e:
+        print(f"[GEMINI] Critical Error: {e}")
+        _record(agent, start, ready, sent, route, image_bytes, error=str(e))
+        return ""
+
+
+async def generate_response_async(
+    prompt: str,
+    model_name: Optional[str] = None,
+    image_path: str = None,
+    image_hash: Optional[str] = None,
+    validate: Optional[Callable[[str], bool]] = None
+) -> str:
+    """
+    generate_response for the event loop: the Gemini call is a grpc.aio
+    call, photo preparation and the disk cache run on the blocking pool.
+    """
+    agent = current_agent.get()
+    start = time.perf_counter()
+    models = router.models_for(model_name)
+    route = ",".join(models)
+    content, image_bytes = await run_blocking(_prepare_content, prompt, image_path, image_hash)
+
+    cache_key = response_cache.key(route, prompt, image_bytes)
+    cached = await run_blocking(_cached_response, cache_key, validate)
+    if cached is not None:
+        _record(agent, start, start, {}, route, image_bytes, cached=True)
+        return cached
+
+    sent = {}
+    ready = time.perf_counter()
     try:
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(content)
-        
+        response = await gemini_guard.call_async(
+            router.generate_async, content, models, key=_latency_key(route, image_bytes), sent=sent
+        )
+
         if not response or not response.text:
             raise ValueError("Empty response or blocked content from Gemini.")
-            
+
+        await run_blocking(_store_response, cache_key, route, response.text, time.perf_counter() - ready, validate)
+        _record(agent, start, ready, sent, route, image_bytes, response=response)
         return response.text
-        
+
+    except Exception as e:
+        print(f"[GEMINI] Critical Error: {e}")
+        _record(agent, start, ready, sent, route, image_bytes, error=str(e))
+        return ""
+
+
+def generate_response_stream(
+    prompt: str,
+    model_name: Optional[str] = None,
+    validate: Optional[Callable[[str], bool]] = None
+) -> Iterator[str]:
+    """
+    generate_response, streamed: yields the text as Gemini generates it.
+    A cached answer comes back as one piece. A failure ends the stream
+    early, so the caller sees a truncated text where generate_response
+    would have returned "".
+    """
+    agent = current_agent.get()
+    start = time.perf_counter()
+    models = router.models_for(model_name)
+    route = ",".join(models)
+    content, image_bytes = _prepare_content(prompt)
+
+    cache_key = response_cache.key(route, prompt, image_bytes)
+    cached = _cached_response(cache_key, validate)
+    if cached is not None:
+        _record(agent, start, start, {}, route, image_bytes, cached=True)
+        yield cached
+        return
+
+    sent = {}
+    ready = time.perf_counter()
+    pieces, last = [], None
+    try:
+        for chunk in gemini_guard.stream(router.stream, content, models, key=f"{route}+stream", sent=sent):
+            last = chunk
+            text = _chunk_text(chunk)
+            if text:
+                pieces.append(text)
+                yield text
+
+        if not pieces:
+            raise ValueError("Empty response or blocked content from Gemini.")
+
+        _store_response(cache_key, route, "".join(pieces), time.perf_counter() - ready, validate)
+        _record(agent, start, ready, sent, route, image_bytes, response=last)
+
+    except Exception as e:
+        print(f"[GEMINI] Critical Error: {e}")
+        _record(agent, start, ready, sent, route, image_bytes, error=str(e))
+
+
+async def generate_response_stream_async(
+    prompt: str,
+    model_name: Optional[str] = None,
+    validate: Optional[Callable[[str], bool]] = None
+) -> AsyncIterator[str]:
+    """generate_response_stream for the event loop."""
+    agent = current_agent.get()
+    start = time.perf_counter()
+    models = router.models_for(model_name)
+    route = ",".join(models)
+    content, image_bytes = _prepare_content(prompt)
+
+    cache_key = response_cache.key(route, prompt, image_bytes)
+    cached = await run_blocking(_cached_response, cache_key, validate)
+    if cached is not None:
+        _record(agent, start, start, {}, route, image_bytes, cached=True)
+        yield cached
+        return
+
+    sent = {}
+    ready = time.perf_counter()
+    pieces, last = [], None
+    try:
+        async for chunk in gemini_guard.stream_async(router.stream_async, content, models, key=f"{route}+stream", sent=sent):
+            last = chunk
+            text = _chunk_text(chunk)
+            if text:
+                pieces.append(text)
+                yield text
+
+        if not pieces:
+            raise ValueError("Empty response or blocked content from Gemini.")
+
+        await run_blocking(_store_response, cache_key, route, "".join(pieces), time.perf_counter() - ready, validate)
+        _record(agent, start, ready, sent, route, image_bytes, response=last)
+
     except Exception as e:
         print(f"[GEMINI] Critical Error: {e}")
-        return ""
\ No newline at end of file
+        _record(agent, start, ready, sent, route, image_bytes, error=str(e))
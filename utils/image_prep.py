@@ -0,0 +1,177 @@
+"""
+Shrinks room photos before they are sent to Gemini.
+
+Phone photos arrive at full sensor resolution, sideways-with-an-EXIF-flag
+and with several KB of metadata. Gemini tiles images at well under 2K
+pixels anyway, so each photo is rotated upright, downscaled to `max_edge`,
+stripped of metadata and re-encoded as a compact JPEG or WebP. The
+result is stored next to the uploads under the source's content hash,
+so a photo is processed once no matter how often it is analyzed.
+"""
+import io
+import os
+import math
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from utils.uploads import file_digest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREPARED_DIR = os.path.join(BASE_DIR, "uploads", "prepared")
+
+FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "webp": ("WEBP", "image/webp", ".webp"),
+}
+
+# JPEG segments kept by strip_jpeg_metadata: APP0 (JFIF) and APP2 (ICC
+# colour profile). EXIF/XMP (APP1), maker notes, other APPn and comments go.
+_KEPT_APP_MARKERS = (0xE0, 0xE2)
+
+
+def strip_jpeg_metadata(data: bytes) -> Optional[bytes]:
+    """
+    `data` with its metadata segments removed, without re-encoding.
+
+    Only the headers before the scan are touched, the compressed image
+    data is copied as-is. None if the headers can't be walked.
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    out = [data[:2]]
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1  # Fill byte
+            continue
+        if marker == 0xDA:
+            # Start of scan: everything from here on is image data
+            out.append(data[pos:])
+            return b"".join(out)
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        end = pos + 2 + length
+        if length < 2 or end > len(data):
+            return None
+        if not (0xE0 <= marker <= 0xEF or marker == 0xFE) or marker in _KEPT_APP_MARKERS:
+            out.append(data[pos:end])
+        pos = end
+    return None
+
+
+class ImagePreprocessor:
+
+    def __init__(self, max_edge: int = 1536, fmt: str = "jpeg", quality: int = 85, cache_dir: str = PREPARED_DIR):
+        """
+        :param max_edge: longest side in pixels after downscaling, 0 sends photos untouched
+        :param fmt: "jpeg" or "webp"
+        :param quality: encoder quality (1-95)
+        """
+        fmt = fmt.lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown image format: {fmt}")
+        self.max_edge = max(0, int(max_edge))
+        self.fmt = fmt
+        self.quality = int(quality)
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+
+        self.processed = 0
+        self.cache_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_edge > 0
+
+    def encode(self, img: Image.Image) -> bytes:
+        """Upright, downscaled, metadata-free re-encode of an opened image."""
+        if img.format == "JPEG":
+            # Decode at the smallest 1/2^n scale still covering the target size, far cheaper than a full decode
+            scale = min(1.0, self.max_edge / max(img.size))
+            img.draft("RGB", (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            # Flatten transparency onto white instead of black
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, "white")
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            else:
+                img = img.convert("RGB")
+        img.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS, reducing_gap=3.0)
+
+        out = io.BytesIO()
+        pil_format = FORMATS[self.fmt][0]
+        if pil_format == "JPEG":
+            img.save(out, format="JPEG", quality=self.quality, optimize=True, progressive=True)
+        else:
+            img.save(out, format="WEBP", quality=self.quality, method=6)
+        return out.getvalue()
+
+    def _sendable_as_is(self, img: Image.Image) -> bool:
+        return (
+            img.format == FORMATS[self.fmt][0]
+            and max(img.size) <= self.max_edge
+            and img.getexif().get(0x0112, 1) == 1
+            # JPEG metadata is stripped losslessly, other formats must carry none
+            and (img.format == "JPEG" or not any(key in img.info for key in ("exif", "xmp")))
+        )
+
+    def prepare(self, path: str, source_hash: Optional[str] = None) -> Tuple[bytes, str]:
+        """(bytes, mime_type) to send for the photo at `path`."""
+        _, mime_type, ext = FORMATS[self.fmt]
+        source_hash = source_hash or file_digest(path)
+        cached_path = os.path.join(
+            self.cache_dir, f"{source_hash}_{self.max_edge}_{self.quality}{ext}"
+        )
+
+        if os.path.exists(cached_path):
+            with open(cached_path, "rb") as f:
+                data = f.read()
+            with self._lock:
+                self.cache_hits += 1
+            return data, mime_type
+
+        with Image.open(path) as img:
+            data = self.encode(img)
+            if self._sendable_as_is(img) and os.path.getsize(path) <= len(data):
+                # Already small, upright and in the target format: re-encoding only adds bytes.
+                # The original still must not leak EXIF (GPS, device) to the model.
+                with open(path, "rb") as f:
+                    original = f.read()
+                if img.format == "JPEG":
+                    original = strip_jpeg_metadata(original)
+                if original is not None:
+                    data = original
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, cached_path)
+
+        with self._lock:
+            self.processed += 1
+            self.bytes_in += os.path.getsize(path)
+            self.bytes_out += len(data)
+        return data, mime_type
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "max_edge": self.max_edge,
+                "format": self.fmt,
+                "processed": self.processed,
+                "cache_hits": self.cache_hits,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None
+            }
@@ -0,0 +1,89 @@
+"""
+Incremental parsing of a streamed JSON object.
+
+Model answers arrive in chunks; JSONArrayStream picks the elements of one
+top-level array field out of them as soon as each element is complete,
+without waiting for (or re-parsing) the rest of the document. Anything
+before the first "{", such as a markdown fence, is skipped.
+"""
+import json
+from typing import Any, List, Optional
+
+
+class JSONArrayStream:
+    """Elements of the top-level `field` array, parsed as the text comes in."""
+
+    def __init__(self, field: str):
+        self.field = field
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._in_field = False
+        self._element_start: Optional[int] = None
+
+    def feed(self, text: str) -> List[Any]:
+        """Adds a chunk of text, returns the elements it completed."""
+        self._buffer += text
+        elements = []
+        buffer = self._buffer
+        for pos in range(self._pos, len(buffer)):
+            char = buffer[pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._expect_key and len(self._stack) == 1:
+                        self._key = json.loads(buffer[self._string_start:pos + 1])
+                        self._expect_key = False
+                continue
+
+            if not self._stack and char != "{":
+                continue
+            if char in " \t\r\n":
+                continue
+
+            at_element_level = self._in_field and len(self._stack) == 2
+            if at_element_level and char in ",]":
+                if self._element_start is not None:
+                    try:
+                        elements.append(json.loads(buffer[self._element_start:pos]))
+                    except ValueError:
+                        pass  # Malformed element; the full parse at the end decides
+                    self._element_start = None
+            elif at_element_level and self._element_start is None:
+                self._element_start = pos
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char in "{[":
+                if char == "[" and len(self._stack) == 1 and self._key == self.field and not self.done:
+                    self._in_field = True
+                self._stack.append(char)
+                if len(self._stack) == 1:
+                    self._expect_key = True
+            elif char in "}]":
+                if self._in_field and len(self._stack) == 2:
+                    self._in_field = False
+                    self.done = True
+                if self._stack:
+                    self._stack.pop()
+            elif char == "," and len(self._stack) == 1:
+                self._expect_key = True
+
+        self._pos = len(buffer)
+        return elements
+
+    @property
+    def text(self) -> str:
+        return self._buffer
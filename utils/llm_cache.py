@@ -0,0 +1,197 @@
+"""
+On-disk cache of LLM responses.
+
+Entries live in a small SQLite database so every worker process shares
+them and they survive restarts. Each entry expires `ttl` seconds after it
+was stored, and once the stored text exceeds `max_bytes` the least
+recently used entries are evicted.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LLM_CACHE_PATH = os.path.join(BASE_DIR, "instance", "llm_cache.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    response TEXT,
+    size INTEGER,
+    latency REAL,
+    created REAL,
+    accessed REAL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+
+class ResponseCache:
+    """
+    Bounded, TTL'd response store with hit/miss and latency-saved counters.
+
+    Each thread keeps its own connection. Failures of the cache itself are
+    reported and treated as misses, so a broken cache file never breaks
+    generation.
+    """
+
+    # Eviction trims the store to this share of max_bytes, so it doesn't run on every put
+    EVICT_TO = 0.9
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: float = 86400, max_bytes: int = 64 * 2 ** 20):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max(0, int(max_bytes))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidated = 0
+        self.errors = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(model_name: str, prompt: str, image: Optional[bytes] = None) -> str:
+        digest = hashlib.sha256()
+        for part in (model_name.encode(), prompt.encode(), image or b""):
+            # Length-prefixed, so parts can't run into each other
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT response, latency, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            now = time.time()
+            if row and now - row[2] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._count(misses=1, expired=1)
+                return None
+            if row is None:
+                self._count(misses=1)
+                return None
+
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._count(hits=1, saved_seconds=row[1])
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"[LLM CACHE] Read failed: {e}")
+            self._count(misses=1, errors=1)
+            return None
+
+    def put(self, key: str, model_name: str, response: str, latency: float):
+        """Stores a successful response; empty ones are never cached."""
+        if not self.enabled or not response:
+            return
+        size = len(response.encode())
+        if size > self.max_bytes:
+            return
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model_name, response, size, latency, now, now)
+            )
+            self._count(stores=1)
+            self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"[LLM CACHE] Write failed: {e}")
+            self._count(errors=1)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,)).rowcount
+            evicted = 0
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                target = total - self.max_bytes * self.EVICT_TO
+                freed = 0
+                stale = []
+                for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                    stale.append((key,))
+                    freed += size
+                    if freed >= target:
+                        break
+                conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+                evicted = len(stale)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        self._count(expired=expired, evictions=evicted)
+
+    def invalidate(self, key: str):
+        """Drops an entry the caller found unusable, so it is fetched again."""
+        if not self.enabled:
+            return
+        try:
+            removed = self._connection().execute("DELETE FROM responses WHERE key = ?", (key,)).rowcount
+            self._count(invalidated=removed)
+        except sqlite3.Error as e:
+            print(f"[LLM CACHE] Invalidate failed: {e}")
+            self._count(errors=1)
+
+    def clear(self):
+        self._connection().execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidated": self.invalidated,
+                "errors": self.errors,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "ttl_seconds": self.ttl,
+                "max_bytes": self.max_bytes
+            }
+        if self.enabled:
+            try:
+                stats["entries"], stats["bytes"] = self._connection().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+            except sqlite3.Error:
+                pass
+        return stats
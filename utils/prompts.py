@@ -0,0 +1,180 @@
+"""
+Compact prompt building with a per-agent token budget.
+
+Agent prompts are a static instruction block followed by the agent's
+inputs as JSON. A PromptBuilder keeps the instruction block as a fixed
+string and serializes the inputs compactly:
+- only the fields the agent reads are kept
+- empty values are dropped
+- lists are deduplicated
+- the image's detected elements that the scene already lists are removed
+
+If the prompt is still over the agent's token budget, the builder drops
+fields in order of increasing value and finally shortens one free-text
+field.
+
+The budget is checked against an estimate of 4 characters per token,
+which is close to Gemini's tokenizer for English and JSON and needs no
+extra API call. Every build is also compared with the old indent=2
+serialization of the full inputs, so stats() shows the estimated
+savings per agent (est_* keys). Measured counts come from the model's
+tokenizer: benchmarks/prompt_token_benchmark.py counts both prompt
+styles with count_tokens, and the prompt_tokens the API reports for
+each call are in the usage stats (utils.usage).
+"""
+import copy
+import json
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _prune(value: Any) -> Any:
+    """Drops empty values and repeated list entries, recursively."""
+    if isinstance(value, dict):
+        pruned = {key: _prune(item) for key, item in value.items()}
+        return {key: item for key, item in pruned.items() if item not in (None, "", [], {})}
+    if isinstance(value, list):
+        seen, items = set(), []
+        for item in map(_prune, value):
+            marker = _marker(item)
+            if item in (None, "", [], {}) or marker in seen:
+                continue
+            seen.add(marker)
+            items.append(item)
+        return items
+    return value
+
+
+def _marker(item: Any) -> str:
+    return item.strip().lower() if isinstance(item, str) else compact_json(item)
+
+
+def _lookup(data: Dict[str, Any], path: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """(parent dict, key) of a dotted path, parent None when it is absent."""
+    *parents, key = path.split(".")
+    for part in parents:
+        data = data.get(part) if isinstance(data, dict) else None
+    return (data if isinstance(data, dict) else None), key
+
+
+class PromptBuilder:
+    """
+    Prompt for one agent: `instructions`, then `label` and the compacted inputs.
+
+    :param fields: top-level input fields the agent reads, None keeps all
+    :param dedupe: {list path: list path} pairs, entries of the first that
+                   already appear in the second are removed
+    :param trim: dotted paths dropped in this order while over budget
+    :param truncate: free-text path shortened last if still over budget
+    """
+
+    def __init__(
+        self,
+        agent: str,
+        instructions: str,
+        label: str,
+        budget_tokens: int,
+        fields: Optional[Sequence[str]] = None,
+        dedupe: Optional[Dict[str, str]] = None,
+        trim: Sequence[str] = (),
+        truncate: Optional[str] = None
+    ):
+        self.agent = agent
+        self.instructions = instructions
+        self.label = label
+        self.budget_tokens = budget_tokens
+        self.fields = fields
+        self.dedupe = dedupe or {}
+        self.trim = list(trim)
+        self.truncate = truncate
+
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.trimmed = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.dropped: Dict[str, int] = {}
+
+    def build(self, inputs: Any, instructions: Optional[str] = None) -> str:
+        """Prompt for `inputs`; `instructions` replaces the default block, e.g. for a variant of it."""
+        instructions = instructions or self.instructions
+        before = estimate_tokens(self.uncompacted(inputs, instructions))
+
+        data = self._compact(inputs)
+        prompt = self._render(instructions, data)
+        dropped: List[str] = []
+        for path in self.trim:
+            if estimate_tokens(prompt) <= self.budget_tokens:
+                break
+            parent, key = _lookup(data, path)
+            if parent is not None and key in parent:
+                del parent[key]
+                dropped.append(path)
+                prompt = self._render(instructions, data)
+
+        if estimate_tokens(prompt) > self.budget_tokens and self.truncate:
+            parent, key = _lookup(data, self.truncate)
+            text = parent.get(key) if parent is not None else None
+            if isinstance(text, str):
+                excess = (estimate_tokens(prompt) - self.budget_tokens) * CHARS_PER_TOKEN
+                parent[key] = text[:max(0, len(text) - excess - 1)] + "…"
+                dropped.append(self.truncate)
+                prompt = self._render(instructions, data)
+
+        with self._lock:
+            self.prompts += 1
+            self.trimmed += bool(dropped)
+            self.tokens_before += before
+            self.tokens_after += estimate_tokens(prompt)
+            for path in dropped:
+                self.dropped[path] = self.dropped.get(path, 0) + 1
+        return prompt
+
+    def uncompacted(self, inputs: Any, instructions: Optional[str] = None) -> str:
+        """The prompt as sent before compaction: all inputs as indent=2 JSON."""
+        return f"{instructions or self.instructions}\n{self.label}:\n{json.dumps(inputs, indent=2, default=str)}\n"
+
+    def _compact(self, inputs: Any) -> Any:
+        if not isinstance(inputs, dict):
+            return _prune(copy.deepcopy(inputs))
+        data = {
+            key: copy.deepcopy(value) for key, value in inputs.items()
+            if self.fields is None or key in self.fields
+        }
+        for path, against in self.dedupe.items():
+            parent, key = _lookup(data, path)
+            other_parent, other_key = _lookup(data, against)
+            if parent is None or other_parent is None:
+                continue
+            items, known = parent.get(key), other_parent.get(other_key)
+            if isinstance(items, list) and isinstance(known, list):
+                known = {_marker(item) for item in known}
+                parent[key] = [item for item in items if _marker(item) not in known]
+        return _prune(data)
+
+    def _render(self, instructions: str, data: Any) -> str:
+        return f"{instructions}\n{self.label}:\n{compact_json(data)}\n"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "prompts": self.prompts,
+                "budget_tokens": self.budget_tokens,
+                "trimmed": self.trimmed,
+                "dropped_fields": dict(self.dropped),
+                # Estimates at CHARS_PER_TOKEN, see the module docstring for measured counts
+                "est_chars_per_token": CHARS_PER_TOKEN,
+                "est_avg_tokens_before": round(self.tokens_before / self.prompts, 1) if self.prompts else None,
+                "est_avg_tokens_after": round(self.tokens_after / self.prompts, 1) if self.prompts else None,
+                "est_saved_ratio": round(1 - self.tokens_after / self.tokens_before, 3) if self.tokens_before else None
+            }
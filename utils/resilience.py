@@ -0,0 +1,485 @@
+"""
+Deadlines, hedging and circuit breaking for upstream model calls.
+
+Every Gemini and Imagen call goes through a ResilientCaller:
+
+- each call has a deadline, after which the caller gets UpstreamTimeout
+  instead of waiting on a stuck connection;
+- once enough latencies have been seen, a call still running after the
+  recent p95 gets one duplicate ("hedge") request and the first answer
+  wins; hedges are capped at a share of calls so a slow upstream isn't
+  sent twice the load;
+- a run of failures opens a circuit breaker, after which calls fail
+  immediately with CircuitOpenError until a probe succeeds, so the agents
+  go straight to their fallback output while the upstream is down.
+
+Both errors are ordinary exceptions, so the agents' existing error
+handling turns them into fallbacks.
+"""
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Optional
+
+
+class UpstreamTimeout(TimeoutError):
+    """No attempt finished before the call's deadline."""
+
+
+class CircuitOpenError(RuntimeError):
+    """The upstream is considered down; the call was not attempted."""
+
+
+class LocalOverload(RuntimeError):
+    """No worker of ours was free to start the call within its timeout; the upstream was never asked."""
+
+
+class LatencyWindow:
+    """The last `size` latencies, for percentiles."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Opens once the last `window_seconds` hold at least `failure_threshold`
+    failures and they are at least `failure_ratio` of the calls, so a burst
+    of timeouts among many successes doesn't trip it. After `reset_seconds`
+    one probe call is let through (half-open): success closes the circuit,
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30,
+        failure_ratio: float = 0.5,
+        window_seconds: float = 10
+    ):
+        self.failure_threshold = max(0, int(failure_threshold))
+        self.reset_seconds = reset_seconds
+        self.failure_ratio = failure_ratio
+        self.window_seconds = window_seconds
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        # (time, succeeded) of recent calls
+        self._outcomes = deque()
+        self._failures = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    def allow(self) -> bool:
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def _record(self, ok: bool, now: float):
+        self._outcomes.append((now, ok))
+        self._failures += not ok
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._failures -= not self._outcomes.popleft()[1]
+
+    def record_success(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+                self._failures = 0
+            self._record(True, time.monotonic())
+            self._probing = False
+
+    def release_probe(self):
+        """Ends a half-open probe that says nothing about the upstream's health."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._record(False, now)
+            tripped = (
+                self._failures >= self.failure_threshold
+                and self._failures >= self.failure_ratio * len(self._outcomes)
+            )
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and tripped):
+                if self.state == self.CLOSED:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = now
+            self._probing = False
+
+
+class ResilientCaller:
+    """
+    Deadline, hedging and circuit breaking around one upstream.
+
+    `fn` receives the seconds left until the deadline as its `timeout`
+    keyword, so an SDK that takes a deadline can stop abandoned attempts
+    too. `is_failure(result)` marks results that an SDK returns instead of
+    raising (Bytez reports HTTP errors that way); when every attempt fails
+    like that the last result is returned as is. Exceptions in
+    `neutral_errors` (e.g. client-side rate limiting) fail the call without
+    counting against the upstream's health.
+
+    Sync attempts run on the caller's own pool of `max_workers` threads,
+    kept apart from other upstreams and from utils.aio's pool (whose
+    threads may be the callers), so a stuck upstream only ties up its own
+    workers. The deadline starts when an attempt starts running: time
+    queued for a worker is ours, not the upstream's. A call that cannot
+    start within `timeout` fails with LocalOverload, which the breaker
+    ignores.
+    """
+
+    # Seconds between checks of whether a queued attempt has started
+    QUEUE_POLL = 0.05
+    # Most hedges that can be saved up while calls are fast
+    HEDGE_BURST = 5
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 60,
+        hedge: bool = True,
+        hedge_quantile: float = 0.95,
+        min_hedge_delay: float = 1.0,
+        min_samples: int = 20,
+        hedge_budget: float = 0.1,
+        breaker: Optional[CircuitBreaker] = None,
+        is_failure: Optional[Callable[[Any], bool]] = None,
+        neutral_errors: tuple = (),
+        max_workers: int = 64
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        # Each call earns `hedge_budget` of a hedge, so under load (when every
+        # call is past the p95) hedges stay a bounded share of the traffic
+        self.hedge_budget = hedge_budget
+        self._hedge_tokens = 1.0
+        self.breaker = breaker or CircuitBreaker()
+        self.is_failure = is_failure or (lambda result: False)
+        self.neutral_errors = neutral_errors
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"upstream-{name}")
+        # latency key (e.g. model name) -> recent successful attempt latencies
+        self._latencies: Dict[Any, LatencyWindow] = {}
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.overloaded = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def _window(self, key) -> LatencyWindow:
+        window = self._latencies.get(key)
+        if window is None:
+            with self._lock:
+                window = self._latencies.setdefault(key, LatencyWindow())
+        return window
+
+    def hedge_delay(self, key=None) -> Optional[float]:
+        """Seconds before a hedge is sent, None while hedging is off or the window is too small."""
+        window = self._window(key)
+        if not self.hedge or len(window) < self.min_samples:
+            return None
+        return max(self.min_hedge_delay, window.percentile(self.hedge_quantile))
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self._count(rejected=1)
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        with self._lock:
+            self.calls += 1
+            self._hedge_tokens = min(self.HEDGE_BURST, self._hedge_tokens + self.hedge_budget)
+
+    def _take_hedge(self) -> bool:
+        with self._lock:
+            if self._hedge_tokens < 1:
+                self.hedges_skipped += 1
+                return False
+            self._hedge_tokens -= 1
+            self.hedges += 1
+            return True
+
+    def _settle(self, key, ok: bool, latency: Optional[float] = None, hedged_win: bool = False, error=None):
+        if ok:
+            self._window(key).record(latency)
+            self.breaker.record_success()
+            self._count(successes=1, hedge_wins=int(hedged_win))
+        elif isinstance(error, self.neutral_errors):
+            self.breaker.release_probe()
+            self._count(failures=1)
+        else:
+            self.breaker.record_failure()
+            self._count(failures=1)
+
+    def _overloaded(self):
+        # Our own queue was full: neither a failure nor a success of the upstream
+        self.breaker.release_probe()
+        self._count(overloaded=1)
+        return LocalOverload(f"No {self.name} worker free within {self.timeout}s ({self.max_workers} busy)")
+
+    def _timed_out(self, key):
+        self._settle(key, False)
+        self._count(timeouts=1)
+        return UpstreamTimeout(f"{self.name} call exceeded {self.timeout}s")
+
+    # --------------------------------------------------
+    # SYNC
+    # --------------------------------------------------
+
+    def call(self, fn: Callable[..., Any], *args, key=None, **kwargs):
+        self._admit()
+
+        submitted = time.monotonic()
+        delay = self.hedge_delay(key)
+        deadline = hedge_at = None
+        # Start time of each attempt, set by the worker that runs it
+        began = []
+
+        def attempt():
+            start = time.monotonic()
+            began.append(start)
+            timeout = self.timeout if deadline is None else deadline - start
+            result = fn(*args, timeout=max(0.0, timeout), **kwargs)
+            return result, time.monotonic() - start
+
+        attempts = [self._executor.submit(attempt)]
+        pending = set(attempts)
+        last_result, last_error = None, None
+
+        while True:
+            now = time.monotonic()
+            if deadline is None:
+                if not began:
+                    if now >= submitted + self.timeout:
+                        for future in pending:
+                            future.cancel()
+                        raise self._overloaded()
+                    wait(pending, timeout=min(self.QUEUE_POLL, submitted + self.timeout - now))
+                    continue
+                deadline = began[0] + self.timeout
+                hedge_at = began[0] + delay if delay is not None else None
+
+            if hedge_at is not None and now >= hedge_at:
+                if self._take_hedge():
+                    attempts.append(self._executor.submit(attempt))
+                    pending.add(attempts[-1])
+                hedge_at = None
+            if now >= deadline:
+                for future in pending:
+                    future.cancel()
+                raise self._timed_out(key)
+
+            wake = min(deadline, hedge_at) if hedge_at is not None else deadline
+            done, pending = wait(pending, timeout=wake - now, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                try:
+                    result, latency = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if self.is_failure(result):
+                    last_result = result
+                    continue
+                for other in pending:
+                    other.cancel()
+                self._settle(key, True, latency, hedged_win=future is not attempts[0])
+                return result
+
+            if not pending:
+                # Hedging is for slow answers, not a retry of failed ones
+                self._settle(key, False, error=last_error if last_result is None else None)
+                if last_result is not None:
+                    return last_result
+                raise last_error
+
+    # --------------------------------------------------
+    # ASYNC
+    # --------------------------------------------------
+
+    async def call_async(self, fn: Callable[..., Any], *args, key=None, **kwargs):
+        """call() for coroutine functions; losing attempts are cancelled."""
+        self._admit()
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + self.timeout
+        delay = self.hedge_delay(key)
+        hedge_at = start + delay if delay is not None else None
+
+        async def attempt():
+            began = loop.time()
+            result = await fn(*args, timeout=max(0.0, deadline - began), **kwargs)
+            return result, loop.time() - began
+
+        attempts = [asyncio.ensure_future(attempt())]
+        pending = set(attempts)
+        last_result, last_error = None, None
+
+        try:
+            while True:
+                now = loop.time()
+                if hedge_at is not None and now >= hedge_at:
+                    if self._take_hedge():
+                        attempts.append(asyncio.ensure_future(attempt()))
+                        pending.add(attempts[-1])
+                    hedge_at = None
+                if now >= deadline:
+                    raise self._timed_out(key)
+
+                wake = min(deadline, hedge_at) if hedge_at is not None else deadline
+                done, pending = await asyncio.wait(pending, timeout=wake - now, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    try:
+                        result, latency = task.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if self.is_failure(result):
+                        last_result = result
+                        continue
+                    self._settle(key, True, latency, hedged_win=task is not attempts[0])
+                    return result
+
+                if not pending:
+                    self._settle(key, False, error=last_error if last_result is None else None)
+                    if last_result is not None:
+                        return last_result
+                    raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    # --------------------------------------------------
+    # STREAMING
+    # --------------------------------------------------
+
+    def stream(self, fn: Callable[..., Any], *args, key=None, **kwargs):
+        """
+        call() for streamed answers: `fn` returns an iterator whose items are
+        passed on as they arrive. There is no hedging, since a second stream
+        cannot be merged into one already being read. The deadline goes to
+        `fn` as its timeout and is checked again between items.
+        """
+        self._admit()
+
+        start = time.monotonic()
+        deadline = start + self.timeout
+        try:
+            for item in fn(*args, timeout=self.timeout, **kwargs):
+                if time.monotonic() > deadline:
+                    self._count(timeouts=1)
+                    raise UpstreamTimeout(f"{self.name} stream exceeded {self.timeout}s")
+                yield item
+        except GeneratorExit:
+            # The reader stopped early, which says nothing about the upstream
+            self.breaker.release_probe()
+            raise
+        except Exception as e:
+            self._settle(key, False, error=e)
+            raise
+        self._settle(key, True, time.monotonic() - start)
+
+    async def stream_async(self, fn: Callable[..., Any], *args, key=None, **kwargs):
+        """stream() for async iterators."""
+        self._admit()
+
+        start = time.monotonic()
+        deadline = start + self.timeout
+        try:
+            async for item in fn(*args, timeout=self.timeout, **kwargs):
+                if time.monotonic() > deadline:
+                    self._count(timeouts=1)
+                    raise UpstreamTimeout(f"{self.name} stream exceeded {self.timeout}s")
+                yield item
+        except (GeneratorExit, asyncio.CancelledError):
+            self.breaker.release_probe()
+            raise
+        except Exception as e:
+            self._settle(key, False, error=e)
+            raise
+        self._settle(key, True, time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "circuit": self.breaker.state,
+                "circuit_trips": self.breaker.trips,
+                "timeout_seconds": self.timeout,
+                "calls": self.calls,
+                "successes": self.successes,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "overloaded": self.overloaded,
+                "max_workers": self.max_workers,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "hedges_skipped": self.hedges_skipped,
+            }
+            windows = dict(self._latencies)
+        stats["latency"] = {
+            str(key): {
+                "samples": len(window),
+                "p50": window.percentile(0.5),
+                "p95": window.percentile(0.95),
+                "hedge_delay": self.hedge_delay(key)
+            }
+            for key, window in windows.items()
+        }
+        return stats
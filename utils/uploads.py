@@ -0,0 +1,57 @@
+"""
+Content-addressed storage for uploaded room photos.
+
+An upload is stored as upload_<sha256><ext>, so the same photo uploaded
+again (another iteration, another session) maps to the file already on
+disk and to everything cached for its hash.
+"""
+import os
+import hashlib
+import threading
+from typing import BinaryIO, Tuple
+
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 1 << 16
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_upload(stream: BinaryIO, filename: str, folder: str) -> Tuple[str, str, bool]:
+    """
+    Stores an uploaded file under its content hash.
+
+    `stream` is the request's spooled upload (werkzeug FileStorage.stream,
+    starlette UploadFile.file). It is read once: each chunk is hashed and
+    written to a temp file, which is renamed to its hash or, when a file
+    with that hash exists already, discarded.
+    Returns (path, sha256 hex digest, already_stored).
+    """
+    ext = os.path.splitext(secure_filename(filename or ""))[1].lower()
+    tmp_path = os.path.join(folder, f"upload.{os.getpid()}.{threading.get_ident()}{ext}.tmp")
+
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    digest = digest.hexdigest()
+
+    path = os.path.join(folder, f"upload_{digest}{ext}")
+    if os.path.exists(path):
+        os.remove(tmp_path)
+        return path, digest, True
+
+    # Renamed into place, so a concurrent identical upload never sees half a file
+    os.replace(tmp_path, path)
+    return path, digest, False
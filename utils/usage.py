@@ -0,0 +1,187 @@
+"""
+Per-call accounting of model usage: wall time, queue time, tokens, image
+bytes and estimated cost.
+
+Every Gemini and Imagen call (and the download of a generated image)
+reports one record. Records go to the trace of the design request they
+belong to, if one is open, and to process-wide per-agent totals for
+capacity planning.
+"""
+import os
+import json
+import time
+import threading
+import contextlib
+import contextvars
+from typing import Any, Dict, List, Optional
+
+from utils.resilience import LatencyWindow
+
+# List prices in USD: (input, output) per 1M tokens for Gemini, per image for Imagen.
+# MODEL_PRICES='{"gemini-2.5-flash": [0.3, 2.5]}' overrides or adds entries.
+MODEL_PRICES = {
+    "gemini-2.5-pro": (1.25, 10.0),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "google/imagen-4.0-ultra-generate-001": (0.06,),
+}
+MODEL_PRICES.update({name: tuple(price) for name, price in json.loads(os.getenv("MODEL_PRICES") or "{}").items()})
+
+
+def call_cost(model: Optional[str], prompt_tokens: int = 0, response_tokens: int = 0, images: int = 0) -> Optional[float]:
+    """Estimated USD cost of one call, None for models without a price."""
+    price = MODEL_PRICES.get(model)
+    if price is None:
+        return None
+    if len(price) == 1:
+        return price[0] * images
+    return (prompt_tokens * price[0] + response_tokens * price[1]) / 1e6
+
+
+class RequestTrace:
+    """The calls made for one design request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]):
+        with self._lock:
+            self.calls.append(record)
+
+    def summary(self) -> Dict[str, Any]:
+        """The `timings` block of a design response."""
+        with self._lock:
+            calls = list(self.calls)
+        total = (self.finished or time.perf_counter()) - self.started
+
+        by_agent: Dict[str, Dict[str, Any]] = {}
+        for record in calls:
+            agent = by_agent.setdefault(record["agent"], {
+                "calls": 0, "wall_ms": 0.0, "queue_ms": 0.0, "prompt_tokens": 0,
+                "response_tokens": 0, "image_bytes": 0, "cost_usd": 0.0
+            })
+            agent["calls"] += 1
+            for field in ("wall_ms", "queue_ms", "prompt_tokens", "response_tokens", "image_bytes", "cost_usd"):
+                agent[field] += record.get(field) or 0
+
+        totals = {
+            field: sum(agent[field] for agent in by_agent.values())
+            for field in ("calls", "prompt_tokens", "response_tokens", "image_bytes", "cost_usd")
+        }
+        for summary in list(by_agent.values()) + [totals]:
+            for field in ("wall_ms", "queue_ms", "cost_usd"):
+                if field in summary:
+                    summary[field] = round(summary[field], 6 if field == "cost_usd" else 1)
+
+        return {"total_ms": round(total * 1e3, 1), "calls": calls, "by_agent": by_agent, "totals": totals}
+
+
+class UsageStats:
+    """Process-wide totals per agent and call type, for /admin/stats."""
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.request_seconds = 0.0
+
+    def add(self, record: Dict[str, Any]):
+        name = f"{record['agent']}/{record['call']}"
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = self._entries[name] = {
+                    "calls": 0, "errors": 0, "cached": 0, "wall_seconds": 0.0, "queue_seconds": 0.0,
+                    "prompt_tokens": 0, "response_tokens": 0, "image_bytes": 0, "cost_usd": 0.0,
+                    "latency": LatencyWindow(500)
+                }
+            entry["calls"] += 1
+            entry["errors"] += bool(record.get("error"))
+            entry["cached"] += bool(record.get("cached"))
+            entry["wall_seconds"] += record["wall_ms"] / 1e3
+            entry["queue_seconds"] += (record.get("queue_ms") or 0) / 1e3
+            for field in ("prompt_tokens", "response_tokens", "image_bytes", "cost_usd"):
+                entry[field] += record.get(field) or 0
+        entry["latency"].record(record["wall_ms"] / 1e3)
+
+    def add_request(self, seconds: float):
+        with self._lock:
+            self.requests += 1
+            self.request_seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = {name: dict(entry) for name, entry in self._entries.items()}
+            stats = {
+                "requests": self.requests,
+                "avg_request_seconds": round(self.request_seconds / self.requests, 3) if self.requests else None
+            }
+        per_call = {}
+        for name, entry in entries.items():
+            latency = entry.pop("latency")
+            calls = entry["calls"]
+            per_call[name] = {
+                **{field: round(value, 6) if isinstance(value, float) else value for field, value in entry.items()},
+                "avg_wall_seconds": round(entry["wall_seconds"] / calls, 3),
+                "p50_seconds": round(latency.percentile(0.5), 3),
+                "p95_seconds": round(latency.percentile(0.95), 3),
+                "tokens_per_call": round((entry["prompt_tokens"] + entry["response_tokens"]) / calls, 1),
+                "cost_per_call_usd": round(entry["cost_usd"] / calls, 6)
+            }
+        stats["per_call"] = per_call
+        return stats
+
+
+usage_stats = UsageStats()
+
+current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+@contextlib.contextmanager
+def trace_request():
+    """Collects the calls made inside the block into a RequestTrace."""
+    trace = RequestTrace()
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+        trace.finished = time.perf_counter()
+        usage_stats.add_request(trace.finished - trace.started)
+
+
+def record_call(
+    agent: Optional[str],
+    call: str,
+    wall: float,
+    queue: float = 0.0,
+    model: Optional[str] = None,
+    prompt_tokens: int = 0,
+    response_tokens: int = 0,
+    image_bytes: int = 0,
+    images: int = 0,
+    cached: bool = False,
+    error: Optional[str] = None
+):
+    """Records one model call (times in seconds) on the open trace and the per-agent totals."""
+    cost = None if cached else call_cost(model, prompt_tokens, response_tokens, images)
+    record = {
+        "agent": agent or "unassigned",
+        "call": call,
+        "model": model,
+        "wall_ms": round(wall * 1e3, 1),
+        "queue_ms": round(queue * 1e3, 1),
+        "prompt_tokens": prompt_tokens,
+        "response_tokens": response_tokens,
+        "image_bytes": image_bytes,
+        "cached": cached,
+        "cost_usd": round(cost, 7) if cost is not None else None,
+        "error": error
+    }
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(record)
+    usage_stats.add(record)